@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Adaptive-step, event-locating integrator for the per-second heater / pump / tank model of simulation.py
+"""
+
+import numpy as np
+
+from simulation import secs_in_a_day, Heater, Pump, Storage_tank, Water, Output
+from engine import Engine, outflow_demand
+
+# THE MODEL IS THE ONE OF Simulation.run, ONE SECOND AT A TIME (Heater.update, THEN Storage_tank.update):
+#   * WHILE THE HEATER IS BELOW ITS THRESHOLD THE COIL ADDS h °C A SECOND
+#   * WHILE THE HEATER IS AT ITS THRESHOLD AND THE TANK BELOW ITS OWN, THE PUMP RUNS FOR ONE SECOND, EXCHANGING
+#     WATER LIKE Heater.update_temperature AND Storage_tank.update_temperature (THE TANK TAKES MOSTLY THE NEW
+#     HEATER TEMPERATURE). THE HEATER THEN DROPS BELOW ITS THRESHOLD AND THE PUMP IS OFF UNTIL IT IS HOT AGAIN
+#   * WHILE AN OUTFLOW RUNS THE TANK MIXES WITH OUTSIDE WATER, A FRACTION (V_t - q_o) / V_t OF IT KEPT EACH SECOND
+#
+# IRRADIANCE AND OUTFLOW ARE PIECEWISE CONSTANT. BETWEEN PUMP SECONDS EVERY TEMPERATURE THEN FOLLOWS
+# x' = r - lam * x EXACTLY AT WHOLE SECONDS (LINEAR HEATING, OR MIXING TOWARDS T_outside WITH lam = -log OF THE
+# FRACTION KEPT), SO THE INTEGRATOR TAKES ONE STEP FROM EACH INPUT CHANGE OR PUMP SECOND TO THE NEXT. A STEP ENDS
+# EARLY WHERE THE PUMP HAS TO START: AT THE FIRST WHOLE SECOND WITH THE HEATER HOT AND THE TANK BELOW ITS
+# THRESHOLD. THE TANK CROSSING IS LOCATED BY ROOT FINDING TO WITHIN tolerance SECONDS AND ROUNDED UP TO THE
+# SECOND THE PUMP LOOKS AT. PUMP SECONDS ARE STEPPED ONE BY ONE WITH Engine.pump_step.
+#
+# STEPS THEREFORE GROW WITH THE INPUT CHANGES AND PUMP CYCLES. ONE PUMP SECOND BRINGS THE TANK CLOSE TO THE
+# HEATER TEMPERATURE, SO THERE ARE FEW: THE SCENARIOS OF checks.py TAKE 11 (NO OUTFLOW) TO 59 (A DRAW EVERY HOUR)
+# STEPS A DAY, AND SAMPLING THE TRACES COSTS MORE THAN INTEGRATING. THE CLOSED FORMS ONLY REORDER THE ROUNDING OF
+# Simulation.run, SO THE TRACES MATCH IT TO accuracy, CHECKED BY checks.py. (A THRESHOLD HIT WITHIN ROUNDING OF A
+# WHOLE SECOND COULD STILL BE DECIDED THE OTHER WAY.)
+
+tolerance = 1e-6 #s
+accuracy = 1e-9 #°C, LARGEST DIFFERENCE FROM Simulation.run
+
+
+def evolve(x0, r, lam, t):
+
+    # SOLUTION OF x' = r - lam * x AFTER TIME t
+
+    if lam == 0:
+        return x0 + r * t
+
+    return r / lam + (x0 - r / lam) * np.exp(-lam * t)
+
+def locate(f, t0, t1):
+
+    # ROOT OF f IN [t0, t1] WITH f(t0), f(t1) OF OPPOSITE SIGN, ILLINOIS VARIANT OF REGULA FALSI
+
+    f0, f1 = f(t0), f(t1)
+    side = 0
+
+    while t1 - t0 > tolerance:
+        t = t1 - f1 * (t1 - t0) / (f1 - f0)
+        t = min(max(t, t0 + tolerance / 2), t1 - tolerance / 2)
+        ft = f(t)
+
+        if (ft > 0) == (f1 > 0):
+            t1, f1 = t, ft
+            if side == -1:
+                f0 /= 2
+            side = -1
+        else:
+            t0, f0 = t, ft
+            if side == 1:
+                f1 /= 2
+            side = 1
+
+    return t1
+
+class Trajectory:
+
+    def __init__(self, starts, states, rates, decays, end):
+
+        # STEP k STARTS AT starts[k] IN STATE states[k] = (Th, Tt) AND FOLLOWS x' = rates[k] - decays[k] * x.
+        # A PUMP SECOND IS STORED AS THE LINE FROM ITS START TO ITS END STATE
+
+        self.starts = np.asarray(starts, dtype=float)
+        self.states = np.asarray(states, dtype=float).reshape(-1, 2)
+        self.rates = np.asarray(rates, dtype=float).reshape(-1, 2)
+        self.decays = np.asarray(decays, dtype=float).reshape(-1, 2)
+        self.end = end
+
+    def steps(self):
+        return len(self.starts)
+
+    def sample(self, times):
+
+        # DENSE OUTPUT: (Th, Tt) AT ANY TIMES, FROM THE SOLUTION OVER THEIR STEP
+
+        times = np.asarray(times, dtype=float)
+        k = np.clip(np.searchsorted(self.starts, times, side='right') - 1, 0, len(self.starts) - 1)
+        t = (times - self.starts[k])[:, None]
+        x0, r, lam = self.states[k], self.rates[k], self.decays[k]
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            decaying = r / lam + (x0 - r / lam) * np.exp(-lam * t)
+
+        return np.where(lam == 0, x0 + r * t, decaying)
+
+    def output(self, every=1):
+
+        # simulation.Output WITH THE STATE AT THE END OF EVERY every-TH SECOND, LIKE Simulation.run RECORDS IT
+
+        states = self.sample(np.arange(every, int(round(self.end)) + 1, every)).reshape(-1, 2)
+
+        return Output(states[:, 0], states[:, 1])
+
+class Integrator:
+
+    def __init__(self, heater=None, pump=None, tank=None, water=None):
+
+        self.heater = heater if heater is not None else Heater()
+        self.pump = pump if pump is not None else Pump()
+        self.tank = tank if tank is not None else Storage_tank()
+        self.water = water if water is not None else Water()
+        self.engine = Engine(self.heater, self.pump, self.tank, self.water)
+
+    def inputs(self, n_secs):
+
+        # SECONDS AT WHICH IRRADIANCE OR OUTFLOW CHANGE, WITH THE COIL HEATING (°C/s) AND OUTFLOW RATE (m^3/s) FROM
+        # EACH ON
+
+        heating = self.engine.heating_per_second(secs_in_a_day)
+
+        day_changes = np.concatenate(([0], np.flatnonzero(np.diff(heating)) + 1))
+        solar_changes = (np.arange(0, n_secs, secs_in_a_day)[:, None] + day_changes[None, :]).ravel()
+
+        outflow = outflow_demand(self.tank, n_secs)
+        outflow_changes = self.tank.get_outflow_schedule().changes(n_secs)
+
+        changes = np.unique(np.concatenate((solar_changes[solar_changes < n_secs], outflow_changes)))
+
+        return changes, heating[changes % secs_in_a_day], outflow[changes]
+
+    def heater_hot(self, temp_h, h, threshold_h, step):
+
+        # FIRST WHOLE SECOND (<= step) AT WHICH THE HEATER, HEATED h °C A SECOND, IS AT ITS THRESHOLD
+
+        if temp_h >= threshold_h:
+            return 0
+        if h <= 0:
+            return step
+
+        n = max(1, int(np.ceil((threshold_h - temp_h) / h)))
+        while n > 1 and temp_h + h * (n - 1) >= threshold_h:
+            n -= 1
+        while temp_h + h * n < threshold_h:
+            n += 1
+
+        return min(n, step)
+
+    def tank_cooled(self, temp_t, r, lam, threshold_t, step):
+
+        # FIRST WHOLE SECOND (<= step) AT WHICH THE TANK, MIXING WITH OUTSIDE WATER, IS BELOW ITS THRESHOLD
+
+        f = lambda s: threshold_t - evolve(temp_t, r, lam, s)
+
+        if temp_t < threshold_t:
+            return 0
+        if lam == 0 or f(step) <= 0:
+            return step
+
+        n = max(1, int(np.ceil(locate(f, 0, step))))
+        while n > 1 and f(n - 1) > 0:
+            n -= 1
+        while n < step and f(n) <= 0:
+            n += 1
+
+        return n
+
+    def run(self, n_secs=secs_in_a_day):
+
+        heater, pump, tank, engine = self.heater, self.pump, self.tank, self.engine
+        threshold_h = heater.get_threshold_temperature()
+        threshold_t = tank.get_threshold_temperature()
+        temp_of_outside = tank.temp_of_outside
+
+        changes, heatings, outflows = self.inputs(n_secs)
+        changes = np.append(changes, n_secs)
+
+        temp_h, temp_t = float(heater.get_temperature()), float(tank.get_temperature())
+        starts, states, rates, decays = [], [], [], []
+
+        sec = 0
+        k = 0
+
+        while sec < n_secs:
+
+            while changes[k + 1] <= sec:
+                k += 1
+
+            h = float(heatings[k])
+            outflow = float(outflows[k])
+
+            # PUMP SECOND, EXACTLY LIKE Heater.update / Storage_tank.update
+
+            if temp_h >= threshold_h and temp_t < threshold_t:
+                start = (temp_h, temp_t)
+                temp_h, temp_t = engine.pump_step(sec, temp_h, temp_t, outflow, h)
+                starts.append(sec)
+                states.append(start)
+                rates.append((temp_h - start[0], temp_t - start[1]))
+                decays.append((0.0, 0.0))
+                sec += 1
+                continue
+
+            if pump.get_status():
+                pump.turn_off()
+                engine.pump_events.append((sec, False))
+
+            # IDLE UNTIL THE NEXT INPUT CHANGE, CUT SHORT WHERE THE HEATER STOPS HEATING OR THE PUMP HAS TO START
+
+            water_flow = outflow * 1 * 1000 #L
+            lam = -np.log((tank.capacity_of_storage_tank - water_flow) / tank.capacity_of_storage_tank) if outflow else 0.0
+            rate_t = lam * temp_of_outside
+
+            step = int(changes[k + 1]) - sec
+
+            if temp_h < threshold_h:
+                step = self.heater_hot(temp_h, h, threshold_h, step)
+            else:
+                step = self.tank_cooled(temp_t, rate_t, lam, threshold_t, step)
+
+            rate_h = h if temp_h < threshold_h else 0.0
+
+            starts.append(sec)
+            states.append((temp_h, temp_t))
+            rates.append((rate_h, rate_t))
+            decays.append((0.0, lam))
+
+            temp_h = evolve(temp_h, rate_h, 0, step)
+            temp_t = evolve(temp_t, rate_t, lam, step)
+            sec += step
+
+        heater.temp_of_water_in_heater = float(temp_h)
+        tank.temp_of_water_in_tank = float(temp_t)
+
+        return Trajectory(starts, states, rates, decays, n_secs)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Batched multi-scenario runner for parameter sweeps over the model of simulation.py
+"""
+
+import numpy as np
+
+import solar
+from simulation import secs_in_a_day, Water, Solar_panel, Heater, Pump, Storage_tank
+
+# EVERY SCENARIO PARAMETER IS AN ATTRIBUTE OF ONE OF THE COMPONENTS OF simulation.py, UNDER THE SAME NAME.
+# ALL N SCENARIOS ARE ADVANCED TOGETHER, ONE SECOND AT A TIME, AS (N,) STATE VECTORS
+
+components = {
+    'solar_panel': ['solar_panel_area', 'voltage_of_solar_panel'],
+    'heater': ['resistance_of_coil', 'capacity_of_heater', 'threshold_temperature_of_water_in_heater', 'temp_of_water_in_heater'],
+    'pump': ['flow_rate_of_pump'],
+    'tank': ['capacity_of_storage_tank', 'flow_rate', 'threshold_temperature_of_water_in_tank', 'temp_of_water_in_tank', 'temp_of_outside'],
+}
+
+scenario_dtype = np.dtype([(name, np.float64) for names in components.values() for name in names])
+
+
+def defaults():
+
+    # ONE SCENARIO HOLDING THE VALUES THE COMPONENTS ARE BUILT WITH
+
+    heater = Heater()
+    objects = {'solar_panel': heater.solar_panel, 'heater': heater, 'pump': Pump(), 'tank': Storage_tank()}
+
+    scenario = np.zeros((), dtype=scenario_dtype)
+    for component, names in components.items():
+        for name in names:
+            scenario[name] = getattr(objects[component], name)
+
+    return scenario
+
+def scenarios(n=1, **columns):
+
+    # n SCENARIOS AT THE DEFAULT VALUES, WITH ANY GIVEN COLUMN (SCALAR OR LENGTH n) OVERRIDDEN
+
+    table = np.full(n, defaults(), dtype=scenario_dtype)
+
+    for name, values in columns.items():
+        if name not in scenario_dtype.names:
+            raise KeyError('Unknown scenario parameter ' + name + '.')
+        table[name] = values
+
+    return table
+
+def from_table(table):
+
+    # ACCEPTS A STRUCTURED / RECORD ARRAY, A DICT OF COLUMNS OR A DATAFRAME-LIKE TABLE. MISSING COLUMNS KEEP THEIR
+    # DEFAULTS, UNKNOWN ONES RAISE LIKE IN scenarios
+
+    names = table.dtype.names if hasattr(table, 'dtype') and table.dtype.names else list(table.keys())
+    columns = {name: np.asarray(table[name]) for name in names}
+
+    if not columns:
+        raise ValueError('A scenario table needs at least one column.')
+
+    lengths = set(len(column) for column in columns.values())
+    if len(lengths) > 1:
+        raise ValueError('All columns of a scenario table must have the same length.')
+
+    return scenarios(lengths.pop(), **columns)
+
+def apply(scenario, heater=None, pump=None, tank=None):
+
+    # WRITES ONE SCENARIO ONTO simulation.py COMPONENTS, e.g. TO REPLAY IT WITH Simulation.run OR engine.Engine
+
+    heater = heater if heater is not None else Heater()
+    pump = pump if pump is not None else Pump()
+    tank = tank if tank is not None else Storage_tank()
+    objects = {'solar_panel': heater.solar_panel, 'heater': heater, 'pump': pump, 'tank': tank}
+
+    for component, names in components.items():
+        for name in names:
+            setattr(objects[component], name, scenario[name].item())
+
+    heater.solar_panel.solar_current_in_a_day = solar.daily_current(heater.solar_panel.solar_panel_area, heater.solar_panel.voltage_of_solar_panel, solar.irradiance_steps, secs_in_a_day) #A
+
+    return heater, pump, tank
+
+class Batch_output:
+
+    def __init__(self, temperatures_of_water_in_heater, temperatures_of_water_in_tank, seconds_of_pumping, record_every):
+
+        # TRACES ARE (N, RECORDS), RECORD j IS THE STATE AT THE END OF SECOND (j + 1) * record_every - 1
+
+        self.temperatures_of_water_in_heater = temperatures_of_water_in_heater
+        self.temperatures_of_water_in_tank = temperatures_of_water_in_tank
+        self.seconds_of_pumping = seconds_of_pumping
+        self.record_every = record_every
+
+    def get_heater_temperatures(self):
+        return self.temperatures_of_water_in_heater
+
+    def get_tank_temperatures(self):
+        return self.temperatures_of_water_in_tank
+
+class Batch:
+
+    def __init__(self, scenarios, outflow=None, solar_power=None):
+
+        # outflow IS A BOOLEAN PER-SECOND MASK, SHARED (n_secs,) OR PER SCENARIO (N, n_secs), e.g. FROM engine.outflow_mask.
+        # EVERY MARKED SECOND DRAWS THE SCENARIO'S flow_rate, OVERLAPPING DRAWS DO NOT ADD UP HERE
+        # A SHORTER MASK (e.g. ONE DAY) REPEATS OVER THE RUN.
+        # solar_power IS THE IRRADIANCE PER SECOND IN W/m^2 OVER ONE DAY, REPEATED OVER LONGER RUNS, BY DEFAULT THE PROFILE OF Solar_panel
+
+        self.scenarios = scenarios if scenarios.dtype == scenario_dtype else from_table(scenarios)
+        self.outflow = None if outflow is None else np.asarray(outflow, dtype=bool)
+        self.solar_power = np.asarray(solar_power if solar_power is not None else Solar_panel().solar_power_in_a_day, dtype=float)
+
+    def run(self, n_secs=secs_in_a_day, record_every=1, dtype=np.float64):
+
+        s = self.scenarios
+        n = len(s)
+        water = Water()
+
+        threshold_h = s['threshold_temperature_of_water_in_heater']
+        threshold_t = s['threshold_temperature_of_water_in_tank']
+        capacity_h = s['capacity_of_heater']
+        capacity_t = s['capacity_of_storage_tank']
+
+        # SAME ARITHMETIC AS Heater.heat_transfer: current = power * area / voltage, dT = current^2 * R / (c * m)
+
+        heating = (s['solar_panel_area'] / s['voltage_of_solar_panel'])**2 * s['resistance_of_coil'] / (water.get_specific_heat() * 1 * capacity_h)
+        power_squared = self.solar_power**2
+
+        water_flow_pump = s['flow_rate_of_pump'] * 1 * 1000 #L
+        water_flow_out = s['flow_rate'] * 1 * 1000 #L
+        keep = (capacity_t - water_flow_out) / capacity_t
+        inflow = water_flow_out * s['temp_of_outside'] / capacity_t
+
+        outflow = self.outflow
+        if outflow is None:
+            outflow = np.zeros(n_secs, dtype=bool)
+        shared = outflow.ndim == 1
+
+        temp_h = s['temp_of_water_in_heater'].copy()
+        temp_t = s['temp_of_water_in_tank'].copy()
+        seconds_of_pumping = np.zeros(n, dtype=np.int64)
+
+        traces_h = np.empty((n_secs // record_every, n), dtype=dtype)
+        traces_t = np.empty((n_secs // record_every, n), dtype=dtype)
+
+        pumping = np.empty(n, dtype=bool)
+        cold = np.empty(n, dtype=bool)
+        heat = np.empty(n, dtype=bool)
+        change = np.empty(n)
+        mixed = np.empty(n)
+
+        for sec in range(n_secs):
+
+            # PUMP RUNS WHERE THE HEATER IS AT ITS THRESHOLD AND THE TANK IS BELOW ITS OWN, RARE SO ONLY THOSE ARE MIXED
+
+            np.greater_equal(temp_h, threshold_h, out=pumping)
+            np.less(temp_t, threshold_t, out=cold)
+            np.logical_and(pumping, cold, out=pumping)
+
+            if pumping.any():
+                i = np.flatnonzero(pumping)
+                seconds_of_pumping[i] += 1
+                temp_h[i] = ((capacity_h[i] - water_flow_pump[i]) * temp_h[i] + water_flow_pump[i] * temp_t[i]) / capacity_h[i]
+                temp_t[i] = ((capacity_t[i] - water_flow_pump[i]) * temp_h[i] + water_flow_pump[i] * temp_t[i]) / capacity_t[i]
+
+            # COIL HEATS THE HEATER WHEREVER IT IS BELOW ITS THRESHOLD
+
+            if power_squared[sec % len(power_squared)]:
+                np.less(temp_h, threshold_h, out=heat)
+                np.multiply(heating, power_squared[sec % len(power_squared)], out=change)
+                np.add(temp_h, change, out=temp_h, where=heat)
+
+            # OUTFLOW MIXES THE TANK WITH OUTSIDE WATER
+
+            if shared:
+                if outflow[sec % len(outflow)]:
+                    np.multiply(temp_t, keep, out=mixed)
+                    np.add(mixed, inflow, out=temp_t)
+            else:
+                np.multiply(temp_t, keep, out=mixed)
+                np.add(mixed, inflow, out=temp_t, where=outflow[:, sec % outflow.shape[1]])
+
+            if (sec + 1) % record_every == 0:
+                traces_h[sec // record_every] = temp_h
+                traces_t[sec // record_every] = temp_t
+
+        return Batch_output(traces_h.T, traces_t.T, seconds_of_pumping, record_every)
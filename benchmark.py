@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for the simulation engines: speed, memory and an accuracy check against stored reference runs
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import Config
+
+# python benchmark.py [--scenarios day month ...] [--engines engine batch ...] [--full] [--json results.json] [--skip-imports]
+#
+# EVERY (SCENARIO, ENGINE) PAIR RUNS IN A FRESH PROCESS, SO ITS PEAK RSS IS ITS OWN. IT IS TIMED ONCE, THEN ITS
+# FIRST DAY IS RUN AGAIN UNDER tracemalloc FOR THE PEAK OF PYTHON ALLOCATIONS PER SIMULATED SECOND (NUMPY BUFFERS
+# INCLUDED). steps/s COUNTS SIMULATED SECONDS, TIMES THE NUMBER OF SCENARIOS FOR A SWEEP.
+#
+# ACCURACY: THE HEATER AND TANK TEMPERATURES AT THE END OF EVERY DAY ARE COMPARED WITH reference_file, WRITTEN BY
+# THE PER-SECOND LOOPS (simulation.Simulation.simulate FOR THE simulation.py MODEL, main.Simulation.simulate FOR
+# main.py) WITH --update-reference. THE SWEEP'S REFERENCE COMES FROM engine.Engine, WHICH checks.py HOLDS TO THE
+# LOOP. A RESULT FURTHER OFF THAN ITS ENGINE'S TOLERANCE FAILS THE RUN, SO A CHANGE THAT MAKES THINGS FASTER BUT
+# ALTERS THE PHYSICS SHOWS UP HERE.
+#
+# IMPORT TIME: EVERY MODULE OF import_budgets IS IMPORTED IN A FRESH INTERPRETER, BEST OF import_repeats. ONE THAT
+# TAKES LONGER THAN ITS BUDGET (s, NUMPY INCLUDED) OR LOADS matplotlib WITHOUT PLOTTING FAILS THE RUN, SO SHORT
+# HEADLESS JOBS KEEP STARTING FAST. --skip-imports LEAVES IT OUT.
+
+reference_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_reference.json')
+sweep_size = 1000
+sweep_seed = 12345
+
+draws = [(25200, 600), (43200, 900), (68400, 1200)]
+
+scenarios = {
+    'day': Config('day', outflow=draws),
+    'month': Config('month', outflow=draws, days=30),
+    'year': Config('year', outflow=draws, days=365),
+    'dense': Config('dense', outflow=[(start, 20) for start in range(600, 86000, 40)]),
+    'sweep': Config('sweep', outflow=draws),
+}
+
+# ENGINE: (MODEL IT REPRODUCES, TOLERANCE IN °C OR None WHEN ONLY REPORTED, SCENARIOS IT RUNS WITHOUT --full).
+# --full ADDS THE OTHER SCENARIOS EXCEPT THE SWEEP, WHICH STAYS WITH THE ENGINES THAT RUN IT IN SECONDS
+
+engines = {
+    'simulation': ('simulation', 1e-9, ['day', 'month', 'dense']),
+    'engine': ('simulation', 1e-9, ['day', 'month', 'year', 'dense', 'sweep']),
+    'batch': ('simulation', 1e-9, ['day', 'sweep']),
+    'adaptive': ('simulation', 1e-9, ['day', 'month', 'year', 'dense']),
+    'main': ('main', 1e-9, ['day', 'month', 'dense']),
+    'scheduler': ('main', 1e-9, ['day', 'month', 'year', 'dense']),
+}
+
+import_budgets = {'simulation': 0.3, 'main': 0.3, 'engine': 0.3, 'batch': 0.3, 'config': 0.3, 'farm': 0.3, 'checkpoint': 0.3,
+                  'montecarlo': 0.3, 'network': 0.3, 'optimize': 0.3}
+import_repeats = 3
+import_probe = 'import sys, time; start = time.perf_counter(); import {0}; print(time.perf_counter() - start, "matplotlib" in sys.modules)'
+
+
+def sweep_parameters(n=sweep_size):
+
+    # n RANDOM BUT REPEATABLE PARAMETER SETS AROUND THE DEFAULTS
+
+    import batch
+
+    rng = np.random.default_rng(sweep_seed)
+
+    return batch.scenarios(n, capacity_of_storage_tank=rng.uniform(300, 1500, n), capacity_of_heater=rng.uniform(50, 200, n),
+                           threshold_temperature_of_water_in_tank=rng.uniform(40, 65, n), flow_rate_of_pump=rng.uniform(0.0002, 0.002, n),
+                           flow_rate=rng.uniform(0.0002, 0.001, n))
+
+def sweep_configs(scenario):
+    table = sweep_parameters()
+    return [Config('sweep_' + str(k), parameters={name: row[name].item() for name in table.dtype.names}, outflow=scenario.outflow) for k, row in enumerate(table)]
+
+def components(scenario):
+    heater, pump, tank = scenario.apply_parameters()
+    scenario.apply_schedule(tank)
+    return heater, pump, tank
+
+def end_of_days(trace, days):
+    return np.asarray(trace)[np.arange(1, days + 1) * 86400 - 1]
+
+def run_simulation(scenario, days):
+    from simulation import Water, Output, Simulation
+    output = Output()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        Simulation().simulate(Water(), *components(scenario), output, days * 86400)
+    return end_of_days(output.get_heater_temperatures(), days), end_of_days(output.get_tank_temperatures(), days)
+
+def run_engine(scenario, days):
+    from engine import Engine
+    output = Engine(*components(scenario)).run(days * 86400)
+    return end_of_days(output.get_heater_temperatures(), days), end_of_days(output.get_tank_temperatures(), days)
+
+def run_adaptive(scenario, days):
+    from adaptive import Integrator
+    states = Integrator(*components(scenario)).run(days * 86400).sample(np.arange(1, days + 1) * 86400)
+    return states[:, 0], states[:, 1]
+
+def run_main(scenario, days, simulation=None):
+    if simulation is None:
+        from main import Simulation as simulation
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        run = simulation(scenario)
+        run.simulate(days)
+    return end_of_days(run.periodicTempInHeater, days), end_of_days(run.periodicTempInTank, days)
+
+def run_scheduler(scenario, days):
+    from scheduler import EventDrivenSimulation
+    return run_main(scenario, days, EventDrivenSimulation)
+
+def run_batch(scenarios, days):
+
+    # ONE VECTORIZED RUN OVER ALL scenarios, WHICH SHARE THEIR OUTFLOW TIMES
+
+    import batch
+    from engine import outflow_mask
+
+    table = batch.scenarios(len(scenarios), **{name: [scenario.scenario()[name] for scenario in scenarios] for name in batch.scenario_dtype.names})
+    mask = outflow_mask(components(scenarios[0])[2])
+    output = batch.Batch(table, outflow=mask).run(days * 86400, record_every=86400)
+
+    return output.get_heater_temperatures(), output.get_tank_temperatures()
+
+runners = {'simulation': run_simulation, 'engine': run_engine, 'adaptive': run_adaptive, 'main': run_main, 'scheduler': run_scheduler}
+
+def run(engine, scenario, days):
+
+    # END-OF-DAY (HEATER, TANK), (SCENARIOS, DAYS) FOR A SWEEP, (DAYS,) OTHERWISE
+
+    if scenario.name != 'sweep':
+        if engine == 'batch':
+            heater, tank = run_batch([scenario], days)
+            return heater[0], tank[0]
+        return runners[engine](scenario, days)
+
+    configs = sweep_configs(scenario)
+
+    if engine == 'batch':
+        return run_batch(configs, days)
+
+    results = [runners[engine](config, days) for config in configs]
+
+    return np.array([heater for heater, tank in results]), np.array([tank for heater, tank in results])
+
+def measure(engine, name):
+
+    # RUNS IN A FRESH PROCESS: TIMED RUN, PEAK RSS, THEN A TRACED ONE-DAY RUN
+
+    scenario = scenarios[name]
+    copies = sweep_size if name == 'sweep' else 1
+
+    start = time.perf_counter()
+    heater, tank = run(engine, scenario, scenario.days)
+    wall = time.perf_counter() - start
+
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1 << 20 if sys.platform == 'darwin' else 1 << 10) #MB
+    except ImportError:
+        rss = None
+
+    tracemalloc.start()
+    run(engine, scenario, 1)
+    traced = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'scenario': name, 'engine': engine, 'wall': wall, 'steps_per_sec': scenario.n_secs() * copies / wall,
+            'peak_rss_mb': rss, 'bytes_per_sec': traced / (86400 * copies), 'heater': heater.tolist(), 'tank': tank.tolist()}
+
+def import_time(module):
+
+    # BEST WALL TIME OF import module IN A NEW INTERPRETER, AND WHETHER IT LOADED matplotlib
+
+    times, plotting = [], False
+
+    for k in range(import_repeats):
+        output = subprocess.run([sys.executable, '-c', import_probe.format(module)], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+        times.append(float(output[0]))
+        plotting = plotting or output[1] == 'True'
+
+    return min(times), plotting
+
+def check_imports():
+
+    # NUMBER OF MODULES OVER THEIR BUDGET OR LOADING matplotlib
+
+    failed = 0
+
+    print('{:<12} {:>9} {:>9} {:>11}'.format('module', 'import(s)', 'budget(s)', 'matplotlib'))
+
+    for module, budget in import_budgets.items():
+        seconds, plotting = import_time(module)
+        passed = seconds <= budget and not plotting
+        failed += not passed
+        print('{:<12} {:>9.3f} {:>9.3f} {:>11} {}'.format(module, seconds, budget, 'yes' if plotting else 'no', '' if passed else 'FAILED'))
+
+    print()
+
+    return failed
+
+def isolated(function, *args):
+
+    # function(*args) IN A NEW PROCESS
+
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(function, *args).result()
+
+def reference_run(model, name):
+
+    scenario = scenarios[name]
+
+    if name == 'sweep':
+        heater, tank = run('engine', scenario, scenario.days)
+    else:
+        heater, tank = run('simulation' if model == 'simulation' else 'main', scenario, scenario.days)
+
+    return {'heater': heater.tolist(), 'tank': tank.tolist()}
+
+def update_reference(names):
+
+    # PER-SECOND LOOPS OF BOTH MODELS, EACH IN ITS OWN PROCESS. A YEAR TAKES SEVERAL MINUTES
+
+    reference = load_reference()
+
+    for model in ('simulation', 'main'):
+        for name in names:
+            if name == 'sweep' and model == 'main':
+                continue
+            print('Reference ' + model + ' / ' + name + ' ...')
+            reference.setdefault(model, {})[name] = isolated(reference_run, model, name)
+
+    with open(reference_file, 'w') as f:
+        json.dump(reference, f)
+
+def load_reference():
+
+    if not os.path.exists(reference_file):
+        return {}
+
+    with open(reference_file) as f:
+        return json.load(f)
+
+def error(result, reference):
+
+    # LARGEST END-OF-DAY DIFFERENCE FROM THE REFERENCE (°C), None WITHOUT ONE
+
+    model = engines[result['engine']][0]
+    expected = reference.get(model, {}).get(result['scenario'])
+
+    if expected is None:
+        return None
+
+    return max(float(np.abs(np.asarray(result[key]) - np.asarray(expected[key])).max()) for key in ('heater', 'tank'))
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Times every engine on fixed scenarios and checks their end-of-day temperatures.')
+    parser.add_argument('--scenarios', nargs='+', choices=list(scenarios), default=list(scenarios))
+    parser.add_argument('--engines', nargs='+', choices=list(engines), default=list(engines))
+    parser.add_argument('--full', action='store_true', help='also run the per-second loops on the slowest scenarios')
+    parser.add_argument('--update-reference', action='store_true', help='rerun the reference loops and store their results')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--skip-imports', action='store_true', help='do not check the import time of the modules')
+    args = parser.parse_args(argv)
+
+    if args.update_reference:
+        update_reference(args.scenarios)
+
+    reference = load_reference()
+    results = []
+    failed = 0 if args.skip_imports else check_imports()
+
+    print('{:<10} {:<11} {:>9} {:>12} {:>9} {:>10} {:>10}'.format('scenario', 'engine', 'wall(s)', 'steps/s', 'RSS(MB)', 'B/sim s', 'error(°C)'))
+
+    for name in args.scenarios:
+        for engine in args.engines:
+            model, limit, default_scenarios = engines[engine]
+            if name not in default_scenarios and (not args.full or name == 'sweep'):
+                continue
+
+            result = isolated(measure, engine, name)
+            result['error'] = error(result, reference)
+            result['passed'] = limit is None or result['error'] is None or result['error'] <= limit
+            failed += not result['passed']
+            results.append(result)
+
+            print('{:<10} {:<11} {:>9.3f} {:>12.4g} {:>9} {:>10.4g} {:>10} {}'.format(
+                name, engine, result['wall'], result['steps_per_sec'], 'n/a' if result['peak_rss_mb'] is None else '{:.0f}'.format(result['peak_rss_mb']),
+                result['bytes_per_sec'], 'n/a' if result['error'] is None else '{:.2e}'.format(result['error']), '' if result['passed'] else 'FAILED'))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump([{key: value for key, value in result.items() if key not in ('heater', 'tank')} for result in results], f, indent=1)
+
+    if failed:
+        print(str(failed) + ' runs differ from the reference or modules exceed their import budget.')
+
+    return failed
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed on-disk cache of simulation results, keyed by a fingerprint of the whole scenario
+"""
+
+import contextlib
+import hashlib
+import importlib.util
+import json
+import os
+import zipfile
+import zlib
+
+import numpy as np
+
+import solar
+
+# A RESULT IS STORED UNDER THE SHA-256 OF EVERYTHING THAT DECIDES IT: THE SCENARIO PARAMETERS, THE OUTFLOW
+# SCHEDULE (WITH EACH DRAW'S FLOW RATE RESOLVED), THE NUMBER OF DAYS, record_every, THE SOLAR PROFILE AND THE
+# MODEL. THE SCENARIO'S NAME AND animation ARE LEFT OUT, SO IDENTICAL SCENARIOS UNDER DIFFERENT NAMES SHARE ONE
+# ENTRY. THE MODEL IS EITHER
+#   * 'simulation': THE MODEL OF simulation.py, RUN WITH engine.Engine (SAME TRACES AS Simulation.run TO 1e-9 °C)
+#   * 'main': main.Simulation, EVENT BY EVENT
+#
+# EVERY FILE NAME STARTS WITH A VERSION: THE HASH OF THE SOURCE OF THE MODULES THE MODEL IS MADE OF (models). ANY
+# CHANGE TO THAT CODE GIVES NEW FILE NAMES, AND THE OLD ENTRIES ARE NEVER READ AGAIN AND ARE EVICTED FIRST.
+#
+# AN ENTRY IS ONE COMPRESSED .npz WITH THE heater AND tank TRACES, THE pump_events (SECOND, ON) ROWS ('simulation'
+# ONLY) AND A JSON summary. READING ONE TOUCHES ITS MODIFICATION TIME, AND ONCE THE CACHE HOLDS MORE THAN
+# max_bytes OR max_entries THE LEAST RECENTLY USED ENTRIES ARE DELETED.
+
+models = {
+    'simulation': ['simulation', 'engine', 'solar', 'outflow', 'batch', 'config'],
+    'main': ['main', 'solar', 'outflow', 'config'],
+}
+
+format_version = 1
+versions = {}
+
+
+def version(model):
+
+    # HASH OF THE SOURCE OF THE MODULES OF model, ONCE PER PROCESS. THE FILES ARE FOUND WITHOUT IMPORTING THEM
+
+    if model not in versions:
+        digest = hashlib.sha256(str(format_version).encode())
+        for name in models[model]:
+            with open(importlib.util.find_spec(name).origin, 'rb') as f:
+                digest.update(f.read())
+        versions[model] = digest.hexdigest()[:16]
+
+    return versions[model]
+
+def fingerprint(config, model='simulation', record_every=1):
+
+    # SHA-256 OF THE SCENARIO (A config.Config) AS RUN BY model
+
+    if model not in models:
+        raise ValueError('Unknown model ' + repr(model) + ', expected one of ' + ', '.join(models) + '.')
+
+    scenario = config.scenario()
+    heater, pump, tank = config.apply_parameters()
+
+    description = {
+        'model': model,
+        'parameters': {name: scenario[name].item() for name in scenario.dtype.names},
+        'outflow': [[start, duration, scenario['flow_rate'].item() if flow_rate is None else flow_rate] for start, duration, flow_rate in config.outflow],
+        'days': config.days,
+        'record_every': record_every,
+        'irradiance_steps': list(solar.irradiance_steps),
+    }
+
+    digest = hashlib.sha256(json.dumps(description, sort_keys=True).encode())
+    digest.update(np.ascontiguousarray(heater.solar_panel.solar_current_in_a_day, dtype=float).tobytes())
+
+    return digest.hexdigest()
+
+def summarize(heater, tank, pump_events):
+    return {'final_heater': float(heater[-1]), 'final_tank': float(tank[-1]), 'min_tank': float(tank.min()),
+            'max_tank': float(tank.max()), 'mean_tank': float(tank.mean()), 'pump_starts': int(sum(on for sec, on in pump_events))}
+
+class Cached_result:
+
+    def __init__(self, heater, tank, pump_events, summary, hit):
+
+        # TRACES KEEP ONE STATE EVERY record_every SECONDS, hit TELLS WHETHER IT CAME FROM THE CACHE
+
+        self.temperatures_of_water_in_heater = heater
+        self.temperatures_of_water_in_tank = tank
+        self.pump_events = pump_events
+        self.summary = summary
+        self.hit = hit
+
+    def get_heater_temperatures(self):
+        return self.temperatures_of_water_in_heater
+
+    def get_tank_temperatures(self):
+        return self.temperatures_of_water_in_tank
+
+class Result_cache:
+
+    def __init__(self, directory, max_bytes=1 << 30, max_entries=None):
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key, model):
+        return os.path.join(self.directory, version(model) + '-' + key + '.npz')
+
+    def get(self, key, model='simulation'):
+
+        # THE Cached_result UNDER key, OR None
+
+        path = self.path(key, model)
+
+        if not os.path.exists(path):
+            return None
+
+        # AN ENTRY THAT CANNOT BE READ BACK (TRUNCATED, CORRUPT, FROM AN OLDER LAYOUT) IS A MISS AND IS DROPPED
+
+        try:
+            with np.load(path) as entry:
+                result = Cached_result(entry['heater'], entry['tank'], entry['pump_events'], json.loads(entry['summary'].item()), True)
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile, zlib.error):
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            return None
+
+        os.utime(path)
+
+        return result
+
+    def put(self, key, heater, tank, pump_events=(), model='simulation'):
+
+        heater, tank = np.asarray(heater, dtype=float), np.asarray(tank, dtype=float)
+        pump_events = np.array(pump_events, dtype=np.int64).reshape(-1, 2)
+        summary = summarize(heater, tank, pump_events)
+
+        # WRITTEN UNDER A TEMPORARY NAME FIRST, SO A KILLED JOB NEVER LEAVES A TRUNCATED ENTRY BEHIND
+
+        path = self.path(key, model)
+        partial = path[:-len('.npz')] + '.' + str(os.getpid()) + '.partial.npz'
+        np.savez_compressed(partial, heater=heater, tank=tank, pump_events=pump_events, summary=np.array(json.dumps(summary)))
+        os.replace(partial, path)
+
+        self.evict()
+
+        return Cached_result(heater, tank, pump_events, summary, False)
+
+    def entries(self):
+
+        # (PATH, SIZE, LAST USE) OF EVERY ENTRY, STALE VERSIONS FIRST, THEN LEAST RECENTLY USED FIRST
+
+        current = set(version(model) for model in models)
+        entries = []
+
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz') and not name.endswith('.partial.npz'):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((name.split('-')[0] in current, stat.st_mtime, path, stat.st_size))
+
+        entries.sort()
+
+        return [(path, size, used) for fresh, used, path, size in entries]
+
+    def evict(self):
+
+        entries = self.entries()
+        total = sum(size for path, size, used in entries)
+        count = len(entries)
+
+        for path, size, used in entries:
+            if total <= self.max_bytes and (self.max_entries is None or count <= self.max_entries):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            count -= 1
+
+    def clear(self):
+        for path, size, used in self.entries():
+            os.remove(path)
+
+    def run(self, config, record_every=1, model='simulation'):
+
+        # RESULT OF A config.Config, FROM THE CACHE WHEN IT HAS ALREADY BEEN RUN
+
+        key = fingerprint(config, model, record_every)
+        result = self.get(key, model)
+
+        if result is not None:
+            return result
+
+        if model == 'main':
+            heater, tank, pump_events = run_main(config)
+        else:
+            from engine import Engine
+            heater, pump, tank = config.apply_parameters()
+            config.apply_schedule(tank)
+            engine = Engine(heater, pump, tank)
+            output = engine.run(config.n_secs())
+            heater, tank, pump_events = output.get_heater_temperatures(), output.get_tank_temperatures(), engine.pump_events
+
+        heater = np.asarray(heater)[record_every - 1:: record_every]
+        tank = np.asarray(tank)[record_every - 1:: record_every]
+
+        return self.put(key, heater, tank, pump_events, model)
+
+def run_main(config):
+
+    # TRACES OF main.Simulation FOR config, WITHOUT PLOTTING
+
+    import main
+
+    simulation = main.Simulation(config)
+    simulation.simulate(config.days)
+
+    return simulation.periodicTempInHeater, simulation.periodicTempInTank, ()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshots of a running simulation and what-if re-simulation from the last one before an edit
+"""
+
+import contextlib
+import os
+import pickle
+
+import numpy as np
+
+from simulation import secs_in_a_day, Water, Pump, Output, Simulation
+
+# A SNAPSHOT IS THE PICKLED DYNAMIC STATE OF THE HEATER, PUMP AND TANK (bytes, SO IT CAN BE SAVED OR SENT ANYWHERE):
+# THE ATTRIBUTES IN dynamics, SO AN OUTFLOW IN PROGRESS (flag_flow, water_flow), THE PUMP STATE, THE COIL, THE LAYERS
+# OF A stratified.Stratified_tank WITH THEIR PENDING IDLE SECONDS, ... ALL COME BACK WITH restore, WHILE THE
+# PARAMETERS, SCHEDULE AND SOLAR PANEL ARE THOSE OF THE COMPONENTS IT IS RESTORED INTO. simulation.py HAS NO EVENT
+# QUEUE, WHAT IS IN FLIGHT AT A SECOND IS ALL IN THOSE ATTRIBUTES.
+#
+# A Session RUNS A config.Config AND TAKES A SNAPSHOT EVERY every SECONDS. run(config) WITH AN EDITED SCENARIO FINDS
+# THE FIRST SECOND WHOSE INPUTS DIFFER (THE FIRST SECOND OF THE DAY WHERE THE OUTFLOW RATE DIFFERS, ELSE THE END OF
+# THE SHORTER HORIZON), RESTORES THE LAST SNAPSHOT AT OR BEFORE IT INTO FRESH COMPONENTS FOR THE NEW SCENARIO, KEEPS
+# THE TRACES UP TO THERE AND ONLY SIMULATES THE REST. AN EVENING DRAW MOVED WITH HOURLY SNAPSHOTS RE-RUNS A FEW HOURS
+# OF A DAY, WELL UNDER A SECOND. A CHANGED PARAMETER CHANGES THE RUN FROM ITS FIRST SECOND (THE INITIAL TEMPERATURES
+# ARE PARAMETERS TOO), SO EVERY SNAPSHOT IS DROPPED AND THE SCENARIO RUNS AFRESH.
+#
+# THE OUTFLOW SCHEDULE REPEATS EVERY DAY, SO ON A RUN OF SEVERAL DAYS AN EDIT RE-RUNS FROM ITS SECOND ON THE FIRST DAY.
+
+dynamics = ('temp_of_water_in_heater', 'temp_of_coil', 'water_from_heater_to_tank', 'heated_at', 'pumped_at', 'tank_satisfied',
+            'flag_flow', 'temp_of_water_in_tank', 'water_flow', 'temperatures', 'idle', 'stepped')
+
+
+def state(component):
+    return {name: value for name, value in vars(component).items() if name in dynamics}
+
+def snapshot(heater, pump, tank):
+    return pickle.dumps((state(heater), state(pump), state(tank)), protocol=pickle.HIGHEST_PROTOCOL)
+
+def restore(data, heater, pump, tank):
+
+    # PUTS THE STATE OF A snapshot BACK INTO COMPONENTS, WHICH KEEP THEIR OWN PARAMETERS
+
+    for component, attributes in zip((heater, pump, tank), pickle.loads(data)):
+        vars(component).update(attributes)
+
+def first_change(old, new):
+
+    # FIRST SECOND AT WHICH RUNNING new DIFFERS FROM RUNNING old, None IF NOT WITHIN THE HORIZON OF new
+
+    if old.parameters != new.parameters:
+        return 0
+
+    tanks = []
+    for config in (old, new):
+        heater, pump, tank = config.apply_parameters()
+        config.apply_schedule(tank)
+        tanks.append(tank.get_outflow_schedule().per_second(secs_in_a_day))
+
+    changed = np.flatnonzero(tanks[0] != tanks[1])
+    first = int(changed[0]) if len(changed) else None
+
+    if first is None and new.n_secs() > old.n_secs():
+        first = old.n_secs()
+
+    return first
+
+class Session:
+
+    def __init__(self, simulation=None, every=3600, quiet=True):
+
+        # simulation BUILDS THE COMPONENTS AND RUNS THE LOOP, WITH ITS layers, losses OR weather
+
+        self.simulation = Simulation() if simulation is None else simulation
+        self.every = every #s BETWEEN SNAPSHOTS
+        self.quiet = quiet
+        self.config = None
+        self.snapshots = {} #SECOND -> snapshot OF THE STATE BEFORE IT
+        self.output = Output()
+        self.resumed_at = None
+
+    def components(self, config):
+
+        heater, pump, tank = config.apply_parameters(self.simulation.make_heater(), Pump(), self.simulation.make_tank())
+        config.apply_schedule(tank)
+
+        return heater, pump, tank
+
+    def run(self, config):
+
+        # output FOR config, RE-SIMULATED FROM THE LAST SNAPSHOT BEFORE ITS FIRST CHANGE SINCE THE PREVIOUS RUN
+
+        n_secs = config.n_secs()
+        first = 0 if self.config is None else first_change(self.config, config)
+        first = n_secs if first is None else min(first, n_secs)
+
+        if first == 0:
+            self.snapshots = {}
+
+        start = max([sec for sec in self.snapshots if sec <= first], default=0)
+
+        heater, pump, tank = self.components(config)
+
+        if start in self.snapshots:
+            restore(self.snapshots[start], heater, pump, tank)
+        else:
+            self.snapshots[0] = snapshot(heater, pump, tank)
+
+        self.snapshots = {sec: data for sec, data in self.snapshots.items() if sec <= start}
+        self.config = config
+        self.resumed_at = start
+
+        del self.output.temperatures_of_water_in_heater[start:]
+        del self.output.temperatures_of_water_in_tank[start:]
+
+        with contextlib.ExitStack() as stack:
+            if self.quiet:
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+            self.advance(heater, pump, tank, start, n_secs)
+
+        return self.output
+
+    def advance(self, heater, pump, tank, start, n_secs):
+
+        # SEGMENT BY SEGMENT UP TO n_secs, A SNAPSHOT AT EVERY MULTIPLE OF every
+
+        water = Water()
+
+        with self.simulation.attached(water, heater, pump, tank, self.output):
+            while start < n_secs:
+                stop = min((start // self.every + 1) * self.every, n_secs)
+                self.simulation.loop(water, heater, pump, tank, self.output, stop, start)
+                start = stop
+
+                if start % self.every == 0:
+                    self.snapshots[start] = snapshot(heater, pump, tank)
+
+    def save(self, path):
+
+        # SNAPSHOTS, TRACES AND SCENARIO, FOR load IN ANOTHER PROCESS
+
+        with open(path, 'wb') as f:
+            pickle.dump({'every': self.every, 'config': self.config, 'snapshots': self.snapshots,
+                         'traces': (list(self.output.get_heater_temperatures()), list(self.output.get_tank_temperatures()))}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load(path, simulation=None, quiet=True):
+
+    with open(path, 'rb') as f:
+        saved = pickle.load(f)
+
+    session = Session(simulation, saved['every'], quiet)
+    session.config = saved['config']
+    session.snapshots = saved['snapshots']
+    session.output = Output(*saved['traces'])
+
+    return session
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Regression checks of the fast engines and what-if re-runs against the per-second loop of simulation.Simulation.run
+"""
+
+import contextlib
+import os
+import sys
+
+import numpy as np
+
+import adaptive
+import checkpoint
+from config import Config
+from engine import Engine, tolerance
+from simulation import Water, Output, Simulation
+
+# python checks.py
+#
+# EVERY CHECK RUNS A FAST ENGINE AND THE PER-SECOND LOOP OF Simulation.run ON THE SAME SCENARIOS AND RAISES
+# AssertionError WHEN THE HEATER OR TANK TRACES DIFFER BY MORE THAN THE ENGINE'S DOCUMENTED TOLERANCE.
+
+scenarios = [
+    Config('no_outflow'),
+    Config('one_long_draw', outflow=[(25000, 3000)]),
+    Config('three_draws', outflow=[(25000, 600), (40000, 900), (64800, 1200)]),
+    Config('hourly_draws', outflow=[(start, 300) for start in range(3600, 80000, 3600)]),
+    Config('overlapping_draws', outflow=[(30000, 1800), (30600, 600, 0.0002), (61200, 900, 0.001)]),
+    Config('small_tank', parameters={'capacity_of_storage_tank': 300, 'threshold_temperature_of_water_in_tank': 60}, outflow=[(36000, 1200)]),
+    Config('ten_days', days=10, outflow=[(25000, 600), (40000, 900), (64800, 1200)]),
+]
+
+
+def components(scenario):
+    heater, pump, tank = scenario.apply_parameters()
+    scenario.apply_schedule(tank)
+    return heater, pump, tank
+
+def reference(scenario):
+
+    # TRACES OF THE PER-SECOND LOOP, ITS PRINTS DISCARDED
+
+    heater, pump, tank = components(scenario)
+    output = Output()
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        Simulation().simulate(Water(), heater, pump, tank, output, scenario.n_secs())
+
+    return np.array(output.get_heater_temperatures()), np.array(output.get_tank_temperatures())
+
+def compare(name, traces, expected, limit):
+
+    error = max(np.abs(np.asarray(trace) - reference_trace).max() for trace, reference_trace in zip(traces, expected))
+
+    if not error <= limit:
+        raise AssertionError(name + ' differs from Simulation.run by ' + str(error) + ' °C, more than ' + str(limit) + ' °C.')
+
+    return error
+
+def check_engine(references):
+
+    # engine.Engine MATCHES Simulation.run TO engine.tolerance
+
+    errors = {}
+
+    for scenario in scenarios:
+        output = Engine(*components(scenario)).run(scenario.n_secs())
+        traces = (output.get_heater_temperatures(), output.get_tank_temperatures())
+        errors[scenario.name] = compare('Engine on ' + scenario.name, traces, references[scenario.name], tolerance)
+
+    return errors
+
+def check_adaptive(references):
+
+    # adaptive.Integrator MATCHES Simulation.run TO adaptive.accuracy
+
+    errors = {}
+
+    for scenario in scenarios:
+        output = adaptive.Integrator(*components(scenario)).run(scenario.n_secs()).output()
+        traces = (output.get_heater_temperatures(), output.get_tank_temperatures())
+        errors[scenario.name] = compare('Integrator on ' + scenario.name, traces, references[scenario.name], adaptive.accuracy)
+
+    return errors
+
+def check_checkpoint(references):
+
+    # ONE checkpoint.Session RUNS THE SCENARIOS ONE AFTER THE OTHER AS EDITS OF THE PREVIOUS ONE, AND EVERY WHAT-IF RUN
+    # MATCHES A FRESH Simulation.run EXACTLY. THE LAST EDIT ONLY CHANGES PARAMETERS
+
+    errors = {}
+    session = checkpoint.Session()
+    edited = Config('edited_parameters', parameters={'threshold_temperature_of_water_in_heater': 60, 'capacity_of_storage_tank': 500},
+                    outflow=scenarios[2].outflow)
+
+    for scenario in scenarios + [edited]:
+        output = session.run(scenario)
+        traces = (output.get_heater_temperatures(), output.get_tank_temperatures())
+        expected = references[scenario.name] if scenario.name in references else reference(scenario)
+        errors[scenario.name] = compare('Session on ' + scenario.name, traces, expected, 0)
+
+    return errors
+
+checks = [check_engine, check_adaptive, check_checkpoint]
+
+def main():
+
+    references = {scenario.name: reference(scenario) for scenario in scenarios}
+    failed = 0
+
+    for check in checks:
+        try:
+            errors = check(references)
+        except AssertionError as error:
+            print(check.__name__ + ' FAILED: ' + str(error))
+            failed += 1
+        else:
+            print(check.__name__ + ' passed, largest error ' + str(max(errors.values())) + ' °C.')
+
+    return failed
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Headless command line runner for scenario files, writes results without plotting
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+import cache
+import config
+import pyramid
+from engine import Engine
+
+# python cli.py scenarios/ more.yaml -o results/ --record-every 60 --workers 8
+#
+# EVERY SCENARIO OF EVERY FILE (SEE config.py) IS RUN WITH engine.Engine AND WRITTEN TO <output>/<name>.npz
+# WITH THE heater AND tank TRACES, ONE VALUE PER record_every SECONDS, AND THE pump_events AS (SECOND, ON) ROWS.
+# <output>/summary.csv HOLDS ONE ROW PER SCENARIO. EVERY RESULT FILE ALSO STORES THE SCENARIO AND record_every IT
+# WAS RUN WITH (settings). RESULTS ALREADY ON DISK ARE KEPT IF THOSE ARE UNCHANGED, UNLESS --overwrite IS GIVEN, SO
+# AN INTERRUPTED RUN IS RESUMED BY STARTING IT AGAIN. A SCENARIO THAT FAILS GETS ITS error IN summary.csv, THE
+# OTHERS ARE STILL RUN AND WRITTEN, AND THE EXIT STATUS IS 1. WITH --plot png (OR svg) EACH SCENARIO ALSO GETS A
+# <name>.png OF ITS TRACES, DRAWN FROM MIN / MAX PYRAMIDS WITHOUT A DISPLAY (SEE pyramid.py). WITH --cache DIR
+# SCENARIOS THAT HAVE BEEN RUN BEFORE, IN ANY JOB AND UNDER ANY NAME, ARE READ FROM DIR (SEE cache.py).
+
+summary_fields = ['name', 'days', 'final_heater', 'final_tank', 'min_tank', 'max_tank', 'pump_starts', 'error']
+
+
+def summarize(name, days, heater, tank, pump_events):
+    return {'name': name, 'days': days, 'final_heater': float(heater[-1]), 'final_tank': float(tank[-1]),
+            'min_tank': float(tank.min()), 'max_tank': float(tank.max()), 'pump_starts': int(sum(on for sec, on in pump_events)), 'error': ''}
+
+def settings(scenario, record_every):
+
+    # EVERYTHING A RESULT FILE DEPENDS ON, AS A JSON STRING STORED IN IT
+
+    return json.dumps({'scenario': scenario.to_dict(), 'record_every': record_every}, sort_keys=True)
+
+def export_plot(scenario, directory, heater, tank, record_every, plot, overwrite=False):
+
+    # <name>.png OR .svg NEXT TO THE RESULT FILE, KEPT IF IT IS ALREADY THERE UNLESS overwrite
+
+    if plot is None:
+        return
+
+    path = os.path.join(directory, scenario.name + '.' + plot)
+
+    if overwrite or not os.path.exists(path):
+        pyramid.export(heater, tank, path, every=record_every)
+
+def run_scenario(scenario, directory, record_every=1, overwrite=False, plot=None, cache_directory=None):
+
+    # RUNS ONE config.Config AND WRITES ITS RESULT FILE (AND PLOT), RETURNS ITS SUMMARY ROW
+
+    path = os.path.join(directory, scenario.name + '.npz')
+    current = settings(scenario, record_every)
+
+    if os.path.exists(path) and not overwrite:
+        with np.load(path) as result:
+            if 'settings' in result.files and str(result['settings']) == current:
+                export_plot(scenario, directory, result['heater'], result['tank'], record_every, plot)
+                return summarize(scenario.name, scenario.days, result['heater'], result['tank'], result['pump_events'])
+
+        # THE SCENARIO (OR record_every) CHANGED SINCE THE FILE WAS WRITTEN, SO IT IS RUN AGAIN AND REPLACES IT
+
+        overwrite = True
+
+    if cache_directory is not None:
+        result = cache.Result_cache(cache_directory).run(scenario, record_every)
+        heater_trace, tank_trace, pump_events = result.get_heater_temperatures(), result.get_tank_temperatures(), result.pump_events
+    else:
+        heater, pump, tank = scenario.apply_parameters()
+        scenario.apply_schedule(tank)
+
+        engine = Engine(heater, pump, tank)
+        output = engine.run(scenario.n_secs())
+
+        heater_trace = np.asarray(output.get_heater_temperatures())[record_every - 1:: record_every]
+        tank_trace = np.asarray(output.get_tank_temperatures())[record_every - 1:: record_every]
+        pump_events = np.array(engine.pump_events, dtype=np.int64).reshape(-1, 2)
+
+    # WRITTEN UNDER A TEMPORARY NAME FIRST, SO A KILLED JOB NEVER LEAVES A TRUNCATED RESULT BEHIND
+
+    partial = os.path.join(directory, scenario.name + '.partial.npz')
+    np.savez(partial, heater=heater_trace, tank=tank_trace, pump_events=pump_events, record_every=record_every, settings=current)
+    os.replace(partial, path)
+
+    export_plot(scenario, directory, heater_trace, tank_trace, record_every, plot, overwrite)
+
+    return summarize(scenario.name, scenario.days, heater_trace, tank_trace, pump_events)
+
+def try_scenario(scenario, *args):
+
+    # run_scenario, A FAILURE ONLY ENDS UP IN THE SUMMARY ROW OF ITS OWN SCENARIO
+
+    try:
+        return run_scenario(scenario, *args)
+    except Exception as error:
+        return {'name': scenario.name, 'days': scenario.days, 'error': type(error).__name__ + ': ' + str(error)}
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Runs scenario files (JSON, YAML, CSV) without prompts or plots.')
+    parser.add_argument('paths', nargs='+', help='scenario files or directories of them')
+    parser.add_argument('-o', '--output', default='results', help='directory for the result files')
+    parser.add_argument('--record-every', type=int, default=1, help='seconds between recorded temperatures')
+    parser.add_argument('--workers', type=int, default=1, help='processes running scenarios in parallel')
+    parser.add_argument('--overwrite', action='store_true', help='rerun scenarios that already have results')
+    parser.add_argument('--plot', choices=['png', 'svg'], help='also write a plot of every scenario in this format')
+    parser.add_argument('--cache', help='directory of cached results to reuse and add to')
+    args = parser.parse_args(argv)
+
+    scenarios = [scenario for path in config.find(args.paths) for scenario in config.load(path)]
+
+    names = [scenario.name for scenario in scenarios]
+    repeated = sorted(set(name for name in names if names.count(name) > 1))
+    if repeated:
+        parser.error('Scenario names must be unique, repeated: ' + ', '.join(repeated))
+
+    os.makedirs(args.output, exist_ok=True)
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(args.workers) as pool:
+            rows = list(pool.map(try_scenario, scenarios, repeat(args.output), repeat(args.record_every), repeat(args.overwrite), repeat(args.plot), repeat(args.cache)))
+    else:
+        rows = [try_scenario(scenario, args.output, args.record_every, args.overwrite, args.plot, args.cache) for scenario in scenarios]
+
+    with open(os.path.join(args.output, 'summary.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=summary_fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    failed = [row for row in rows if row['error']]
+
+    print(str(len(rows) - len(failed)) + ' scenarios written to ' + args.output + '.')
+    for row in failed:
+        print(row['name'] + ' failed: ' + row['error'])
+
+    return rows
+
+
+if __name__ == '__main__':
+    sys.exit(1 if any(row['error'] for row in main()) else 0)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Non-interactive scenario configuration, read from JSON, YAML or CSV files in place of the input() prompts
+"""
+
+import csv
+import json
+import os
+
+import batch
+from simulation import secs_in_a_day
+
+# A SCENARIO HOLDS EVERYTHING Simulation.getInput ASKS FOR, PLUS THE COMPONENT PARAMETERS AND THE HORIZON:
+#
+#   name: morning_showers
+#   days: 2
+#   animation: N
+#   parameters:                    # ANY COLUMN OF batch.scenario_dtype (main.py TAKES ALL BUT flow_rate_of_pump
+#                                  # AND temp_of_outside, SEE main.setParameters), e.g.
+#     capacity_of_storage_tank: 800
+#     threshold_temperature_of_water_in_heater: 65
+#   outflow:                       # START AS HH:MM:SS OR SECONDS, DURATION IN SECONDS, OPTIONAL FLOW RATE IN m^3/s
+#     - {time: '07:00:00', duration: 600}
+#     - {time: '07:05:00', duration: 300, flow_rate: 0.0002}     # OVERLAPPING DRAWS ADD UP
+#     - [64800, 900]
+#
+# A JSON / YAML FILE HOLDS ONE SUCH MAPPING, A LIST OF THEM OR {'scenarios': [...]}. A CSV FILE HOLDS ONE SCENARIO
+# PER ROW: COLUMNS name, days, animation, ANY PARAMETER, AND outflow AS 'HH:MM:SS/duration[/flow_rate]' ENTRIES
+# SEPARATED BY SPACES OR SEMICOLONS. EMPTY CELLS KEEP THE DEFAULTS.
+
+extensions = ('.json', '.yaml', '.yml', '.csv')
+
+
+def parse_time(value):
+
+    # SECONDS INTO THE DAY FROM 'HH:MM:SS' OR A NUMBER OF SECONDS
+
+    if isinstance(value, str) and ':' in value:
+        hours, mins, secs = value.split(':')
+        return int(hours)*3600 + int(mins)*60 + int(secs)
+
+    return int(value)
+
+def parse_outflow(value):
+
+    # LIST OF (START, DURATION, FLOW RATE OR None) FROM A LIST OF MAPPINGS / PAIRS / TRIPLES OR A CSV CELL
+
+    if value is None or value == '':
+        return []
+
+    if isinstance(value, str):
+        value = [entry.split('/') for entry in value.replace(';', ' ').split()]
+
+    outflow = []
+    for entry in value:
+        if isinstance(entry, dict):
+            entry = (entry['time'], entry['duration'], entry.get('flow_rate'))
+        start, duration, flow_rate = (list(entry) + [None])[:3]
+        outflow.append((parse_time(start), int(duration), None if flow_rate in (None, '') else float(flow_rate)))
+
+    return outflow
+
+class Config:
+
+    def __init__(self, name='scenario', parameters=None, outflow=None, days=1, animation='N'):
+
+        self.name = str(name)
+        self.parameters = dict(parameters or {})
+        self.outflow = parse_outflow(outflow)
+        self.days = int(days)
+        self.animation = animation
+
+        if self.days < 1:
+            raise ValueError('A scenario runs for at least one day, not ' + str(self.days) + ' in ' + self.name + '.')
+
+        for parameter in self.parameters:
+            if parameter not in batch.scenario_dtype.names:
+                raise KeyError('Unknown scenario parameter ' + parameter + ' in ' + self.name + '.')
+
+        # SAME CHECK AS Simulation.getInput, BUT A FILE CANNOT BE ASKED AGAIN
+
+        for start, duration, flow_rate in self.outflow:
+            if start < 0 or duration < 0 or start + duration >= secs_in_a_day:
+                raise ValueError('Outflow at ' + str(start) + ' s for ' + str(duration) + ' s in ' + self.name + ' does not lie within one day.')
+
+    def scenario(self):
+
+        # ONE ROW OF batch.scenario_dtype, DEFAULTS OVERRIDDEN BY THE PARAMETERS
+
+        return batch.scenarios(1, **self.parameters)[0]
+
+    def n_secs(self):
+        return self.days * secs_in_a_day
+
+    def apply_parameters(self, heater=None, pump=None, tank=None):
+
+        # simulation.py COMPONENTS WITH THE PARAMETERS OF THE SCENARIO
+
+        return batch.apply(self.scenario(), heater, pump, tank)
+
+    def apply_schedule(self, tank):
+        for start, duration, flow_rate in self.outflow:
+            tank.set_start_times(start // 3600, start % 3600 // 60, start % 60)
+            tank.set_durations(duration, flow_rate)
+
+    def apply_outlet(self, outlet):
+
+        # SAME SCHEDULE ON A main.OutletSystem
+
+        for start, duration, flow_rate in self.outflow:
+            outlet.setTime(start // 3600, start % 3600 // 60, start % 60, duration, flow_rate)
+
+    def to_dict(self):
+        return {'name': self.name, 'days': self.days, 'animation': self.animation, 'parameters': self.parameters,
+                'outflow': [{'time': start, 'duration': duration, 'flow_rate': flow_rate} for start, duration, flow_rate in self.outflow]}
+
+def from_dict(entry, name='scenario'):
+
+    entry = dict(entry)
+    parameters = dict(entry.pop('parameters', None) or {})
+
+    # CSV ROWS AND FLAT MAPPINGS CARRY THE PARAMETERS AS TOP LEVEL KEYS
+
+    for key in list(entry):
+        if key in batch.scenario_dtype.names:
+            parameters[key] = entry.pop(key)
+
+    parameters = {key: float(value) for key, value in parameters.items() if value not in (None, '')}
+    entry = {key: value for key, value in entry.items() if value not in (None, '')}
+
+    return Config(name=entry.get('name', name), parameters=parameters, outflow=entry.get('outflow'),
+                  days=entry.get('days', 1), animation=entry.get('animation', 'N'))
+
+def load(path):
+
+    # ALL SCENARIOS OF ONE FILE. UNNAMED ONES ARE NAMED AFTER THE FILE, WITH THEIR INDEX IF THERE ARE SEVERAL
+
+    stem, extension = os.path.splitext(os.path.basename(path))
+    extension = extension.lower()
+
+    if extension == '.csv':
+        with open(path, newline='') as f:
+            entries = list(csv.DictReader(f))
+    elif extension == '.json':
+        with open(path) as f:
+            entries = json.load(f)
+    elif extension in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError('Reading ' + path + ' needs PyYAML (pip install pyyaml).')
+        with open(path) as f:
+            entries = yaml.safe_load(f)
+    else:
+        raise ValueError('Unsupported scenario file ' + path + ', expected one of ' + ', '.join(extensions) + '.')
+
+    if isinstance(entries, dict):
+        entries = entries.get('scenarios', [entries])
+
+    if len(entries) == 1:
+        return [from_dict(entries[0], stem)]
+
+    return [from_dict(entry, stem + '_' + str(k)) for k, entry in enumerate(entries)]
+
+def find(paths):
+
+    # SCENARIO FILES AMONG paths, DIRECTORIES ARE SEARCHED (NOT RECURSIVELY) IN NAME ORDER
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if os.path.splitext(name)[1].lower() in extensions)
+        else:
+            files.append(path)
+
+    return files
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+Segment-stepping engine for the heater / pump / storage tank model of simulation.py
+"""
+
+import numpy as np
+
+import solar
+from simulation import secs_in_a_day, Water, Heater, Pump, Storage_tank, Output
+from stratified import Stratified_tank
+
+# THE ENGINE ADVANCES THE SAME MODEL AS Simulation.run BUT OVER PREALLOCATED NUMPY ARRAYS:
+#   * BETWEEN PUMP STEPS THE HEATER ONLY ACCUMULATES COIL HEAT UNTIL IT REACHES ITS THRESHOLD AND THE TANK
+#     ONLY MIXES WITH OUTSIDE WATER WHILE AN OUTFLOW RUNS, SO A WHOLE SEGMENT IS FILLED IN CLOSED FORM
+#     FROM RUNNING TOTALS OF COIL HEAT AND SECONDS OF OUTFLOW
+#   * A SEGMENT ENDS AT THE FIRST SECOND IN WHICH THE PUMP HAS TO RUN, FOUND BY SEARCHING THOSE RUNNING
+#     TOTALS, AND THAT SECOND IS STEPPED EXACTLY LIKE Heater.update / Storage_tank.update
+#   * THE LOOP ONLY COMPUTES THE STATE AT THE END OF EACH SEGMENT, THE TRACES ARE WRITTEN AFTERWARDS (fill)
+#   * THE OUTFLOW SCHEDULE IS READ AS A PER-SECOND FLOW RATE FROM ITS INDEX (Storage_tank.get_outflow_schedule),
+#     AND THE TANK'S MIXING WITH OUTSIDE WATER AS A RUNNING TOTAL OF -log(FRACTION OF THE TANK KEPT) PER SECOND
+#   * THE HEATER IS HEATED UP WITH A CUMULATIVE SUM STARTING FROM ITS TEMPERATURE, WHICH ADDS IN THE SAME ORDER AS
+#     THE PER-SECOND LOOP, AND THE MIXING TOTALS RESTART EVERY DAY (Running_total), SO THE ROUNDING OF EITHER DOES
+#     NOT GROW WITH THE HORIZON
+#
+# TOLERANCE: THE CLOSED FORMS ONLY REORDER THE FLOATING POINT ARITHMETIC OF THE PER-SECOND LOOP, SO BOTH
+# TRACES MATCH Simulation.run TO |ERROR| <= 1e-9 °C, ON THE FIRST DAY AS ON ANY LATER ONE, CHECKED BY checks.py
+
+tolerance = 1e-9 #°C
+
+
+def outflow_demand(tank, n_secs=secs_in_a_day):
+
+    # FLOW RATE OUT OF THE TANK IN EACH SECOND (m^3/s), THE SCHEDULE REPEATING EVERY DAY LIKE IN Simulation.run
+
+    return tank.get_outflow_schedule().per_second(n_secs)
+
+def outflow_mask(tank, n_secs=secs_in_a_day):
+
+    # SECONDS IN WHICH ANY OUTFLOW RUNS
+
+    return outflow_demand(tank, n_secs) > 0
+
+class Running_total:
+
+    def __init__(self, values, period=secs_in_a_day):
+
+        # SUM OF values[:k] FOR EVERY k IN [0, len(values)], KEPT AS before[k // period] (WHOLE DAYS BEFORE THE DAY
+        # OF k) PLUS within[k] (SECONDS OF THAT DAY BEFORE k). TOTALS OVER ONE DAY ONLY CARRY THE ROUNDING OF ONE DAY
+
+        n = len(values)
+        days = -(-n // period)
+
+        padded = np.zeros(days * period)
+        padded[:n] = values
+        sums = np.cumsum(padded.reshape(days, period), axis=1)
+
+        self.period = period
+        self.within = np.zeros(n + 1)
+        self.within[1:] = sums.ravel()[:n]
+        self.within[::period] = 0
+        self.before = np.concatenate(([0], np.cumsum(sums[:, -1])))
+
+    def __len__(self):
+        return len(self.within)
+
+    def between(self, start, stop):
+
+        # SUM OF values[start: stop], stop AN INDEX OR AN ARRAY OF INDICES
+
+        return (self.before[stop // self.period] - self.before[start // self.period]) + (self.within[stop] - self.within[start])
+
+    def search(self, start, amount):
+
+        # ABOUT THE FIRST stop WITH between(start, stop) >= amount, TO BE CORRECTED WITH between: THE DAY IT FALLS IN
+        # FROM THE WHOLE-DAY TOTALS, THEN THE SECOND WITHIN THAT DAY
+
+        period = self.period
+        target = self.before[start // period] + self.within[start] + amount
+        day = max(start // period, int(np.searchsorted(self.before, target, side='right')) - 1)
+        begin = max(day * period, start)
+
+        if begin >= len(self.within):
+            return len(self.within)
+
+        return begin + int(np.searchsorted(self.within[begin: (day + 1) * period], target - self.before[day]))
+
+class Engine:
+
+    def __init__(self, heater=None, pump=None, tank=None, water=None):
+
+        self.heater = heater if heater is not None else Heater()
+        self.pump = pump if pump is not None else Pump()
+        self.tank = tank if tank is not None else Storage_tank()
+        self.water = water if water is not None else Water()
+        self.pump_events = []
+
+        if isinstance(self.tank, Stratified_tank):
+            raise ValueError('The engine only models the mixed Storage_tank, step a Stratified_tank with Simulation.simulate.')
+
+    def heating_per_second(self, n_secs):
+
+        # SAME OPERATIONS AS Heater.heat_transfer, ONE ELEMENT PER SECOND
+
+        heater = self.heater
+        current = heater.solar_panel.get_solar_currents(0, n_secs)
+        power_in_coil = current**2 * heater.resistance_of_coil
+        mass_of_water_in_heater = 1 * heater.capacity_of_heater #kg
+
+        return power_in_coil * 1 / (self.water.specific_heat_of_water * mass_of_water_in_heater)
+
+    def pump_step(self, sec, temp_h, temp_t, outflow, heating):
+
+        # ONE SECOND OF Heater.update FOLLOWED BY Storage_tank.update, USED WHEN THE PUMP HAS TO RUN. outflow (m^3/s)
+        # AND heating (°C) ARE THE VALUES FOR THAT SECOND
+
+        heater, pump, tank = self.heater, self.pump, self.tank
+
+        if temp_h >= heater.get_threshold_temperature() and temp_t < tank.get_threshold_temperature():
+            if not pump.get_status():
+                pump.turn_on()
+                self.pump_events.append((sec, True))
+
+            water_flow = pump.get_flow_rate() * 1 * 1000 #L
+            heater.water_from_heater_to_tank = water_flow
+
+            temp_h = ((heater.capacity_of_heater - water_flow) * temp_h + water_flow * temp_t) / (heater.capacity_of_heater)
+            temp_t = ((tank.capacity_of_storage_tank - water_flow) * temp_h + water_flow * temp_t) / (tank.capacity_of_storage_tank)
+
+        if temp_h < heater.get_threshold_temperature():
+            if pump.get_status():
+                pump.turn_off()
+                self.pump_events.append((sec, False))
+            temp_h += heating
+
+        if temp_t >= tank.get_threshold_temperature() and pump.get_status():
+            pump.turn_off()
+            self.pump_events.append((sec, False))
+
+        if outflow:
+            water_flow = outflow * 1 * 1000 #L
+            temp_t = ((tank.capacity_of_storage_tank - water_flow) * temp_t + water_flow * tank.temp_of_outside) / (tank.capacity_of_storage_tank)
+
+        return temp_h, temp_t
+
+    def tank_crossing(self, sec, temp_t, threshold_t, mixing):
+
+        # FIRST SECOND (>= sec) AT WHOSE START THE TANK IS ON THE OTHER SIDE OF threshold_t THAN temp_t,
+        # USING THE SAME CLOSED FORM AS THE SEGMENT TRACES SO THE CROSSING AGREES WITH THEM EXACTLY
+
+        temp_of_outside = self.tank.temp_of_outside
+        below = temp_t < threshold_t
+
+        if below == (temp_of_outside < threshold_t) or mixing.between(sec, len(mixing) - 1) == 0:
+            return len(mixing)
+
+        def is_below(k):
+            return temp_of_outside + (temp_t - temp_of_outside) * np.exp(-mixing.between(sec, k)) < threshold_t
+
+        k = mixing.search(sec, np.log((temp_t - temp_of_outside) / (threshold_t - temp_of_outside)))
+        k = min(max(k, sec + 1), len(mixing) - 1)
+        while k > sec + 1 and is_below(k - 1) != below:
+            k -= 1
+        while k < len(mixing) and is_below(k) == below:
+            k += 1
+
+        return k
+
+    def run(self, n_secs=secs_in_a_day):
+
+        heater, pump, tank = self.heater, self.pump, self.tank
+        threshold_h = heater.get_threshold_temperature()
+        threshold_t = tank.get_threshold_temperature()
+
+        heating = self.heating_per_second(n_secs)
+        outflow = outflow_demand(tank, n_secs)
+
+        # RUNNING TOTALS: HEAT ADDED TO THE HEATER (ONLY TO FIND ABOUT WHEN IT GETS HOT) AND MIXING OF THE TANK WITH
+        # OUTSIDE WATER, AFTER m OF MIXING THE TANK IS temp_of_outside + (temp_t - temp_of_outside) * exp(-m)
+
+        heat_added = np.concatenate(([0], np.cumsum(heating)))
+        drawn = np.flatnonzero(outflow)
+        water_flow = outflow[drawn] * 1 * 1000 #L
+        kept = np.zeros(n_secs)
+        kept[drawn] = -np.log((tank.capacity_of_storage_tank - water_flow) / tank.capacity_of_storage_tank)
+        mixing = Running_total(kept)
+
+        temps_h = np.empty(n_secs)
+        temps_t = np.empty(n_secs)
+        temp_h = heater.get_temperature()
+        temp_t = tank.get_temperature()
+
+        # ONLY THE ENDS OF THE SEGMENTS ARE COMPUTED IN THE LOOP, THEIR TRACES ARE WRITTEN AFTERWARDS BY fill
+
+        segments = []
+
+        sec = 0
+
+        while sec < n_secs:
+
+            if temp_h >= threshold_h and temp_t < threshold_t:
+                temp_h, temp_t = self.pump_step(sec, temp_h, temp_t, outflow[sec], heating[sec])
+                temps_h[sec], temps_t[sec] = temp_h, temp_t
+                sec += 1
+                continue
+
+            if pump.get_status():
+                pump.turn_off()
+                self.pump_events.append((sec, False))
+
+            # FIRST SECOND AT WHOSE START THE HEATER HAS REACHED ITS THRESHOLD, AND ITS TEMPERATURES UNTIL THEN
+
+            if temp_h < threshold_h:
+                guess = int(np.searchsorted(heat_added, heat_added[sec] + (threshold_h - temp_h)))
+                heated = self.heat_up(sec, temp_h, heating, threshold_h, guess)
+                hot = sec + len(heated) if heated[-1] >= threshold_h else n_secs + 1
+            else:
+                heated = np.array([temp_h])
+                hot = sec
+
+            # FIRST SECOND AT WHOSE START THE TANK HAS CROSSED ITS THRESHOLD, IT ONLY EVER MOVES TOWARDS temp_of_outside
+
+            crossed = self.tank_crossing(sec, temp_t, threshold_t, mixing)
+
+            # THE SEGMENT RUNS UNTIL BOTH CONDITIONS FOR THE PUMP HOLD
+
+            if temp_t < threshold_t:
+                stop = min(n_secs, hot) if hot < crossed else n_secs
+            else:
+                stop = min(n_secs, max(hot, crossed))
+
+            segments.append((sec, stop, min(hot, stop), heated, temp_t))
+            temp_h, temp_t = self.segment_end(sec, stop, hot, heated, temp_t, mixing)
+            sec = stop
+
+        self.fill(segments, temps_h, temps_t, mixing)
+
+        heater.temp_of_water_in_heater = float(temp_h)
+        tank.temp_of_water_in_tank = float(temp_t)
+
+        output = Output()
+        output.temperatures_of_water_in_heater = temps_h
+        output.temperatures_of_water_in_tank = temps_t
+
+        return output
+
+    def heat_up(self, sec, temp_h, heating, threshold_h, guess):
+
+        # HEATER TEMPERATURES AT THE END OF SECONDS sec, sec + 1, ... UP TO THE FIRST ONE AT OR ABOVE threshold_h
+        # (OR THE LAST SECOND OF THE RUN), ADDED UP ONE SECOND AFTER THE OTHER LIKE Heater.heat_transfer. guess IS
+        # ABOUT WHERE THE THRESHOLD IS REACHED, THE WINDOW IS WIDENED WHILE IT IS NOT
+
+        n_secs = len(heating)
+        stop = min(max(guess, sec + 1) + 1, n_secs)
+
+        while True:
+            temps = np.cumsum(np.concatenate(([temp_h], heating[sec: stop])))[1:]
+            reached = np.flatnonzero(temps >= threshold_h)
+            if len(reached):
+                return temps[: reached[0] + 1]
+            if stop == n_secs:
+                return temps
+            stop = min(n_secs, sec + 2 * (stop - sec))
+
+    def segment_end(self, sec, stop, hot, heated, temp_t, mixing):
+
+        # STATE AT THE END OF SECOND stop - 1 OF A SEGMENT STARTING AT sec, SAME EXPRESSIONS AS fill
+
+        temp_h = heated[min(hot, stop) - sec - 1] if hot > sec else heated[0]
+
+        if mixing.between(sec, stop) != 0:
+            temp_of_outside = self.tank.temp_of_outside
+            temp_t = temp_of_outside + (temp_t - temp_of_outside) * np.exp(-mixing.between(sec, stop))
+
+        return temp_h, temp_t
+
+    def fill(self, segments, temps_h, temps_t, mixing):
+
+        # TRACES OF THE SEGMENTS (start, stop, hot, heated, temp_t): THE HEATER FOLLOWS heated UNTIL hot AND STAYS
+        # THERE, SECOND i OF THE SEGMENT ENDS WITH THE TANK MIXED UP TO i + 1
+
+        temp_of_outside = self.tank.temp_of_outside
+
+        for start, stop, hot, heated, temp_t in segments:
+
+            if hot > start:
+                temps_h[start: hot] = heated[: hot - start]
+                temps_h[hot: stop] = temps_h[hot - 1]
+            else:
+                temps_h[start: stop] = heated[0]
+
+            if mixing.between(start, stop) != 0:
+                mixed = mixing.between(start, np.arange(start + 1, stop + 1))
+                temps_t[start: stop] = temp_of_outside + (temp_t - temp_of_outside) * np.exp(-mixed)
+                temps_t[start: stop][mixed == 0] = temp_t
+            else:
+                temps_t[start: stop] = temp_t
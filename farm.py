@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Process-pool scenario farm writing batch.Batch traces into memory-mapped result files
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from simulation import secs_in_a_day
+from batch import scenario_dtype, from_table, Batch, Batch_output
+
+# LAYOUT OF A FARM DIRECTORY:
+#   farm.json                      RUN SETTINGS, CHECKED WHEN A RUN IS RESUMED
+#   scenarios.npy, outflow.npy     INPUTS, READ BY THE WORKERS THROUGH mmap AND ALSO CHECKED ON RESUME
+#   heater.npy, tank.npy           (N, RECORDS) TRACES, EVERY WORKER WRITES ITS OWN ROWS IN PLACE
+#   pumping.npy                    SECONDS OF PUMPING PER SCENARIO
+#   done.npy                       ONE FLAG PER CHUNK, SET BY THE PARENT ONCE THE CHUNK'S ROWS ARE ON DISK
+#
+# A RUN THAT WAS KILLED OR WHOSE WORKERS CRASHED IS RESUMED BY RUNNING THE SAME FARM AGAIN, ONLY CHUNKS
+# NOT FLAGGED AS DONE ARE SIMULATED
+
+
+def run_chunk(directory, start, stop):
+
+    # WORKER: SIMULATES SCENARIOS [start, stop) AND WRITES THEIR ROWS STRAIGHT INTO THE RESULT FILES
+
+    with open(os.path.join(directory, 'farm.json')) as f:
+        settings = json.load(f)
+
+    scenarios = np.load(os.path.join(directory, 'scenarios.npy'), mmap_mode='r')[start: stop]
+    outflow = np.load(os.path.join(directory, 'outflow.npy'), mmap_mode='r')
+    if outflow.ndim == 2:
+        outflow = outflow[start: stop]
+
+    output = Batch(np.array(scenarios), outflow=np.array(outflow)).run(settings['n_secs'], settings['record_every'], settings['dtype'])
+
+    for name, values in [('heater', output.temperatures_of_water_in_heater), ('tank', output.temperatures_of_water_in_tank), ('pumping', output.seconds_of_pumping)]:
+        result = np.load(os.path.join(directory, name + '.npy'), mmap_mode='r+')
+        result[start: stop] = values
+        result.flush()
+        del result
+
+    return start, stop
+
+class Farm:
+
+    def __init__(self, directory, scenarios, outflow=None, n_secs=secs_in_a_day, record_every=60, dtype='float32', chunk_size=256, workers=None):
+
+        self.directory = directory
+        self.scenarios = scenarios if scenarios.dtype == scenario_dtype else from_table(scenarios)
+        self.outflow = np.zeros(n_secs, dtype=bool) if outflow is None else np.asarray(outflow, dtype=bool)
+        self.settings = {'n': len(self.scenarios), 'n_secs': n_secs, 'record_every': record_every, 'dtype': np.dtype(dtype).name, 'chunk_size': chunk_size}
+        self.workers = workers
+
+    def chunks(self):
+        n, size = self.settings['n'], self.settings['chunk_size']
+        return [(start, min(start + size, n)) for start in range(0, n, size)]
+
+    def prepare(self):
+
+        # CREATES THE RESULT FILES, OR CHECKS THAT AN EXISTING DIRECTORY BELONGS TO THE SAME RUN
+
+        path = os.path.join(self.directory, 'farm.json')
+
+        if os.path.exists(path):
+            with open(path) as f:
+                settings = json.load(f)
+            same = (settings == self.settings
+                    and np.array_equal(np.load(os.path.join(self.directory, 'scenarios.npy')), self.scenarios)
+                    and np.array_equal(np.load(os.path.join(self.directory, 'outflow.npy')), self.outflow))
+            if not same:
+                raise ValueError('Directory ' + self.directory + ' holds results of a different farm run.')
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        n, records = self.settings['n'], self.settings['n_secs'] // self.settings['record_every']
+
+        np.save(os.path.join(self.directory, 'scenarios.npy'), self.scenarios)
+        np.save(os.path.join(self.directory, 'outflow.npy'), self.outflow)
+        for name, shape, dtype in [('heater', (n, records), self.settings['dtype']), ('tank', (n, records), self.settings['dtype']), ('pumping', (n,), np.int64), ('done', (len(self.chunks()),), bool)]:
+            np.lib.format.open_memmap(os.path.join(self.directory, name + '.npy'), mode='w+', dtype=dtype, shape=shape).flush()
+
+        # farm.json IS WRITTEN LAST, SO A DIRECTORY WITHOUT IT IS NEVER MISTAKEN FOR A RESUMABLE RUN
+
+        with open(path, 'w') as f:
+            json.dump(self.settings, f)
+
+    def run(self, progress=None, retries=3):
+
+        self.prepare()
+
+        chunks = self.chunks()
+        done = np.load(os.path.join(self.directory, 'done.npy'), mmap_mode='r+')
+
+        for attempt in range(retries + 1):
+
+            pending = [i for i in range(len(chunks)) if not done[i]]
+            if not pending:
+                break
+
+            try:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    futures = {pool.submit(run_chunk, self.directory, *chunks[i]): i for i in pending}
+                    for future in as_completed(futures):
+                        future.result()
+                        done[futures[future]] = True
+                        done.flush()
+                        if progress is not None:
+                            progress(int(done.sum()), len(chunks))
+
+            except BrokenProcessPool:
+
+                # A WORKER DIED, START A FRESH POOL FOR THE CHUNKS THAT ARE NOT DONE YET
+
+                if attempt == retries:
+                    raise
+
+        return self.results()
+
+    def results(self):
+
+        load = lambda name: np.load(os.path.join(self.directory, name + '.npy'), mmap_mode='r')
+
+        return Batch_output(load('heater'), load('tank'), load('pumping'), self.settings['record_every'])
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Blitted, decimated real-time temperature plot, fed by a running simulation through a queue
+"""
+
+import queue
+import threading
+
+import numpy as np
+
+# THE FIGURE KEEPS ONE Line2D PER TRACE AND ONLY CHANGES THEIR DATA, AND FuncAnimation BLITS JUST THOSE TWO
+# ARTISTS OVER A CACHED BACKGROUND. EVERY FRAME THE TRACES ARE DECIMATED TO AT MOST TWO POINTS (MIN AND MAX) PER
+# HORIZONTAL PIXEL, SO A FRAME COSTS THE SAME WHETHER A MINUTE OR A YEAR HAS BEEN SIMULATED. FRAMES COME FROM A
+# TIMER, NOT ONE PER SIMULATED SECOND, SO WHATEVER ARRIVES BETWEEN TWO FRAMES IS SHOWN AT ONCE.
+#
+# watch RUNS THE SIMULATION IN A WORKER THREAD (THE PRODUCER), WHICH PUTS ITS READINGS IN A Feed IN CHUNKS. THE
+# ANIMATION IN THE MAIN THREAD (THE CONSUMER) EMPTIES THE FEED ON EVERY FRAME.
+#
+# matplotlib IS ONLY IMPORTED BY WHAT DRAWS (Live_plot, watch, play), SO A HEADLESS RUN NEVER LOADS IT.
+
+width = 1000 #PIXELS, DECIMATION TARGET
+interval = 50 #ms BETWEEN FRAMES
+
+
+def decimate(values, buckets=width):
+
+    # INDICES AND VALUES OF THE MIN AND MAX OF EACH OF buckets EQUAL SLICES, IN ORDER, SO THE ENVELOPE IS KEPT
+
+    values = np.asarray(values)
+    n = len(values)
+
+    if n <= 2 * buckets:
+        return np.arange(n), values
+
+    size = -(-n // buckets)
+    edges = np.arange(0, n, size)
+    full = n // size * size
+
+    blocks = values[:full].reshape(-1, size)
+    low, high = blocks.argmin(axis=1), blocks.argmax(axis=1)
+
+    if full < n:
+        low = np.append(low, values[full:].argmin())
+        high = np.append(high, values[full:].argmax())
+
+    x = np.stack((edges + np.minimum(low, high), edges + np.maximum(low, high)), axis=1).ravel()
+
+    return x, values[x]
+
+class Feed:
+
+    def __init__(self, chunk_size=1024):
+
+        # READINGS ARE HANDED OVER chunk_size AT A TIME, None IN THE QUEUE MEANS THE PRODUCER HAS FINISHED
+
+        self.queue = queue.Queue()
+        self.chunk_size = chunk_size
+        self.heater, self.tank = [], []
+
+    def append(self, heater, tank):
+
+        self.heater.append(heater)
+        self.tank.append(tank)
+
+        if len(self.heater) == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+
+        if self.heater:
+            self.queue.put((np.array(self.heater), np.array(self.tank)))
+            self.heater, self.tank = [], []
+
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+
+    def drain(self):
+
+        # CHUNKS QUEUED SO FAR, AND WHETHER THE PRODUCER HAS FINISHED
+
+        chunks = []
+
+        while True:
+            try:
+                chunk = self.queue.get_nowait()
+            except queue.Empty:
+                return chunks, False
+            if chunk is None:
+                return chunks, True
+            chunks.append(chunk)
+
+class Live_plot:
+
+    def __init__(self, n_secs, limits):
+
+        # n_secs FIXES THE TIME AXIS AND limits (°C) THE TEMPERATURE AXIS, SO THE BACKGROUND NEVER HAS TO BE REDRAWN
+
+        import matplotlib.pyplot as plt
+
+        self.fig, self.ax = plt.subplots()
+        self.heater_line, = self.ax.plot([], [], linewidth=1, color='red', label='Heater', animated=True)
+        self.tank_line, = self.ax.plot([], [], linewidth=1, color='green', label='Storage Tank', animated=True)
+
+        self.ax.set_xlim(0, n_secs)
+        self.ax.set_ylim(*limits)
+        self.ax.legend()
+        self.ax.set_xlabel("Time(s)")
+        self.ax.set_ylabel("Temperature in C°")
+        self.ax.set_title("Temperature Changes in Heater and Storage Tank")
+
+        self.heater = np.empty(n_secs)
+        self.tank = np.empty(n_secs)
+        self.count = 0
+
+    def extend(self, heater, tank):
+
+        n = len(heater)
+
+        if self.count + n > len(self.heater):
+            self.heater = np.resize(self.heater, 2 * (self.count + n))
+            self.tank = np.resize(self.tank, 2 * (self.count + n))
+
+        self.heater[self.count: self.count + n] = heater
+        self.tank[self.count: self.count + n] = tank
+        self.count += n
+
+    def redraw(self, count=None):
+
+        # SETS THE LINES TO THE FIRST count READINGS (ALL BY DEFAULT) AND RETURNS THE ARTISTS TO BLIT
+
+        count = self.count if count is None else count
+
+        self.heater_line.set_data(*decimate(self.heater[:count]))
+        self.tank_line.set_data(*decimate(self.tank[:count]))
+
+        return self.heater_line, self.tank_line
+
+def limits(*temperatures):
+
+    # TEMPERATURE AXIS COVERING THE GIVEN TEMPERATURES (e.g. STARTING ONES AND THRESHOLDS) WITH SOME MARGIN
+
+    return min(temperatures) - 5, max(temperatures) + 10
+
+def watch(simulate, feed, n_secs, temperature_limits):
+
+    # RUNS simulate() (WHICH FILLS feed) IN A WORKER THREAD WHILE THE MAIN THREAD ANIMATES WHAT IT PRODUCES.
+    # RETURNS ONCE THE SIMULATION HAS FINISHED AND THE WINDOW HAS BEEN CLOSED
+
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    plot = Live_plot(n_secs, temperature_limits)
+    done = threading.Event()
+
+    def produce():
+        try:
+            simulate()
+        finally:
+            feed.close()
+
+    def frames():
+        # ALWAYS ONE FRAME, A REDRAW OF THE WINDOW AFTER THE END RESTARTS THE SEQUENCE
+        yield
+        while not done.is_set():
+            yield
+
+    def update(frame):
+        chunks, finished = feed.drain()
+        for heater, tank in chunks:
+            plot.extend(heater, tank)
+        if finished:
+            done.set()
+        return plot.redraw()
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+
+    ani = FuncAnimation(plot.fig, update, frames=frames, interval=interval, blit=True, repeat=False, cache_frame_data=False)
+    plt.show()
+
+    worker.join()
+
+    return ani
+
+def play(heater, tank, frames=300):
+
+    # REPLAYS FINISHED TRACES IN frames FRAMES, EACH SHOWING A LONGER PREFIX
+
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    heater, tank = np.asarray(heater), np.asarray(tank)
+    n = len(heater)
+
+    plot = Live_plot(max(n, 1), limits(heater.min(), tank.min(), heater.max(), tank.max()) if n else (0, 1))
+    plot.extend(heater, tank)
+
+    counts = np.linspace(0, n, min(frames, n) + 1)[1:].astype(int)
+
+    ani = FuncAnimation(plot.fig, lambda frame: plot.redraw(counts[frame]), frames=len(counts), interval=interval, blit=True, repeat=False)
+    plt.show()
+
+    return ani
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Heat losses of the heater, tank and pipes to the ambient air, and the thermal mass of the coil
+"""
+
+import numpy as np
+
+from simulation import secs_in_a_day, Component
+
+# simulation.py ASSUMES NO LOSSES. A Losses HANDED TO Simulation (losses=...) RUNS AFTER THE HEATER AND THE TANK EVERY
+# SECOND AND ADDS, EACH ONLY WHEN ITS COEFFICIENT IS GIVEN
+#   * tank_ua, heater_ua (W/°C): EXCHANGE WITH THE AMBIENT AIR, T' = T_a + (T - T_a) exp(-UA / (m c)) OVER THE SECOND
+#   * pipe_ua (W/°C PER LEG): THE PUMPED WATER COOLS TOWARDS T_a ON ITS WAY, T_a + (T - T_a) exp(-UA / (m' c)) WITH m'
+#     THE PUMP'S MASS FLOW, TAKEN FROM THE TANK FOR THE HEATER TO TANK LEG AND FROM THE HEATER FOR THE RETURN
+#   * coil_ua (W/°C): THE COIL (mass_of_coil, specific_heat_of_coil, temp_of_coil OF THE Heater) TAKES THE ELECTRICAL
+#     POWER AND PASSES IT TO THE WATER THROUGH coil_ua, SO IT LAGS WHEN SWITCHED ON AND KEEPS HEATING ONCE OFF.
+#     Heater.heat_transfer STILL ADDS THE POWER TO THE WATER, THE CHANGE OF THE COIL'S OWN HEAT IS TAKEN BACK HERE
+#
+# THE AMBIENT TEMPERATURE T_a IS ONE VALUE, 24 HOURLY VALUES OR ONE PER SECOND OF THE DAY (e.g. daily_ambient), BY
+# DEFAULT THE TANK'S temp_of_outside, AND REPEATS EVERY DAY, OR A MEASURED SERIES (A weather.Weather). attach TURNS
+# THE PARAMETERS INTO CONSTANT FACTORS AND load INTO PER-SECOND TABLES OF A DAY, SO A SECOND ONLY MULTIPLIES AND ADDS,
+# WITHOUT exp OR THE SOLAR CURRENT. THE TABLES ARE COMPUTED WITH NUMPY AND KEPT AS LISTS OF PYTHON FLOATS, WHICH THE
+# PER-SECOND LOOP READS FASTER. THEY ARE COMPUTED ONCE, OR EVERY DAY WHEN THE WEATHER OR THE PANEL'S SERIES DRIVE THEM.
+#
+# engine.Engine, batch AND adaptive DO NOT MODEL LOSSES, RUN THEM WITH Simulation.run / simulate.
+
+def daily_ambient(mean=20, swing=5, warmest=15 * 3600):
+
+    # PER-SECOND AIR TEMPERATURE (°C) OF A DAY, A COSINE OF AMPLITUDE swing PEAKING AT warmest (SECONDS)
+
+    return mean + swing * np.cos(2 * np.pi * (np.arange(secs_in_a_day) - warmest) / secs_in_a_day)
+
+def per_second(ambient):
+
+    # AMBIENT TEMPERATURE FOR EVERY SECOND OF THE DAY
+
+    ambient = np.asarray(ambient, dtype=float)
+
+    if ambient.size == 1:
+        return np.full(secs_in_a_day, float(ambient))
+    if ambient.size == 24:
+        return np.repeat(ambient, 3600)
+    if ambient.size == secs_in_a_day:
+        return ambient.copy()
+
+    raise ValueError('An ambient profile has 1, 24 or ' + str(secs_in_a_day) + ' values, not ' + str(ambient.size) + '.')
+
+class Losses(Component):
+
+    def __init__(self, tank_ua=0, heater_ua=0, pipe_ua=0, coil_ua=None, ambient=None):
+
+        self.tank_ua = tank_ua #W/°C
+        self.heater_ua = heater_ua #W/°C
+        self.pipe_ua = pipe_ua #W/°C
+        self.coil_ua = coil_ua #W/°C, None: THE COIL PASSES ITS HEAT ON AT ONCE, AS IN Heater.heat_transfer
+        self.ambient = ambient #°C, OR A weather.Weather
+
+    def attach(self, heater, pump, tank, water):
+
+        # CONSTANT FACTORS FOR THESE COMPONENTS, BEFORE A RUN
+
+        c = water.get_specific_heat()
+        mass_of_water_in_heater = 1 * heater.capacity_of_heater #kg
+        mass_of_water_in_tank = 1 * tank.capacity_of_storage_tank #kg
+
+        self.heater, self.pump, self.tank = heater, pump, tank
+        self.layered = getattr(tank, 'layers', None) is not None
+        self.measured = hasattr(self.ambient, 'ambient')
+        self.periodic = not self.measured and not hasattr(heater.solar_panel, 'weather')
+        self.since = self.until = 0
+        self.tank_gain = None
+
+        if not self.measured:
+            self.ambient_per_second = per_second(tank.temp_of_outside if self.ambient is None else self.ambient)
+
+        # T' = decay * T + gain[s]
+
+        self.tank_decay = float(np.exp(-self.tank_ua / (mass_of_water_in_tank * c)))
+        self.heater_decay = float(np.exp(-self.heater_ua / (mass_of_water_in_heater * c)))
+
+        # A PUMPED SECOND: T_tank -= supply * (T_heater - T_a), T_heater -= back * (T_tank - T_a)
+
+        pumped = pump.get_flow_rate() * 1 * 1000 #kg
+        lost = float(1 - np.exp(-self.pipe_ua / (pumped * c))) if pumped else 0.0
+        self.supply = pumped * lost / mass_of_water_in_tank
+        self.back = pumped * lost / mass_of_water_in_heater
+
+        # COIL OVER A SECOND WITH THE WATER AT T_w: T_c' = T_w + (T_c - T_w) * coil_decay + coil_gain[s] WHEN ON, AND
+        # THE WATER LOSES coil_share * (T_c' - T_c) OF WHAT Heater.heat_transfer GAVE IT
+
+        if self.coil_ua is not None:
+            heat_capacity_of_coil = heater.mass_of_coil * heater.specific_heat_of_coil #J/°C
+            self.coil_decay = float(np.exp(-self.coil_ua / heat_capacity_of_coil))
+            self.coil_share = heat_capacity_of_coil / (mass_of_water_in_heater * c)
+
+    def load(self, sec):
+
+        # TABLES FOR THE DAY OF sec, OR THE PART OF IT THE WEATHER COVERS
+
+        self.since = sec - sec % secs_in_a_day
+        self.until = self.since + secs_in_a_day
+
+        if self.periodic and self.tank_gain is not None:
+            return
+
+        if self.measured:
+            self.until = min(self.until, max(self.ambient.stop, sec + 1))
+            ambient = np.asarray(self.ambient.ambient(self.since, self.until), dtype=float)
+        else:
+            ambient = self.ambient_per_second
+
+        self.tank_gain = ((1 - self.tank_decay) * ambient).tolist()
+        self.heater_gain = ((1 - self.heater_decay) * ambient).tolist()
+        self.supply_gain = (self.supply * ambient).tolist()
+        self.back_gain = (self.back * ambient).tolist()
+
+        if self.coil_ua is not None:
+            heater = self.heater
+            power_in_coil = heater.solar_panel.get_solar_currents(self.since, self.until)**2 * heater.resistance_of_coil #W
+            self.coil_gain = (power_in_coil / self.coil_ua * (1 - self.coil_decay)).tolist()
+
+    def update(self, sec):
+
+        if not self.since <= sec < self.until:
+            self.load(sec)
+
+        s = sec - self.since
+        heater, tank = self.heater, self.tank
+
+        temp_h = heater.temp_of_water_in_heater
+        temp_t = tank.temp_of_water_in_tank
+        change_h = (self.heater_decay - 1) * temp_h + self.heater_gain[s]
+        change_t = (self.tank_decay - 1) * temp_t + self.tank_gain[s]
+
+        if heater.pumped_at == sec:
+            change_t -= self.supply * temp_h - self.supply_gain[s]
+            change_h -= self.back * temp_t - self.back_gain[s]
+
+        if self.coil_ua is not None:
+            temp_c = heater.temp_of_coil
+            heater.temp_of_coil = temp_h + (temp_c - temp_h) * self.coil_decay + (self.coil_gain[s] if heater.heated_at == sec else 0)
+            change_h -= self.coil_share * (heater.temp_of_coil - temp_c)
+
+        heater.temp_of_water_in_heater = temp_h + change_h
+
+        # EVERY LAYER OF A STRATIFIED TANK LOSES LIKE THE MIXED TANK. THAT COMMUTES WITH THE EXCHANGE BETWEEN LAYERS,
+        # SO IDLE SECONDS STILL WAITING IN IT ARE LEFT THERE
+
+        if self.layered:
+            profile = tank.get_profile() if tank.temperatures is None else tank.temperatures
+            profile *= self.tank_decay
+            profile += change_t - (self.tank_decay - 1) * temp_t
+
+        tank.temp_of_water_in_tank = temp_t + change_t
@@ -4,67 +4,156 @@ Created on Sun Mar  5 00:45:15 2023
 
 @author: Soumyajit Saha
 """
-import numpy as np
-from copy import deepcopy
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+from array import array
 
-eventQueue = []
-secs_in_a_day = 84600
+import live
+import pyramid
+import solar
+from outflow import Outflow_schedule
 
-periodicTempInHeater = []
-periodicTempInTank = []
+secs_in_a_day = 86400
+specificHeatOfWater = 4182  # J/(Kg°C)
 
 
-class Event:
-    pass
+class Frozen:
+    # IMMUTABLE ONCE BUILT: THE SAME OBJECT IS HANDED TO EVERY SUBSCRIBER, SO IT IS NEVER COPIED
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(type(self).__name__ + ' is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(type(self).__name__ + ' is immutable')
+
+
+class Event(Frozen):
+    __slots__ = ()
 
 
 class PumpTriggerEvent(Event):
+    __slots__ = ('turnOn',)
+
     def __init__(self, turnOn: bool):
-        super().__init__()
-        self.turnOn = turnOn
+        super().__init__(turnOn=turnOn)
 
 
 class PumpFlowRateEvent(Event):
+    __slots__ = ('flowRate',)
+
     def __init__(self, flowRate: float):
-        super().__init__()
-        self.flowRate = flowRate
+        super().__init__(flowRate=flowRate)
 
 
 class TankTempThreshold(Event):
+    __slots__ = ('isCrossed',)
+
     def __init__(self, isCrossed: bool):
-        super().__init__()
-        self.isCrossed = isCrossed
+        super().__init__(isCrossed=isCrossed)
 
 
 class OutsideFlowEvent(Event):
+    __slots__ = ('turnOn', 'flowRate')
+
     def __init__(self, turnOn: bool, flowRate: float):
-        super().__init__()
-        self.turnOn = turnOn
-        self.flowRate = flowRate
+        super().__init__(turnOn=turnOn, flowRate=flowRate)
 
 
-class Water:
+class Water(Frozen):
+    __slots__ = ('temperature', 'volume', 'specificHeat')
+
     def __init__(self, temp, vol):
-        self.temperature = temp
-        self.volume = vol
-        self.specificHeat = 4182  # J/(Kg°C)
+        super().__init__(temperature=temp, volume=vol, specificHeat=specificHeatOfWater)
 
 
 class WaterPacketEvent(Event):
-
+    __slots__ = ('water', 'flowType')
 
     # volume, temperature
     def __init__(self, water: Water, flowType: str):
-        super().__init__()
-        self.water = water
-        self.flowType = flowType
+        super().__init__(water=water, flowType=flowType)
+
+
+class EventBus:
+    # ONE PER Simulation. EVENTS PUBLISHED DURING A TICK ARE DELIVERED AT THE START OF THE NEXT ONE, EACH ONLY TO
+    # THE HANDLERS SUBSCRIBED TO ITS TYPE, FOUND BY ONE TABLE LOOKUP
+
+    def __init__(self):
+        self.handlers = {}
+        self.pending = []
+
+    def subscribe(self, eventType, handler):
+        self.handlers.setdefault(eventType, []).append(handler)
+
+    def publish(self, event: Event):
+        self.pending.append(event)
+
+    def deliver(self):
+        events, self.pending = self.pending, []
+        handlers = self.handlers
+        for event in events:
+            for handler in handlers.get(type(event), ()):
+                handler(event)
+        return events
+
+
+class WaterPackets:
+    # PREALLOCATED (TEMPERATURE, VOLUME) BUFFERS FOR THE WATER IN A SYSTEM: SLOT 0 HOLDS THE MIXED WATER ALREADY
+    # IN IT, PACKETS FLOWING IN DURING A TICK ARE WRITTEN INTO THE NEXT SLOTS AND mix() FOLDS THEM BACK INTO SLOT 0
+    __slots__ = ('temperatures', 'volumes', 'count')
+
+    def __init__(self, temp, vol, size=4):
+        self.temperatures = array('d', [0.0]) * size
+        self.volumes = array('d', [0.0]) * size
+        self.temperatures[0] = temp
+        self.volumes[0] = vol
+        self.count = 1
+
+    def add(self, temp, vol):
+        if self.count == len(self.volumes):
+            self.temperatures.extend(array('d', [0.0]) * self.count)
+            self.volumes.extend(array('d', [0.0]) * self.count)
+        self.temperatures[self.count] = temp
+        self.volumes[self.count] = vol
+        self.count += 1
+
+    def mix(self):
+        nr, dr = 0, 0
+        for i in range(self.count):
+            nr += (self.temperatures[i] * self.volumes[i])
+            dr += self.volumes[i]
+
+        self.temperatures[0] = nr / dr
+        self.volumes[0] = dr
+        self.count = 1
+
+    def reset(self, temp, vol):
+        self.temperatures[0] = temp
+        self.volumes[0] = vol
+        self.count = 1
 
 
 class System:
+    # EVENT TYPE -> NAME OF THE METHOD HANDLING IT. THE HANDLERS ARE SUBSCRIBED TO THE BUS OF THE Simulation,
+    # AND THE SYSTEM PUBLISHES ITS OWN EVENTS THERE
+    subscriptions = {}
+    bus = None
+
+    def connect(self, bus: EventBus):
+        self.bus = bus
+        for eventType, name in self.subscriptions.items():
+            bus.subscribe(eventType, getattr(self, name))
+
     def handleEvents(self, events):
-        pass
+        # SAME DISPATCH FOR EVENTS DELIVERED OUTSIDE A BUS (SEE scheduler.py)
+        subscriptions = self.subscriptions
+        for event in events:
+            name = subscriptions.get(type(event))
+            if name is not None:
+                getattr(self, name)(event)
 
     def update(self, delta: float):
         pass
@@ -77,180 +166,202 @@ class SolarPanel:
     def __init__(self):
         self.solarPanelArea = 1  # m^2
         self.voltageOfSolarPanel = 20  # V
-        self.solarPowerInADay = np.array([0] * secs_in_a_day)
-
-        self.solarPowerInADay[: int(1 / 8 * secs_in_a_day)] = 0  # W/m^2
-        self.solarPowerInADay[int(1 / 8 * secs_in_a_day): int(2 / 8 * secs_in_a_day)] = 100  # W/m^2
-        self.solarPowerInADay[int(2 / 8 * secs_in_a_day): int(3 / 8 * secs_in_a_day)] = 500  # W/m^2
-        self.solarPowerInADay[int(3 / 8 * secs_in_a_day): int(4 / 8 * secs_in_a_day)] = 700  # W/m^2
-        self.solarPowerInADay[int(4 / 8 * secs_in_a_day): int(5 / 8 * secs_in_a_day)] = 1000  # W/m^2
-        self.solarPowerInADay[int(5 / 8 * secs_in_a_day): int(6 / 8 * secs_in_a_day)] = 300  # W/m^2
-        self.solarPowerInADay[int(6 / 8 * secs_in_a_day): int(7 / 8 * secs_in_a_day)] = 100  # W/m^2
-        self.solarPowerInADay[int(7 / 8 * secs_in_a_day):] = 0  # W/m^2
 
-        self.solarCurrentInADay = self.solarPowerInADay * self.solarPanelArea / self.voltageOfSolarPanel  # A
+        # DAILY PROFILES ARE CACHED AND SHARED READ-ONLY BETWEEN PANELS WITH THE SAME PARAMETERS (SEE solar.py)
+        self.solarPowerInADay = solar.daily_power(solar.irradiance_steps, secs_in_a_day)  # W/m^2
+        self.solarCurrentInADay = solar.daily_current(self.solarPanelArea, self.voltageOfSolarPanel, solar.irradiance_steps, secs_in_a_day)  # A
 
     def getSolarCurrent(self, i):
-        return self.solarCurrentInADay[i]
+        return self.solarCurrentInADay[i % secs_in_a_day]
 
 
 class Heater(System):
+    subscriptions = {PumpTriggerEvent: 'onPumpTrigger', PumpFlowRateEvent: 'onPumpFlowRate',
+                     TankTempThreshold: 'onTankTempThreshold', WaterPacketEvent: 'onWaterPacket'}
+
     def __init__(self):
         self.solarPanel = SolarPanel()
 
-        self.waterPackets = [Water(temp=22, vol=100)]
+        self.waterPackets = WaterPackets(temp=22, vol=100)
         self.capacity = 100  # L
         self.thresholdTemp = 70  # °C
         self.resistanceOfCoil = 50  # ohm
         self.tankThresholdTempCrossed = False
         self.pumpStatus = False
         self.pumpFlowRate = 0
+        self.readings = []
 
     def heatTransfer(self, i):
         powerInCoil = self.solarPanel.getSolarCurrent(i) ** 2 * self.resistanceOfCoil
         # ASSUMING ALL HEAT LOST BY THE COIL IS TRANSFERRED TO WATER IN HEATER
         massOfWaterInHeater = 1 * self.capacity  # kg
-        water = self.getWater()
-        changeInTempOfWaterInHeater = powerInCoil * 1 / (water.specificHeat * massOfWaterInHeater)
-        water.temperature = water.temperature + changeInTempOfWaterInHeater
-        self.setWater(water)
+        changeInTempOfWaterInHeater = powerInCoil * 1 / (specificHeatOfWater * massOfWaterInHeater)
+        self.waterPackets.temperatures[0] = self.waterPackets.temperatures[0] + changeInTempOfWaterInHeater
         return powerInCoil
 
     def getWater(self):
-        return self.waterPackets[0]
+        return Water(temp=self.waterPackets.temperatures[0], vol=self.waterPackets.volumes[0])
 
     def setWater(self, water):
-        self.waterPackets[0] = water
+        self.waterPackets.temperatures[0] = water.temperature
+        self.waterPackets.volumes[0] = water.volume
 
     def getHeaterTemperature(self):
-        return self.waterPackets[0].temperature
+        return self.waterPackets.temperatures[0]
 
-    def handleEvents(self, events):
-        for event in events:
-            if type(event) is PumpTriggerEvent:
-                self.pumpStatus = event.turnOn
-                self.pumpFlowRate = 0 if not event.turnOn else self.pumpFlowRate
+    def onPumpTrigger(self, event: PumpTriggerEvent):
+        self.pumpStatus = event.turnOn
+        self.pumpFlowRate = 0 if not event.turnOn else self.pumpFlowRate
 
-            if type(event) is PumpFlowRateEvent:
-                self.pumpFlowRate = event.flowRate
+    def onPumpFlowRate(self, event: PumpFlowRateEvent):
+        self.pumpFlowRate = event.flowRate
 
-            if type(event) is TankTempThreshold:
-                self.tankThresholdTempCrossed = event.isCrossed
+    def onTankTempThreshold(self, event: TankTempThreshold):
+        self.tankThresholdTempCrossed = event.isCrossed
 
-            if type(event) is WaterPacketEvent and event.flowType == 'tank_to_heater':
-                self.waterPackets.append(event.water)
+    def onWaterPacket(self, event: WaterPacketEvent):
+        if event.flowType == 'tank_to_heater':
+            self.waterPackets.add(event.water.temperature, event.water.volume)
 
     def updateTemperature(self):
-        nr, dr = 0, 0
-        for water in self.waterPackets:
-            nr += (water.temperature*water.volume)
-            dr += water.volume
-
-        self.waterPackets = [Water(temp=nr/dr, vol=dr)]
+        self.waterPackets.mix()
 
     def update(self, delta):
         if not self.pumpStatus and self.getHeaterTemperature() >= self.thresholdTemp and not self.tankThresholdTempCrossed:
-            eventQueue.append(PumpTriggerEvent(turnOn=True))
+            self.bus.publish(PumpTriggerEvent(turnOn=True))
 
         if self.pumpStatus:
-            eventQueue.append(WaterPacketEvent(water=Water(temp=self.getHeaterTemperature(), vol=0.00114 * 1 * 1000), flowType='heater_to_tank'))
-            self.waterPackets[0].volume -= (0.00114 * 1 * 1000)
-            print(self.waterPackets[0].volume)
-            print(self.waterPackets[0].temperature)
+            self.bus.publish(WaterPacketEvent(water=Water(temp=self.getHeaterTemperature(), vol=0.00114 * 1 * 1000), flowType='heater_to_tank'))
+            self.waterPackets.volumes[0] -= (0.00114 * 1 * 1000)
+            print(self.waterPackets.volumes[0])
+            print(self.waterPackets.temperatures[0])
 
         self.updateTemperature()
-        # print(self.waterPackets[0].temperature)
+        # print(self.waterPackets.temperatures[0])
 
         if (self.getHeaterTemperature() < self.thresholdTemp) or (self.tankThresholdTempCrossed and self.pumpStatus):
-            eventQueue.append(PumpTriggerEvent(turnOn=False))
+            self.bus.publish(PumpTriggerEvent(turnOn=False))
             # always call self.updateTemperature() before self.heatTransfer()
             if self.getHeaterTemperature() < self.thresholdTemp:
                 self.heatTransfer(delta)
 
     def registerReading(self):
-        periodicTempInHeater.append(self.getHeaterTemperature())
+        self.readings.append(self.getHeaterTemperature())
 
 
 
 class StorageTank(System):
+    subscriptions = {WaterPacketEvent: 'onWaterPacket', OutsideFlowEvent: 'onOutsideFlow'}
+
     def __init__(self):
-        self.waterPackets = [Water(temp=22, vol=1000)]
+        self.waterPackets = WaterPackets(temp=22, vol=1000)
         self.capacity = 1000  # L
         self.thresholdTemperature = 50  # degree C
         self.outsideFlowRate = 0
         self.pumpFlowRate = 0
+        self.readings = []
         # self.waterOutFlow
 
     def updateTemperature(self):
-        nr, dr = 0, 0
-        for water in self.waterPackets:
-            nr += (water.temperature * water.volume)
-            dr += water.volume
-
-        self.waterPackets = [Water(temp=nr / dr, vol=dr)]
-        # print(self.waterPackets[0].temperature)
+        self.waterPackets.mix()
+        # print(self.waterPackets.temperatures[0])
 
     def setWater(self, water):
-        self.waterPackets[0] = water
+        self.waterPackets.temperatures[0] = water.temperature
+        self.waterPackets.volumes[0] = water.volume
 
     def getTankTemperature(self):
-        return self.waterPackets[0].temperature
+        return self.waterPackets.temperatures[0]
 
-    def handleEvents(self, events):
-        for event in events:
-            if type(event) is WaterPacketEvent and event.flowType == 'heater_to_tank':
-                self.waterPackets.append(event.water)
+    def onWaterPacket(self, event: WaterPacketEvent):
+        if event.flowType == 'heater_to_tank':
+            self.waterPackets.add(event.water.temperature, event.water.volume)
 
-            if type(event) is OutsideFlowEvent:
-                self.outsideFlowRate = 0.0005 if event.turnOn else 0
+    def onOutsideFlow(self, event: OutsideFlowEvent):
+        self.outsideFlowRate = event.flowRate if event.turnOn else 0
 
     def update(self, delta: float):
         if self.outsideFlowRate:
-            self.waterPackets.append(Water(temp=22, vol=(self.outsideFlowRate * 1 * 1000)))
-            self.waterPackets[0].volume -= (self.outsideFlowRate * 1 * 1000)
+            self.waterPackets.add(22, self.outsideFlowRate * 1 * 1000)
+            self.waterPackets.volumes[0] -= (self.outsideFlowRate * 1 * 1000)
 
         self.updateTemperature()
 
         if self.thresholdTemperature < self.getTankTemperature():
-            eventQueue.append(TankTempThreshold(isCrossed=True))
+            self.bus.publish(TankTempThreshold(isCrossed=True))
 
     def registerReading(self):
-        periodicTempInTank.append(self.getTankTemperature())
+        self.readings.append(self.getTankTemperature())
 
 
 class OutletSystem(System):
     def __init__(self):
         self.start_time_of_outflow_from_tank = []
         self.duration_of_outflow_from_tank = []
-        self.index = 0
-        self.flowStatus = False
-
-    def handleEvents(self, events):
-        pass
+        self.flowRates = []  # m^3/s PER OUTFLOW
+        self.flowRate = 0.0005  # m^3/s, DEFAULT FOR AN OUTFLOW
+        self.currentFlowRate = 0
+        self.schedule = None
+
+    def getSchedule(self):
+        # INDEX OVER THE OUTFLOWS, EACH RUNS FOR SECONDS [start, start + duration). OVERLAPPING ONES ADD UP
+        if self.schedule is None or len(self.schedule) != len(self.start_time_of_outflow_from_tank):
+            self.schedule = Outflow_schedule(self.start_time_of_outflow_from_tank, self.duration_of_outflow_from_tank,
+                                             self.flowRates, secs_in_a_day)
+        return self.schedule
 
     def update(self, time: float):
-        if time in self.start_time_of_outflow_from_tank:
-            eventQueue.append(OutsideFlowEvent(turnOn=True, flowRate=0.0005))
-            self.index = self.start_time_of_outflow_from_tank.index(time)
-            self.flowStatus = True
-
-        if self.flowStatus and self.duration_of_outflow_from_tank[self.index]+self.start_time_of_outflow_from_tank[self.index] == time:
-            eventQueue.append(OutsideFlowEvent(turnOn=False, flowRate=0))
-            self.flowStatus = False
+        # AN EVENT EVERY TIME THE TOTAL FLOW RATE CHANGES, THE SCHEDULE REPEATS EVERY DAY
+        flowRate = self.getSchedule().rate(int(time))
+        if flowRate != self.currentFlowRate:
+            self.bus.publish(OutsideFlowEvent(turnOn=flowRate > 0, flowRate=flowRate))
+            self.currentFlowRate = flowRate
 
     def registerReading(self):
         pass
 
-    def setTime(self, hours, mins, secs, duration):
+    def setTime(self, hours, mins, secs, duration, flowRate=None):
         self.start_time_of_outflow_from_tank.append(int(hours) * 3600 + int(mins) * 60 + int(secs))
         self.duration_of_outflow_from_tank.append(int(duration))
+        self.flowRates.append(self.flowRate if flowRate is None else flowRate)
 
 
 is_animation = ''
-fig, ax = None, None
-
-def getInput(outletSystem: OutletSystem):
+ani = None
+
+def setParameters(heater: Heater, tank: StorageTank, outlet: OutletSystem, parameters):
+    # SCENARIO PARAMETERS (COLUMNS OF batch.scenario_dtype, AS IN A config.Config) ON THE SYSTEMS ABOVE. THE PUMP
+    # FLOW RATE AND THE OUTSIDE WATER TEMPERATURE ARE FIXED IN Heater.update AND StorageTank.update, SO A SCENARIO
+    # SETTING THEM CANNOT BE RUN HERE
+    for name in ('flow_rate_of_pump', 'temp_of_outside'):
+        if name in parameters:
+            raise ValueError('Scenario parameter ' + name + ' is fixed in main.py and cannot be set.')
+
+    panel = heater.solarPanel
+    panel.solarPanelArea = parameters.get('solar_panel_area', panel.solarPanelArea)
+    panel.voltageOfSolarPanel = parameters.get('voltage_of_solar_panel', panel.voltageOfSolarPanel)
+    panel.solarCurrentInADay = solar.daily_current(panel.solarPanelArea, panel.voltageOfSolarPanel, solar.irradiance_steps, secs_in_a_day)  # A
+
+    heater.resistanceOfCoil = parameters.get('resistance_of_coil', heater.resistanceOfCoil)
+    heater.capacity = parameters.get('capacity_of_heater', heater.capacity)
+    heater.thresholdTemp = parameters.get('threshold_temperature_of_water_in_heater', heater.thresholdTemp)
+    heater.waterPackets.reset(parameters.get('temp_of_water_in_heater', heater.getHeaterTemperature()), heater.capacity)
+
+    tank.capacity = parameters.get('capacity_of_storage_tank', tank.capacity)
+    tank.thresholdTemperature = parameters.get('threshold_temperature_of_water_in_tank', tank.thresholdTemperature)
+    tank.waterPackets.reset(parameters.get('temp_of_water_in_tank', tank.getTankTemperature()), tank.capacity)
+
+    # DEFAULT FLOW RATE OF THE OUTFLOWS ADDED AFTERWARDS
+    outlet.flowRate = parameters.get('flow_rate', outlet.flowRate)
+
+def getInput(outletSystem: OutletSystem, config=None):
+    # WITH A config.Config THE ANSWERS TO THE PROMPTS COME FROM IT AND NOTHING IS ASKED
     global is_animation
+    if config is not None:
+        is_animation = config.animation
+        config.apply_outlet(outletSystem)
+        return
+
     is_animation = input("Do you want real time animation graph? (Y/N): ")
     no_of_inputs = input("Enter the number times you want water from storage tank: ")
 
@@ -260,55 +371,75 @@ def getInput(outletSystem: OutletSystem):
         duration = input("Enter duration in seconds: ")
         hours, minutes, secs = time_of_day.split(':')
 
-        if int(hours) * 3600 + int(minutes) * 60 + int(secs) + int(duration) >= secs_in_a_day:
+        if int(duration) < 0 or int(hours) * 3600 + int(minutes) * 60 + int(secs) + int(duration) >= secs_in_a_day:
             continue
 
         outletSystem.setTime(hours, minutes, secs, duration)
         i += 1
 
-def animate(i):
-    global fig, ax
-    ax.clear()
-    ax.plot([k for k in range(i)], periodicTempInHeater[:i], linewidth=1, color='red',
-                  label='Heater')
-    ax.plot([k for k in range(i)], periodicTempInTank[:i], linewidth=1, color='green',
-                  label='Storage Tank')
-    ax.legend()
-    ax.set_xlabel("Time(s)")
-    ax.set_ylabel("Temperature in C°")
-    ax.set_title("Temperature Changes in Heater and Storage Tank")
-
-def plot():
-    global is_animation, fig, ax
+def plot(heaterTemps, tankTemps):
+    global is_animation, ani
     if is_animation == 'Y':
-        fig, ax = plt.subplots()
-        ani = FuncAnimation(fig, animate, frames=secs_in_a_day, interval=1, repeat=False)
-    
-        plt.show()
+        # REPLAY OF THE FINISHED TRACES, BLITTED AND DECIMATED (SEE live.py)
+        ani = live.play(heaterTemps, tankTemps)
     else:
-        plt.figure(figsize=(10, 6))
-        plt.plot([i for i in range(secs_in_a_day)], periodicTempInHeater, linewidth=1, color='red', label='Heater')
-        plt.plot([i for i in range(secs_in_a_day)], periodicTempInTank, linewidth=1, color='green', label='Storage Tank')
-        plt.xlabel("Time(s)")
-        plt.ylabel("Temperature in C°")
-        plt.title("Temperature Changes in Heater and Storage Tank")
-        plt.legend()
-        plt.show()
+        # ONLY ABOUT TWO POINTS PER PIXEL ARE DRAWN, FROM MIN / MAX PYRAMIDS (SEE pyramid.py)
+        pyramid.plot(heaterTemps, tankTemps)
 
 
 class Simulation:
-    def __init__(self):
+    # AN instrument.Profiler HERE TIMES THE LOOP SYSTEM BY SYSTEM AND COUNTS THE EVENTS (SEE instrument.py)
+    profiler = None
+
+    def __init__(self, config=None, profiler=None, traces=None):
         self.systems = [Heater(), StorageTank(), OutletSystem()]
         self.outletEvents = []
-        getInput(self.systems[-1])
-
-    def run(self):
-        global eventQueue
-        for i in range(secs_in_a_day):
-            oldEvents = deepcopy(eventQueue)
-            eventQueue = []
-            for system in self.systems:
-                system.handleEvents(oldEvents)
+        self.config = config
+        self.profiler = profiler
+        self.connect(traces)
+        if config is not None:
+            setParameters(*self.systems, config.parameters)
+        getInput(self.systems[-1], config)
+
+    def connect(self, traces=None):
+        # EVERY Simulation HAS ITS OWN BUS AND READINGS, SO SEVERAL CAN RUN IN ONE PROCESS OR IN THREADS. traces =
+        # (HEATER, TANK) TAKES THE READINGS: ANYTHING WITH append, e.g. streaming.Stream TO KEEP MEMORY BOUNDED ON LONG RUNS
+        self.bus = EventBus()
+        for system in self.systems:
+            system.connect(self.bus)
+        self.periodicTempInHeater, self.periodicTempInTank = traces if traces is not None else ([], [])
+        self.systems[0].readings, self.systems[1].readings = self.periodicTempInHeater, self.periodicTempInTank
+
+    def run(self, days=None):
+        global ani
+        if days is None:
+            days = self.config.days if self.config is not None else 1
+
+        # WITH ANIMATION THE SIMULATION RUNS IN A WORKER THREAD AND ITS READINGS ARE PLOTTED LIVE (SEE live.watch)
+        if is_animation == 'Y':
+            feed = live.Feed()
+            heater, tank = self.systems[0], self.systems[1]
+            limits = live.limits(heater.getHeaterTemperature(), tank.getTankTemperature(), heater.thresholdTemp, tank.thresholdTemperature)
+            ani = live.watch(lambda: self.simulate(days, feed), feed, days * secs_in_a_day, limits)
+        else:
+            self.simulate(days)
+            plot(self.periodicTempInHeater, self.periodicTempInTank)
+
+    def simulate(self, days, feed=None):
+        if self.profiler is not None:
+            self.profiler.attach_main(self.systems, self.bus)
+            try:
+                self.loop(days, feed)
+            finally:
+                self.profiler.stop()
+        else:
+            self.loop(days, feed)
+
+    def loop(self, days, feed=None):
+        bus = self.bus
+        heater, tank = self.systems[0], self.systems[1]
+        for i in range(days * secs_in_a_day):
+            bus.deliver()
 
             for system in self.systems:
                 system.update(i)
@@ -316,7 +447,9 @@ class Simulation:
             for system in self.systems:
                 system.registerReading()
 
-        plot()
+            # THE LIVE VIEW GETS THE READINGS FROM THE SYSTEMS, traces MAY BE A Stream THAT IS COSTLY TO INDEX
+            if feed is not None:
+                feed.append(heater.getHeaterTemperature(), tank.getTankTemperature())
 
 
 if __name__ == '__main__':
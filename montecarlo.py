@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Random household hot water draws and batched runs over them with streaming reliability statistics
+"""
+
+import numpy as np
+
+import batch
+from simulation import secs_in_a_day, Water, Solar_panel
+
+# generate DRAWS n HOUSEHOLD PROFILES OVER days AS ONE STRUCTURED ARRAY (draw_dtype), SORTED BY START:
+#   * ARRIVALS ARE POISSON WITH AN EXPECTED NUMBER OF DRAWS PER HOUR OF THE DAY, weekday OR weekend (first_weekday
+#     IS THE WEEKDAY OF DAY 0, 0 FOR MONDAY), AT A UNIFORM SECOND WITHIN THE HOUR
+#   * DURATIONS ARE LOGNORMAL (SECONDS, median AND sigma OF THE LOGARITHM), A DRAW RUNS FROM start TO start + duration
+#     INCLUSIVE AS IN Storage_tank, AND IS CUT AT THE END OF THE HORIZON
+#   * FLOW RATES ARE LOGNORMAL AROUND flow_rate (m^3/s), CONSTANT WITH flow_sigma 0. OVERLAPPING DRAWS ADD UP
+# UNLIKE Storage_tank'S SCHEDULE THE DRAWS DO NOT REPEAT EVERY DAY.
+#
+# evaluate RUNS ONE SCENARIO (A config.Config, BY DEFAULT THE COMPONENTS OF simulation.py) FOR ALL PROFILES AT ONCE,
+# ONE SECOND AT A TIME OVER (n,) STATE VECTORS WITH THE SAME ARITHMETIC AS batch.Batch. THE DRAWS ONLY CHANGE THE
+# FLOW OF A PROFILE AT THEIR STARTS AND ENDS, SO THE TANKS DRAWING WATER ARE KEPT AS AN INDEX UPDATED AT THOSE SECONDS.
+# NO TRACE IS KEPT: Statistics FOLDS EVERY SECOND INTO
+#   * PER RECORD (EVERY record_every SECONDS): PERCENTILE BANDS OF THE TANK TEMPERATURE ACROSS THE PROFILES AND THE
+#     SHARE OF PROFILES BELOW comfort
+#   * PER PROFILE: SECONDS BELOW comfort, LOWEST TEMPERATURE, LITRES DRAWN AND LITRES DRAWN BELOW comfort
+#   * A HISTOGRAM OF THE TANK TEMPERATURES OF EVERY PROFILE AT EVERY RECORD (0.1 °C BINS), FOR PERCENTILES OVER
+#     THE WHOLE RUN
+# SO MEMORY ONLY GROWS WITH THE NUMBER OF PROFILES AND RECORDS, NOT WITH n * n_secs.
+
+draw_dtype = np.dtype([('profile', np.int32), ('start', np.int64), ('duration', np.int64), ('flow_rate', np.float64)])
+
+# EXPECTED DRAWS PER HOUR OF THE DAY FOR ONE HOUSEHOLD
+
+weekday_rates = (0, 0, 0, 0, 0, 0.2, 1.2, 1.5, 0.6, 0.2, 0.2, 0.2, 0.4, 0.3, 0.2, 0.2, 0.3, 0.5, 0.9, 1.0, 0.8, 0.6, 0.3, 0.1)
+weekend_rates = (0, 0, 0, 0, 0, 0, 0.1, 0.4, 1.0, 1.2, 0.8, 0.5, 0.5, 0.4, 0.3, 0.3, 0.4, 0.6, 0.9, 1.0, 0.9, 0.7, 0.4, 0.2)
+
+comfort_temperature = 45 #°C
+percentiles = (5, 50, 95)
+histogram_bins = np.linspace(0, 100, 1001) #°C
+
+
+def generate(n, days=7, seed=0, weekday=weekday_rates, weekend=weekend_rates, median=90, sigma=0.8, flow_rate=0.0005, flow_sigma=0, first_weekday=0):
+
+    rng = np.random.default_rng(seed)
+    n_secs = days * secs_in_a_day
+
+    # EXPECTED DRAWS PER (PROFILE, DAY, HOUR), THEN ONE ROW PER DRAW
+
+    rates = np.array([weekend if (first_weekday + day) % 7 >= 5 else weekday for day in range(days)], dtype=float)
+    counts = rng.poisson(np.broadcast_to(rates, (n, days, 24)))
+    profile, day, hour = np.nonzero(counts)
+    repeats = counts[profile, day, hour]
+
+    draws = np.zeros(int(repeats.sum()), dtype=draw_dtype)
+    draws['profile'] = np.repeat(profile, repeats)
+    draws['start'] = np.repeat(day * secs_in_a_day + hour * 3600, repeats) + rng.integers(0, 3600, len(draws))
+    draws['duration'] = np.minimum(np.maximum(np.rint(rng.lognormal(np.log(median), sigma, len(draws))), 1), n_secs - 1 - draws['start'])
+    draws['flow_rate'] = flow_rate * (rng.lognormal(0, flow_sigma, len(draws)) if flow_sigma else 1)
+
+    return draws[np.argsort(draws['start'], kind='stable')]
+
+def changes(draws, n_secs):
+
+    # (SECONDS, BOUNDS, PROFILES, FLOW CHANGES m^3/s): THE CHANGES AT SECONDS[k] ARE ROWS BOUNDS[k]:BOUNDS[k + 1]
+
+    stops = draws['start'] + draws['duration'] + 1
+    keep = stops < n_secs
+
+    seconds = np.concatenate([draws['start'], stops[keep]])
+    profiles = np.concatenate([draws['profile'], draws['profile'][keep]])
+    flows = np.concatenate([draws['flow_rate'], -draws['flow_rate'][keep]])
+
+    order = np.argsort(seconds, kind='stable')
+    seconds, profiles, flows = seconds[order], profiles[order], flows[order]
+    unique, bounds = np.unique(seconds, return_index=True)
+
+    return unique.tolist(), np.append(bounds, len(seconds)).tolist(), profiles, flows
+
+class Statistics:
+
+    def __init__(self, n, records, comfort=comfort_temperature, percentiles=percentiles, bins=histogram_bins):
+
+        self.comfort = comfort #°C
+        self.percentiles = tuple(percentiles)
+        self.bins = bins
+        self.bands = np.empty((records, len(self.percentiles))) #°C, PER RECORD
+        self.share_below = np.empty(records) #PER RECORD
+        self.seconds_below = np.zeros(n, dtype=np.int64)
+        self.minimum = np.full(n, np.inf) #°C
+        self.drawn = np.zeros(n) #L
+        self.drawn_below = np.zeros(n) #L
+        self.histogram = np.zeros(len(bins) - 1, dtype=np.int64)
+        self.seconds = 0
+        self.below = np.empty(n, dtype=bool)
+
+    def second(self, temp_t, drawing, w):
+
+        # ONE SECOND, BEFORE THE OUTFLOW MIXES THE TANK: drawing ARE THE PROFILES DRAWING w LITRES AT temp_t
+
+        np.less(temp_t, self.comfort, out=self.below)
+        self.seconds_below += self.below
+        np.minimum(self.minimum, temp_t, out=self.minimum)
+        self.seconds += 1
+
+        if len(drawing):
+            self.drawn[drawing] += w
+            self.drawn_below[drawing] += np.where(self.below[drawing], w, 0)
+
+    def record(self, j, temp_t):
+        self.bands[j] = np.percentile(temp_t, self.percentiles)
+        self.share_below[j] = np.mean(temp_t < self.comfort)
+        self.histogram += np.histogram(temp_t, self.bins)[0]
+
+    def probability_below(self):
+
+        # SHARE OF ALL PROFILE-SECONDS BELOW comfort, AND OF PROFILES THAT EVER WENT BELOW IT
+
+        return self.seconds_below.sum() / (len(self.seconds_below) * self.seconds), np.mean(self.seconds_below > 0)
+
+    def pooled_percentiles(self, q=percentiles):
+
+        # PERCENTILES OF EVERY TANK TEMPERATURE OF THE RUN, TO THE WIDTH OF A BIN
+
+        cumulative = np.cumsum(self.histogram) / self.histogram.sum()
+        return self.bins[1:][np.minimum(np.searchsorted(cumulative, np.asarray(q) / 100), len(cumulative) - 1)]
+
+def evaluate(draws, n, n_secs, config=None, record_every=60, comfort=comfort_temperature, percentiles=percentiles):
+
+    # Statistics OF n PROFILES OVER n_secs, ONE SCENARIO FOR ALL OF THEM
+
+    s = config.scenario() if config is not None else batch.scenarios(1)[0]
+    c = Water().get_specific_heat()
+
+    threshold_h = s['threshold_temperature_of_water_in_heater'].item()
+    threshold_t = s['threshold_temperature_of_water_in_tank'].item()
+    capacity_h = s['capacity_of_heater'].item()
+    capacity_t = s['capacity_of_storage_tank'].item()
+    temp_of_outside = s['temp_of_outside'].item()
+    water_flow_pump = s['flow_rate_of_pump'].item() * 1 * 1000 #L
+
+    heating = (s['solar_panel_area'] / s['voltage_of_solar_panel'])**2 * s['resistance_of_coil'] / (c * 1 * capacity_h)
+    changes_h = (Solar_panel().solar_power_in_a_day**2 * heating).tolist()
+
+    seconds, bounds, profiles, flows = changes(draws, n_secs)
+    k = 0
+    demand = np.zeros(n) #m^3/s
+    drawing = np.zeros(0, dtype=np.intp)
+
+    temp_h = np.full(n, s['temp_of_water_in_heater'].item())
+    temp_t = np.full(n, s['temp_of_water_in_tank'].item())
+    statistics = Statistics(n, n_secs // record_every, comfort, percentiles)
+
+    pumping = np.empty(n, dtype=bool)
+    cold = np.empty(n, dtype=bool)
+    heat = np.empty(n, dtype=bool)
+
+    for sec in range(n_secs):
+
+        # PUMP AND COIL AS IN batch.Batch
+
+        np.greater_equal(temp_h, threshold_h, out=pumping)
+        np.less(temp_t, threshold_t, out=cold)
+        np.logical_and(pumping, cold, out=pumping)
+
+        if pumping.any():
+            i = np.flatnonzero(pumping)
+            temp_h[i] = ((capacity_h - water_flow_pump) * temp_h[i] + water_flow_pump * temp_t[i]) / capacity_h
+            temp_t[i] = ((capacity_t - water_flow_pump) * temp_h[i] + water_flow_pump * temp_t[i]) / capacity_t
+
+        change = changes_h[sec % secs_in_a_day]
+        if change:
+            np.less(temp_h, threshold_h, out=heat)
+            np.add(temp_h, change, out=temp_h, where=heat)
+
+        # DRAWS STARTING OR ENDING NOW. ROUNDING LEFT BY A FINISHED DRAW IS CLEARED, SO THE TANK IS NOT MIXED FOR IT
+
+        if k < len(seconds) and seconds[k] == sec:
+            np.add.at(demand, profiles[bounds[k]: bounds[k + 1]], flows[bounds[k]: bounds[k + 1]])
+            demand[np.abs(demand) < 1e-12] = 0
+            drawing = np.flatnonzero(demand)
+            k += 1
+
+        w = demand[drawing] * 1 * 1000 #L
+        statistics.second(temp_t, drawing, w)
+
+        if len(drawing):
+            temp_t[drawing] = ((capacity_t - w) * temp_t[drawing] + w * temp_of_outside) / capacity_t
+
+        if (sec + 1) % record_every == 0:
+            statistics.record(sec // record_every, temp_t)
+
+    return statistics
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Networks of many heaters and tanks joined by pumped pipes, advanced over contiguous node arrays
+"""
+
+import numpy as np
+
+from simulation import secs_in_a_day, Water, Heater, Pump, Storage_tank
+
+# A Network HOLDS simulation.py Heater AND Storage_tank OBJECTS AS NODES AND PIPES BETWEEN ANY TWO OF THEM:
+#
+#   network = Network()
+#   heaters = [network.add_heater() for k in range(40)]
+#   tanks = [network.add_tank(tank) for tank in block_tanks]       # THEIR OUTFLOW SCHEDULES ARE DRAWN AS IN Storage_tank
+#   for k, heater in enumerate(heaters):
+#       network.connect(heater, tanks[k % len(tanks)])              # flow_rate m^3/s, BY DEFAULT THE Pump'S
+#   output = network.run(secs_in_a_day, record_every=60)
+#
+# A PIPE HAS ITS OWN PUMP, RUNNING IN A SECOND WHILE ITS SOURCE IS AT OR ABOVE ITS THRESHOLD AND ITS TARGET BELOW ITS
+# OWN, AS IN Heater.update. IT SENDS flow_rate OF SOURCE WATER TO THE TARGET AND THE SAME VOLUME COMES BACK. ALL PIPES
+# EXCHANGE AT ONCE: WITH q THE PUMPED LITRES AND C THE CAPACITIES, T' = T + L T WITH
+#   L[a, b] = q / C[a], L[b, a] = q / C[b], L[a, a] = -q / C[a], L[b, b] = -q / C[b]    SUMMED OVER THE RUNNING PIPES
+# L IS SPARSE, TWO ENTRIES PER RUNNING PIPE, AND IS APPLIED AS A GATHER OF THE END TEMPERATURES AND A SCATTER-ADD
+# (np.bincount) OF THE FLOWS, NEVER FORMED. LIKE stratified.Stratified_tank, AND UNLIKE Storage_tank.update_temperature,
+# THE PUMPED WATER IS MIXED IN BY ITS VOLUME, SO THE HEAT IN THE NETWORK IS KEPT.
+#
+# AFTER THE PIPES EVERY HEATER BELOW ITS THRESHOLD IS HEATED BY ITS COIL (Heater.heat_transfer, THE PANEL'S DAILY
+# PROFILE) AND EVERY TANK DRAWING WATER MIXES WITH OUTSIDE WATER (Storage_tank.update). THE DRAWS ONLY CHANGE AT THE
+# STARTS AND ENDS OF OUTFLOWS, SO THE DRAWING TANKS ARE KEPT AS AN INDEX UPDATED AT THOSE SECONDS. A SECOND COSTS A FEW
+# DOZEN NUMPY CALLS WHATEVER THE SIZE: 500 NODES RUN A DAY IN A FEW SECONDS.
+
+
+class Network_output:
+
+    def __init__(self, temperatures, seconds_of_pumping, record_every):
+
+        # temperatures IS (NODES, RECORDS), RECORD j IS THE STATE AT THE END OF SECOND (j + 1) * record_every - 1.
+        # seconds_of_pumping IS PER PIPE, IN THE ORDER OF connect
+
+        self.temperatures = temperatures
+        self.seconds_of_pumping = seconds_of_pumping
+        self.record_every = record_every
+
+    def get_temperatures(self, node):
+        return self.temperatures[node]
+
+class Network:
+
+    def __init__(self):
+
+        self.nodes = []
+        self.pipes = [] #(SOURCE, TARGET, FLOW RATE m^3/s)
+
+    def add_heater(self, heater=None):
+
+        # INDEX OF THE NEW NODE
+
+        self.nodes.append(heater if heater is not None else Heater())
+        return len(self.nodes) - 1
+
+    def add_tank(self, tank=None):
+        self.nodes.append(tank if tank is not None else Storage_tank())
+        return len(self.nodes) - 1
+
+    def connect(self, source, target, flow_rate=None):
+
+        if source == target or not (0 <= source < len(self.nodes) and 0 <= target < len(self.nodes)):
+            raise ValueError('A pipe joins two different nodes of the network, not ' + str(source) + ' and ' + str(target) + '.')
+
+        self.pipes.append((source, target, Pump().get_flow_rate() if flow_rate is None else flow_rate))
+        return len(self.pipes) - 1
+
+    def arrays(self):
+
+        # NODE PARAMETERS AS (NODES,) ARRAYS, HEATERS AND TANKS SIDE BY SIDE
+
+        c = Water().get_specific_heat()
+        n = len(self.nodes)
+
+        arrays = {name: np.zeros(n) for name in ('temperature', 'capacity', 'threshold', 'heating', 'temp_of_outside')}
+        arrays['coil'] = np.zeros(n, dtype=bool)
+
+        for k, node in enumerate(self.nodes):
+            arrays['temperature'][k] = node.get_temperature()
+            arrays['threshold'][k] = node.get_threshold_temperature()
+
+            if isinstance(node, Heater):
+                panel = node.solar_panel
+                arrays['capacity'][k] = node.capacity_of_heater
+                arrays['coil'][k] = True
+
+                # SAME ARITHMETIC AS batch.Batch: dT = (power * area / voltage)^2 * R / (c * m)
+
+                arrays['heating'][k] = (panel.solar_panel_area / panel.voltage_of_solar_panel)**2 * node.resistance_of_coil / (c * 1 * node.capacity_of_heater)
+            else:
+                arrays['capacity'][k] = node.capacity_of_storage_tank
+                arrays['temp_of_outside'][k] = node.temp_of_outside
+
+        return arrays
+
+    def draws(self):
+
+        # SECOND OF THE DAY -> (NODES, LITRES PER SECOND FROM THEN ON) FOR EVERY CHANGE OF A TANK'S OUTFLOW
+
+        changes = {}
+
+        for k, node in enumerate(self.nodes):
+            if isinstance(node, Heater):
+                continue
+
+            schedule = node.get_outflow_schedule()
+            demand = schedule.per_second(secs_in_a_day)
+
+            # SECOND 0 TOO, AN OUTFLOW RUNNING TO THE END OF THE DAY STOPS WHEN THE NEXT ONE STARTS
+
+            for sec in sorted(set(schedule.changes(secs_in_a_day).tolist()) | {0}):
+                changes.setdefault(sec, []).append((k, float(demand[sec]) * 1 * 1000))
+
+        return {sec: (np.array([k for k, w in entries]), np.array([w for k, w in entries])) for sec, entries in changes.items()}
+
+    def run(self, n_secs=secs_in_a_day, record_every=1, dtype=np.float64, solar_power=None):
+
+        # solar_power IS THE IRRADIANCE PER SECOND IN W/m^2 OVER ONE DAY, BY DEFAULT THE PROFILE OF THE FIRST HEATER'S PANEL
+
+        heaters = [node for node in self.nodes if isinstance(node, Heater)]
+        if solar_power is None:
+            solar_power = heaters[0].solar_panel.solar_power_in_a_day if heaters else np.zeros(secs_in_a_day)
+
+        a = self.arrays()
+        n = len(self.nodes)
+        temp = a['temperature']
+        capacity, threshold, heating, coil, temp_of_outside = a['capacity'], a['threshold'], a['heating'], a['coil'], a['temp_of_outside']
+        power_squared = (np.asarray(solar_power, dtype=float)**2).tolist()
+        day = len(power_squared)
+
+        source = np.array([pipe[0] for pipe in self.pipes], dtype=np.intp)
+        target = np.array([pipe[1] for pipe in self.pipes], dtype=np.intp)
+        pumped = np.array([pipe[2] for pipe in self.pipes], dtype=float) * 1 * 1000 #L
+        ends = np.concatenate([source, target])
+        seconds_of_pumping = np.zeros(len(self.pipes), dtype=np.int64)
+
+        draws = self.draws()
+        drawn = np.zeros(n) #L PER SECOND
+        drawing = np.zeros(0, dtype=np.intp)
+
+        traces = np.empty((n_secs // record_every, n), dtype=dtype)
+        running = np.empty(len(self.pipes), dtype=bool)
+        cold = np.empty(len(self.pipes), dtype=bool)
+        heat = np.empty(n, dtype=bool)
+        change = np.empty(n)
+
+        for sec in range(n_secs):
+
+            # PUMPS: SOURCE HOT ENOUGH, TARGET STILL BELOW ITS THRESHOLD
+
+            np.greater_equal(temp[source], threshold[source], out=running)
+            np.less(temp[target], threshold[target], out=cold)
+            np.logical_and(running, cold, out=running)
+
+            if running.any():
+                seconds_of_pumping += running
+                flows = pumped * running
+                difference = temp[target] - temp[source]
+
+                # T += L T: SOURCES GAIN q (T_target - T_source), TARGETS THE OPPOSITE
+
+                temp += np.bincount(ends, np.concatenate([flows * difference, -flows * difference]), n) / capacity
+
+            # COILS HEAT THE HEATERS BELOW THEIR THRESHOLD
+
+            s = sec % day
+            if power_squared[s]:
+                np.less(temp, threshold, out=heat)
+                np.logical_and(heat, coil, out=heat)
+                np.multiply(heating, power_squared[s], out=change)
+                np.add(temp, change, out=temp, where=heat)
+
+            # OUTFLOWS MIX THE DRAWING TANKS WITH OUTSIDE WATER, SAME ARITHMETIC AS Storage_tank
+
+            if s in draws:
+                nodes, litres = draws[s]
+                drawn[nodes] = litres
+                drawing = np.flatnonzero(drawn)
+
+            if len(drawing):
+                w = drawn[drawing]
+                temp[drawing] = ((capacity[drawing] - w) * temp[drawing] + w * temp_of_outside[drawing]) / capacity[drawing]
+
+            if (sec + 1) % record_every == 0:
+                traces[sec // record_every] = temp
+
+        return Network_output(traces.T, seconds_of_pumping, record_every)
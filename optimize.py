@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+Search for the controller policy (thresholds, hysteresis, pump flow rate) that best serves a scenario
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import Config, load
+from simulation import secs_in_a_day, Water, Heater, Pump, Storage_tank
+
+# python optimize.py [scenario.yaml] [--objective balanced] [--population 64] [--generations 15] [--workers 8]
+#
+# A POLICY IS ONE ROW OF policy_dtype. ON TOP OF THE THRESHOLDS AND PUMP FLOW RATE OF simulation.py IT HAS TWO
+# HYSTERESIS BANDS (°C): ONCE RUNNING, THE PUMP KEEPS GOING UNTIL THE HEATER FALLS hysteresis_of_heater BELOW ITS
+# THRESHOLD, AND ONCE THE TANK HAS REACHED ITS THRESHOLD THE PUMP WAITS UNTIL IT HAS COOLED hysteresis_of_tank BELOW
+# IT. WITH BOTH BANDS AT 0 THIS IS Heater.update, AND Policy_heater REPLAYS ANY POLICY IN THE PER-SECOND LOOP.
+#
+# evaluate RUNS A WHOLE POPULATION OF POLICIES ON ONE SCENARIO AT ONCE, ONE SECOND AT A TIME OVER (N,) STATE VECTORS
+# LIKE batch.Batch, AND RETURNS metrics_dtype ROWS: THE HOT WATER ENERGY DELIVERED BY THE OUTFLOWS (ABOVE THE COLD
+# MAKE-UP WATER), THE ENERGY MISSING FROM DRAWS BELOW delivery_temperature, AND THE SECONDS OF PUMPING. AN objective
+# TURNS THEM INTO A SCORE TO MINIMIZE (objectives, OR ANY FUNCTION OF THE METRICS).
+#
+# Optimizer SEARCHES policy_space BY THE CROSS-ENTROPY METHOD: EVERY GENERATION SAMPLES A POPULATION FROM A NORMAL
+# DISTRIBUTION CLIPPED TO THE BOUNDS, SCORES IT, AND MOVES THE DISTRIBUTION TOWARDS THE ELITE. THE POPULATION IS SPLIT
+# INTO CHUNKS EVALUATED BY A PROCESS POOL THAT LIVES FOR THE WHOLE SEARCH. 64 POLICIES OVER 15 GENERATIONS OF A ONE-DAY
+# SCENARIO TAKE WELL UNDER A MINUTE ON EIGHT CORES.
+#
+# main.py's PUMP MOVES A FIXED VOLUME PER TICK (SEE main.setParameters), SO ONLY THE THRESHOLDS OF A POLICY CARRY OVER.
+
+policy_space = {
+    'threshold_temperature_of_water_in_heater': (50, 90), #°C
+    'threshold_temperature_of_water_in_tank': (35, 70), #°C
+    'hysteresis_of_heater': (0, 10), #°C
+    'hysteresis_of_tank': (0, 10), #°C
+    'flow_rate_of_pump': (0.0002, 0.003), #m^3/s
+}
+
+policy_dtype = np.dtype([(name, np.float64) for name in policy_space])
+
+metrics_dtype = np.dtype([('delivered_energy', np.float64), ('unmet_energy', np.float64), ('pump_seconds', np.int64),
+                          ('final_tank', np.float64), ('min_tank', np.float64)]) #J, J, s, °C, °C
+
+delivery_temperature = 45 #°C, HOT WATER BELOW IT IS UNMET DEMAND
+pump_power = 60 #W, ELECTRICAL POWER OF THE PUMP FOR THE 'balanced' OBJECTIVE
+
+objectives = {
+    'delivered': lambda metrics: -metrics['delivered_energy'],
+    'unmet': lambda metrics: metrics['unmet_energy'],
+    'runtime': lambda metrics: metrics['pump_seconds'].astype(float),
+    'balanced': lambda metrics: metrics['unmet_energy'] + pump_power * metrics['pump_seconds'],
+}
+
+
+class Policy_heater(Heater):
+
+    # Heater.update WITH THE HYSTERESIS BANDS OF A POLICY. THE PUMP STAYS ON FROM ONE SECOND TO THE NEXT WHILE IT RUNS
+
+    def __init__(self):
+
+        super().__init__()
+
+        self.hysteresis_of_heater = 0 #°C
+        self.hysteresis_of_tank = 0 #°C
+        self.tank_satisfied = False
+
+    def update(self, pump, tank, sec, water):
+
+        threshold = self.get_threshold_temperature()
+        temp_t = tank.get_temperature()
+
+        if temp_t >= tank.get_threshold_temperature():
+            self.tank_satisfied = True
+        elif temp_t < tank.get_threshold_temperature() - self.hysteresis_of_tank:
+            self.tank_satisfied = False
+
+        hot = self.get_temperature() >= threshold or (pump.get_status() and self.get_temperature() >= threshold - self.hysteresis_of_heater)
+
+        if hot and not self.tank_satisfied:
+            if not pump.get_status():
+                pump.turn_on()
+                print('Pump started at ' + str(sec) + '.')
+
+            self.water_from_heater_to_tank = pump.get_flow_rate() * 1 * 1000 #L
+            self.pumped_at = sec
+
+            self.update_temperature(tank.get_return_temperature())
+            tank.update_temperature(self.water_from_heater_to_tank, self.get_temperature())
+
+        elif pump.get_status():
+            pump.turn_off()
+            print('Pump stopped at ' + str(sec) + '.')
+
+        if self.get_temperature() < threshold:
+            power = self.heat_transfer(sec, water)
+            self.heated_at = sec
+            print('Heat of ' + str(power) + ' W/m^2 transfered from coil to water in heater at ' + str(sec) + '.')
+
+def policies(n=1, **columns):
+
+    # n POLICIES AT THE DEFAULTS OF simulation.py (NO HYSTERESIS), WITH ANY GIVEN COLUMN OVERRIDDEN
+
+    heater, pump, tank = Heater(), Pump(), Storage_tank()
+    table = np.zeros(n, dtype=policy_dtype)
+    table['threshold_temperature_of_water_in_heater'] = heater.threshold_temperature_of_water_in_heater
+    table['threshold_temperature_of_water_in_tank'] = tank.threshold_temperature_of_water_in_tank
+    table['flow_rate_of_pump'] = pump.flow_rate_of_pump
+
+    for name, values in columns.items():
+        if name not in policy_dtype.names:
+            raise KeyError('Unknown policy parameter ' + name + '.')
+        table[name] = values
+
+    return table
+
+def components(config, policy=None):
+
+    # simulation.py COMPONENTS OF THE SCENARIO, WITH THE POLICY'S CONTROLLER WHEN ONE IS GIVEN
+
+    heater, pump, tank = config.apply_parameters(Policy_heater())
+    config.apply_schedule(tank)
+
+    if policy is not None:
+        heater.threshold_temperature_of_water_in_heater = policy['threshold_temperature_of_water_in_heater'].item()
+        heater.hysteresis_of_heater = policy['hysteresis_of_heater'].item()
+        heater.hysteresis_of_tank = policy['hysteresis_of_tank'].item()
+        tank.threshold_temperature_of_water_in_tank = policy['threshold_temperature_of_water_in_tank'].item()
+        pump.flow_rate_of_pump = policy['flow_rate_of_pump'].item()
+
+    return heater, pump, tank
+
+def evaluate(table, config, delivery=delivery_temperature, n_secs=None):
+
+    # metrics_dtype ROW FOR EVERY POLICY OF table ON THE SCENARIO config
+
+    n_secs = config.n_secs() if n_secs is None else n_secs
+    n = len(table)
+    c = Water().get_specific_heat()
+    heater, pump, tank = components(config)
+
+    threshold_h = table['threshold_temperature_of_water_in_heater']
+    threshold_t = table['threshold_temperature_of_water_in_tank']
+    restart_h = threshold_h - table['hysteresis_of_heater']
+    restart_t = threshold_t - table['hysteresis_of_tank']
+    water_flow_pump = table['flow_rate_of_pump'] * 1 * 1000 #L
+    capacity_h = heater.capacity_of_heater
+    capacity_t = tank.capacity_of_storage_tank
+    temp_of_outside = tank.temp_of_outside
+
+    # SAME ARITHMETIC AS Heater.heat_transfer AND Storage_tank.update, ONE DAY REPEATED
+
+    heating = (heater.solar_panel.get_solar_currents(0, secs_in_a_day)**2 * heater.resistance_of_coil * 1 / (c * 1 * capacity_h)).tolist()
+    water_flow_out = (tank.get_outflow_schedule().per_second(secs_in_a_day) * 1 * 1000).tolist() #L
+
+    temp_h = np.full(n, float(heater.temp_of_water_in_heater))
+    temp_t = np.full(n, float(tank.temp_of_water_in_tank))
+    delivered = np.zeros(n)
+    unmet = np.zeros(n)
+    minimum = temp_t.copy()
+    pump_seconds = np.zeros(n, dtype=np.int64)
+
+    running = np.zeros(n, dtype=bool)
+    satisfied = np.zeros(n, dtype=bool)
+    mask = np.empty(n, dtype=bool)
+    hot = np.empty(n, dtype=bool)
+
+    for sec in range(n_secs):
+
+        s = sec % secs_in_a_day
+
+        # THE TANK GATE, THEN THE PUMP: ON AT THE THRESHOLD, KEPT ON DOWN TO THE RESTART TEMPERATURE
+
+        np.greater_equal(temp_t, threshold_t, out=mask)
+        np.logical_or(satisfied, mask, out=satisfied)
+        np.less(temp_t, restart_t, out=mask)
+        np.logical_and(satisfied, ~mask, out=satisfied)
+
+        np.greater_equal(temp_h, restart_h, out=mask)
+        np.logical_and(running, mask, out=running)
+        np.greater_equal(temp_h, threshold_h, out=hot)
+        np.logical_or(running, hot, out=running)
+        np.logical_and(running, ~satisfied, out=running)
+
+        if running.any():
+            i = np.flatnonzero(running)
+            pump_seconds[i] += 1
+            temp_h[i] = ((capacity_h - water_flow_pump[i]) * temp_h[i] + water_flow_pump[i] * temp_t[i]) / capacity_h
+            temp_t[i] = ((capacity_t - water_flow_pump[i]) * temp_h[i] + water_flow_pump[i] * temp_t[i]) / capacity_t
+
+        if heating[s]:
+            np.less(temp_h, threshold_h, out=mask)
+            np.add(temp_h, heating[s], out=temp_h, where=mask)
+
+        # DRAWN WATER LEAVES AT THE TANK TEMPERATURE, THEN THE TANK MIXES WITH OUTSIDE WATER
+
+        w = water_flow_out[s]
+        if w:
+            delivered += w * c * (temp_t - temp_of_outside)
+            unmet += w * c * np.maximum(delivery - temp_t, 0)
+            temp_t = ((capacity_t - w) * temp_t + w * temp_of_outside) / capacity_t
+            np.minimum(minimum, temp_t, out=minimum)
+
+    metrics = np.zeros(n, dtype=metrics_dtype)
+    metrics['delivered_energy'] = delivered
+    metrics['unmet_energy'] = unmet
+    metrics['pump_seconds'] = pump_seconds
+    metrics['final_tank'] = temp_t
+    metrics['min_tank'] = np.minimum(minimum, temp_t)
+
+    return metrics
+
+def replay(policy, config, n_secs=None):
+
+    # TRACES OF ONE POLICY IN THE PER-SECOND LOOP OF simulation.py, e.g. TO PLOT THE BEST ONE
+
+    import contextlib
+
+    from simulation import Output, Simulation
+
+    heater, pump, tank = components(config, policy)
+    output = Output()
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        Simulation().simulate(Water(), heater, pump, tank, output, config.n_secs() if n_secs is None else n_secs)
+
+    return output
+
+class Optimizer:
+
+    def __init__(self, config, objective='balanced', space=None, population=64, elite=0.25, generations=15, seed=0, workers=None,
+                 chunk_size=16, delivery=delivery_temperature):
+
+        if isinstance(objective, str) and objective not in objectives:
+            raise ValueError('Unknown objective ' + repr(objective) + ', expected one of ' + ', '.join(objectives) + ' or a function.')
+
+        self.config = config
+        self.objective = objectives[objective] if isinstance(objective, str) else objective
+        self.space = dict(policy_space if space is None else space)
+        self.population = population
+        self.elite = max(2, int(round(elite * population)))
+        self.generations = generations
+        self.rng = np.random.default_rng(seed)
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.delivery = delivery
+        self.history = []
+
+        for name in self.space:
+            if name not in policy_dtype.names:
+                raise KeyError('Unknown policy parameter ' + name + '.')
+
+    def sample(self, mean, std, n):
+
+        # n POLICIES AROUND mean, CLIPPED TO THE SPACE. PARAMETERS OUTSIDE THE SPACE KEEP THEIR DEFAULTS
+
+        table = policies(n)
+        for k, (name, (low, high)) in enumerate(self.space.items()):
+            table[name] = np.clip(self.rng.normal(mean[k], std[k], n), low, high)
+
+        return table
+
+    def evaluate(self, table, pool=None):
+
+        if pool is None:
+            return evaluate(table, self.config, self.delivery)
+
+        chunks = [table[start: start + self.chunk_size] for start in range(0, len(table), self.chunk_size)]
+        futures = [pool.submit(evaluate, chunk, self.config, self.delivery) for chunk in chunks]
+
+        return np.concatenate([future.result() for future in futures])
+
+    def run(self, progress=None):
+
+        # Optimization OF THE BEST POLICY FOUND. progress(generation, best score) IS CALLED AFTER EVERY GENERATION
+
+        bounds = np.array(list(self.space.values()), dtype=float)
+        mean = bounds.mean(axis=1)
+        std = (bounds[:, 1] - bounds[:, 0]) / 4
+        best = None
+
+        workers = self.workers if self.workers is not None else os.cpu_count()
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) if workers and workers > 1 else None
+
+        try:
+            for generation in range(self.generations):
+
+                # THE BEST POLICY SO FAR IS EVALUATED AGAIN WITH EVERY GENERATION, SO IT IS NEVER LOST
+
+                table = self.sample(mean, std, self.population)
+                if best is not None:
+                    table[0] = best[0]
+
+                metrics = self.evaluate(table, pool)
+                scores = np.asarray(self.objective(metrics), dtype=float)
+                order = np.argsort(scores, kind='stable')
+                elite = table[order[:self.elite]]
+
+                best = (table[order[0]].copy(), metrics[order[0]].copy(), float(scores[order[0]]))
+                self.history.append({'generation': generation, 'best': best[2], 'elite_mean': float(scores[order[:self.elite]].mean())})
+
+                values = np.array([elite[name] for name in self.space])
+                mean = 0.3 * mean + 0.7 * values.mean(axis=1)
+                std = 0.3 * std + 0.7 * values.std(axis=1)
+
+                if progress is not None:
+                    progress(generation, best[2])
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        return Optimization(*best, self.history)
+
+class Optimization:
+
+    def __init__(self, policy, metrics, score, history):
+
+        self.policy = policy
+        self.metrics = metrics
+        self.score = score
+        self.history = history
+
+    def summary(self):
+        lines = ['Score ' + '{:.6g}'.format(self.score)]
+        lines += ['  {:<42} {:.6g}'.format(name, self.policy[name].item()) for name in policy_dtype.names]
+        lines += ['  {:<42} {:.6g}'.format(name, self.metrics[name].item()) for name in metrics_dtype.names]
+        return '\n'.join(lines)
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Searches the controller policy that minimizes an objective on one scenario.')
+    parser.add_argument('scenario', nargs='?', help='scenario file (see config.py), its first scenario is used')
+    parser.add_argument('--objective', choices=list(objectives), default='balanced')
+    parser.add_argument('--population', type=int, default=64)
+    parser.add_argument('--generations', type=int, default=15)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--delivery', type=float, default=delivery_temperature, help='hot water temperature (°C) a draw needs')
+    args = parser.parse_args(argv)
+
+    if args.scenario is not None:
+        config = load(args.scenario)[0]
+    else:
+        config = Config('default', outflow=[(25200, 600), (43200, 900), (68400, 1200)])
+
+    optimizer = Optimizer(config, args.objective, population=args.population, generations=args.generations, seed=args.seed,
+                          workers=args.workers, delivery=args.delivery)
+    result = optimizer.run(lambda generation, score: print('Generation ' + str(generation) + ': ' + '{:.6g}'.format(score)))
+    print(result.summary())
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
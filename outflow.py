@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Indexed daily outflow schedule answering "what is the outflow rate at second t" in O(1)
+"""
+
+import numpy as np
+
+# A DRAW TAKES WATER OUT OF THE STORAGE TANK AT ITS OWN FLOW RATE FOR SECONDS [start, end). DRAWS MAY OVERLAP,
+# THE TANK THEN LOSES THE SUM OF THEIR FLOW RATES. THE SCHEDULE IS BUILT ONCE INTO PER-SECOND ARRAYS OVER ONE DAY
+# (DIFFERENCE ARRAYS OVER THE START AND END SECONDS, SO O(DRAWS log DRAWS + SECONDS)), AND EVERY QUERY AFTER THAT IS
+# AN ARRAY LOOKUP. IT REPEATS EVERY DAY.
+
+
+class Outflow_schedule:
+
+    def __init__(self, starts=(), durations=(), flow_rates=0.0005, secs_in_a_day=86400):
+
+        # starts AND durations IN SECONDS, flow_rates IN m^3/s, ONE FOR ALL DRAWS OR ONE PER DRAW
+
+        self.starts = np.asarray(starts, dtype=np.int64).reshape(-1)
+        self.durations = np.asarray(durations, dtype=np.int64).reshape(-1)
+        self.flow_rates = np.broadcast_to(np.asarray(flow_rates, dtype=float), self.starts.shape)
+        self.secs_in_a_day = secs_in_a_day
+
+        if len(self.starts) != len(self.durations):
+            raise ValueError('Every outflow needs one start time and one duration.')
+
+        # THE SCHEDULE IS REPEATED DAY AFTER DAY, SO A DRAW STILL OPEN AT MIDNIGHT WOULD BE CUT OFF
+
+        starts = self.starts
+        ends = self.starts + self.durations
+
+        outside = (starts < 0) | (self.durations < 0) | (ends > secs_in_a_day)
+        if outside.any():
+            k = int(np.argmax(outside))
+            raise ValueError('Outflow at ' + str(starts[k]) + ' s for ' + str(self.durations[k]) + ' s does not lie within one day.')
+
+        # DIFFERENCES AT THE SECONDS WHERE SOME DRAW STARTS OR ENDS ONLY, SPREAD OVER THE DAY WITH np.repeat
+
+        points = np.unique(np.concatenate(([0, secs_in_a_day], starts, ends)))
+
+        count = np.zeros(len(points), dtype=np.int64)
+        np.add.at(count, np.searchsorted(points, starts), 1)
+        np.add.at(count, np.searchsorted(points, ends), -1)
+
+        demand = np.zeros(len(points))
+        np.add.at(demand, np.searchsorted(points, starts), self.flow_rates)
+        np.add.at(demand, np.searchsorted(points, ends), -self.flow_rates)
+
+        draws = np.cumsum(count[:-1])
+        lengths = np.diff(points)
+
+        self.draws = np.repeat(draws, lengths) #DRAWS RUNNING IN EACH SECOND
+        self.demand = np.repeat(np.where(draws > 0, np.cumsum(demand[:-1]), 0.0), lengths) #m^3/s, EXACT ZERO WHEN NOTHING RUNS
+        self.started = np.zeros(secs_in_a_day, dtype=bool)
+        self.started[starts[starts < ends]] = True
+
+        for array in (self.draws, self.demand, self.started):
+            array.flags.writeable = False
+
+    def __getattr__(self, name):
+
+        # PLAIN LISTS FOR THE PER-SECOND QUERIES, INDEXING THEM IS CHEAPER THAN INDEXING AN ARRAY ELEMENT. THEY ARE
+        # ONLY BUILT ON THE FIRST QUERY, SO ARRAY USERS (engine.py, adaptive.py) DO NOT PAY FOR THEM
+
+        if name not in ('rates_by_second', 'running_by_second', 'started_by_second'):
+            raise AttributeError(name)
+
+        self.rates_by_second = self.demand.tolist()
+        self.running_by_second = (self.draws > 0).tolist()
+        self.started_by_second = self.started.tolist()
+
+        return getattr(self, name)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def rate(self, sec):
+        return self.rates_by_second[sec % self.secs_in_a_day]
+
+    def is_running(self, sec):
+        return self.running_by_second[sec % self.secs_in_a_day]
+
+    def starts_at(self, sec):
+        return self.started_by_second[sec % self.secs_in_a_day]
+
+    def stops_after(self, sec):
+
+        # TRUE FOR THE LAST SECOND OF A STRETCH OF OUTFLOW
+
+        return self.is_running(sec) and not self.is_running(sec + 1)
+
+    def per_second(self, n_secs):
+
+        # FLOW RATE IN EACH SECOND OF [0, n_secs), THE DAY REPEATED OVER LONGER HORIZONS
+
+        if n_secs <= self.secs_in_a_day:
+            return self.demand[:n_secs]
+
+        return np.resize(self.demand, n_secs)
+
+    def changes(self, n_secs):
+
+        # SECONDS OF [0, n_secs) AT WHICH THE FLOW RATE DIFFERS FROM THE SECOND BEFORE (SECOND 0 COMPARED TO NO FLOW)
+
+        demand = self.per_second(n_secs)
+
+        return np.flatnonzero(np.diff(demand, prepend=0.0))
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Periodic steady state of the daily heater / tank cycle, found by Newton shooting on the one-day return map
+"""
+
+import numpy as np
+
+from simulation import secs_in_a_day, Heater, Pump, Storage_tank
+from engine import Engine
+from adaptive import Integrator, Trajectory
+
+# EVERY DAY HAS THE SAME IRRADIANCE AND OUTFLOW, SO AFTER ENOUGH DAYS THE TEMPERATURES REPEAT FROM ONE MIDNIGHT TO
+# THE NEXT. THE RETURN MAP P TAKES (Th, Tt) AT MIDNIGHT TO (Th, Tt) ONE DAY LATER AND THE PERIODIC ORBIT STARTS AT
+# A FIXED POINT OF IT, P(x) = x. (THE PUMP IS OFF AT MIDNIGHT, THE PANEL GIVES NO CURRENT THEN, SO THE TWO
+# TEMPERATURES ARE THE WHOLE STATE.) ONE EVALUATION OF P IS ONE DAY OF THE PER-SECOND MODEL OF Simulation.run, RUN
+# BY EITHER OF ITS FAST IMPLEMENTATIONS, WHICH AGREE TO ROUNDING (checks.py):
+#   * 'adaptive' (DEFAULT): adaptive.Integrator, ONE STEP PER INPUT CHANGE OR PUMP SECOND, AND THE TRACES ARE ONLY
+#     SAMPLED FOR THE DAY THAT IS KEPT, SO A DAY COSTS ABOUT HALF AS MUCH
+#   * 'engine': engine.Engine
+#
+# THE FIXED POINT IS FOUND BY NEWTON'S METHOD ON F(x) = P(x) - x. THE JACOBIAN IS TAKEN BY FINITE DIFFERENCES OF
+# difference °C ONCE AND THEN KEPT UP TO DATE WITH BROYDEN'S RANK-ONE UPDATES, SO AN ITERATION USUALLY COSTS ONE
+# DAY. A STEP THAT DOES NOT REDUCE |F| IS HALVED, AND IF THAT FAILS TOO THE JACOBIAN IS TAKEN AGAIN AND THE PLAIN
+# DAY-AFTER-DAY STEP x = P(x) IS USED INSTEAD. EVERY ITERATE IS CLIPPED TO THE STATES THE MODEL CAN BE IN AT
+# MIDNIGHT (feasible), SO A STEP OFF A NEARLY SINGULAR JACOBIAN NEVER LANDS ON A HEATER THE COIL CANNOT REACH.
+#
+# P IS NOT CONTINUOUS. THE HEATER STOPS ON WHOLE SECONDS, SO P IS ONLY DEFINED TO WITHIN ONE SECOND OF COIL
+# HEATING, AND A SOLUTION THAT CLOSE IS REPORTED AS 'resolution'. WORSE, ONE PUMP SECOND MORE OR LESS MOVES THE TANK
+# BY SEVERAL °C, AND WITH OUTFLOW F OFTEN JUMPS FROM POSITIVE TO NEGATIVE WITHOUT EVER BEING ZERO: THERE IS NO FIXED
+# POINT, THE MIDNIGHT STATES GO ROUND A CYCLE OF MANY DAYS (19 TO 62 ON THE SCENARIOS OF checks.py). WHEN NEWTON
+# CLOSES IN ON SUCH A JUMP, STALLS OR RUNS OUT OF ITERATIONS, THE SOLVER FALLS BACK TO PLAIN DAYS FROM ITS LAST STATE AND
+# STOPS AT THE FIRST period WHOSE LAST period MIDNIGHTS REPEAT THE period BEFORE THEM TO WITHIN THE RESOLUTION
+# ('cycle', WITH THE orbit). THE JACOBIAN IS OFTEN NEARLY SINGULAR (WITHOUT OUTFLOW ONLY Th - Tt MATTERS), SO ITS
+# SMALLEST SINGULAR VALUES ARE DROPPED RATHER THAN INVERTED. NO SOLVE RUNS MORE THAN max_days DAYS ('max days').
+
+tolerance = 1e-6 #°C, LARGEST CHANGE OVER A DAY ACCEPTED AS PERIODIC
+difference = 1e-2 #°C, FINITE DIFFERENCE STEP
+max_iterations = 10 #NEWTON ITERATIONS BEFORE LOOKING FOR A CYCLE
+stalled = 3 #NEWTON ITERATIONS WITHOUT HALVING THE RESIDUAL BEFORE LOOKING FOR A CYCLE
+max_period = 64 #DAYS, LONGEST CYCLE LOOKED FOR
+max_days = 240 #ONE-DAY RUNS OF A WHOLE SOLVE
+shortest_step = 1e-4 #°C, HALVING STOPS HERE (OR AT THE RESOLUTION OF THE MODEL)
+singular = 1e-8 #RELATIVE TO THE LARGEST, SMALLER SINGULAR VALUES OF THE JACOBIAN ARE FINITE DIFFERENCE NOISE
+
+
+class Out_of_days(Exception):
+    pass
+
+class Periodic_result:
+
+    def __init__(self, state, residual, reason, iterations, days, history, output, orbit=None):
+
+        # state IS (Th, Tt) AT MIDNIGHT ON THE ORBIT, residual = |P(state) - state| (°C, LARGEST OF THE TWO; FOR A
+        # CYCLE HOW FAR ITS LAST PERIOD WAS FROM THE ONE BEFORE), reason ONE OF 'converged', 'resolution' (WITHIN ONE
+        # SECOND OF HEATING), 'cycle' (NO FIXED POINT, orbit REPEATS EVERY len(orbit) DAYS), 'max days', days THE
+        # NUMBER OF ONE-DAY RUNS IT TOOK, history ONE (STEP, RESIDUAL) ROW PER NEWTON ITERATION WITH STEP ONE OF
+        # 'start', 'newton', 'damped', 'discontinuous', 'fixed point', orbit THE MIDNIGHT STATES OF THE CYCLE FROM
+        # state, AND output THE simulation.Output OF THE DAY FROM state
+
+        self.state = state
+        self.residual = residual
+        self.reason = reason
+        self.converged = reason in ('converged', 'resolution')
+        self.iterations = iterations
+        self.days = days
+        self.history = history
+        self.output = output
+        self.orbit = [state] if orbit is None else orbit
+        self.period = len(self.orbit)
+
+    def report(self):
+
+        if self.converged:
+            found = 'Periodic state found'
+        elif self.reason == 'cycle':
+            found = 'No daily periodic state, the midnight states repeat every ' + str(self.period) + ' days'
+        else:
+            found = 'Periodic state NOT found (' + self.reason + ')'
+
+        lines = [found + ' after ' + str(self.iterations) + ' iterations, ' + str(self.days) + ' simulated days.',
+                 'Heater ' + str(round(self.state[0], 4)) + ' °C, tank ' + str(round(self.state[1], 4)) + ' °C at midnight, residual ' + '{:.2e}'.format(self.residual) + ' °C.']
+        lines += ['  ' + str(k) + ': ' + step + ', residual ' + '{:.2e}'.format(residual) for k, (step, residual) in enumerate(self.history)]
+
+        return '\n'.join(lines)
+
+class Periodic_solver:
+
+    def __init__(self, heater=None, pump=None, tank=None, model='adaptive'):
+
+        if model not in ('engine', 'adaptive'):
+            raise ValueError("model must be 'engine' or 'adaptive', not " + repr(model) + '.')
+
+        self.heater = heater if heater is not None else Heater()
+        self.pump = pump if pump is not None else Pump()
+        self.tank = tank if tank is not None else Storage_tank()
+        self.model = model
+        self.days = 0
+
+    def resolution(self):
+
+        # HOW CLOSELY P IS DEFINED (°C): ONE SECOND OF COIL HEATING AT THE STRONGEST IRRADIANCE
+
+        return float(Engine(self.heater, self.pump, self.tank).heating_per_second(secs_in_a_day).max())
+
+    def feasible(self, state, resolution):
+
+        # state MOVED INTO THE BOX THE MODEL STAYS IN: THE COIL STOPS WITHIN ONE SECOND OF HEATING PAST THE THRESHOLD,
+        # NOTHING GETS COLDER THAN THE MAKE-UP WATER, AND THE TANK, ONLY EVER WARMED BY HEATER WATER, NOT WARMER THAN IT
+
+        heater = min(max(state[0], self.tank.temp_of_outside), self.heater.get_threshold_temperature() + resolution)
+        tank = min(max(state[1], self.tank.temp_of_outside), heater)
+
+        return np.array([heater, tank])
+
+    def day(self, state):
+
+        # ONE DAY FROM (Th, Tt) AT MIDNIGHT, RETURNS THE STATE AT THE NEXT MIDNIGHT AND THE RUN: A simulation.Output,
+        # OR AN adaptive.Trajectory WHOSE TRACES ARE ONLY SAMPLED FOR THE DAY THAT IS KEPT (SEE output). RAISES
+        # Out_of_days PAST max_days
+
+        if self.days >= max_days:
+            raise Out_of_days()
+
+        self.heater.temp_of_water_in_heater, self.tank.temp_of_water_in_tank = float(state[0]), float(state[1])
+        self.pump.turn_off()
+
+        if self.model == 'adaptive':
+            output = Integrator(self.heater, self.pump, self.tank).run(secs_in_a_day)
+        else:
+            output = Engine(self.heater, self.pump, self.tank).run(secs_in_a_day)
+        self.days += 1
+
+        return np.array([self.heater.get_temperature(), self.tank.get_temperature()]), output
+
+    def output(self, run):
+        return run.output() if isinstance(run, Trajectory) else run
+
+    def jacobian(self, state, mapped):
+
+        # FORWARD DIFFERENCES OF F(x) = P(x) - x AROUND state, WHERE mapped = P(state)
+
+        columns = []
+        for k in range(2):
+            shifted = state.copy()
+            shifted[k] += difference
+            columns.append((self.day(shifted)[0] - shifted - (mapped - state)) / difference)
+
+        return np.stack(columns, axis=1)
+
+    def cycle(self, state, resolution):
+
+        # PLAIN DAYS FROM state UNTIL THE LAST period MIDNIGHTS REPEAT THE period BEFORE THEM TO WITHIN resolution.
+        # RETURNS THE orbit FROM ITS LAST MIDNIGHT BUT ONE, HOW CLOSELY IT REPEATED AND THE RUN OF THE DAY FROM IT
+
+        states = [state]
+
+        while True:
+            mapped, output = self.day(states[-1])
+            states.append(mapped)
+            n = len(states) - 1
+            visited = np.array(states)
+
+            for period in range(1, min(max_period, (n + 1) // 2) + 1):
+                residual = np.abs(visited[n - period + 1:] - visited[n - 2 * period + 1: n - period + 1]).max()
+                if residual <= resolution:
+                    return [states[n - 1]] + states[n - period: n - 1], float(residual), output
+
+    def solve(self, state=None):
+
+        # FROM state (THE COMPONENTS' CURRENT TEMPERATURES BY DEFAULT). THE COMPONENTS ARE LEFT AT THE ORBIT'S MIDNIGHT STATE
+
+        self.days = 0
+        resolution = self.resolution()
+        shortest = max(shortest_step, resolution)
+
+        state = np.array([self.heater.get_temperature(), self.tank.get_temperature()] if state is None else state, dtype=float)
+        mapped, output = self.day(state)
+        residual = mapped - state
+        history = [('start', float(np.abs(residual).max()))]
+        jacobian = None
+        iterations = 0
+        orbit = None
+        reason = 'max iterations'
+
+        try:
+            while np.abs(residual).max() > tolerance and iterations < max_iterations:
+
+                iterations += 1
+
+                if jacobian is None:
+                    jacobian = self.jacobian(state, mapped)
+
+                step = self.feasible(state + np.linalg.lstsq(jacobian, -residual, rcond=singular)[0], resolution) - state
+                kind = 'newton'
+
+                while True:
+                    trial = state + step
+                    trial_mapped, trial_output = self.day(trial)
+                    trial_residual = trial_mapped - trial
+                    if np.abs(trial_residual).max() < np.abs(residual).max() or np.abs(step).max() < shortest:
+                        break
+                    step = step / 2
+                    kind = 'damped'
+
+                if np.abs(trial_residual).max() >= np.abs(residual).max():
+
+                    if np.abs(residual).max() <= resolution:
+                        reason = 'resolution'
+                        break
+
+                    # A TINY STEP FLIPPING THE SIGN OF THE LARGEST RESIDUAL IS A JUMP OF F OVER ZERO, NOT A ROOT
+
+                    largest = np.abs(residual).argmax()
+                    if np.sign(trial_residual[largest]) == -np.sign(residual[largest]):
+                        history.append(('discontinuous', float(np.abs(trial_residual).max())))
+                        reason = 'discontinuous'
+                        break
+
+                    # NEWTON DID NOT HELP HERE, ONE DAY FORWARD ALWAYS MOVES TOWARDS THE ORBIT. THE JACOBIAN IS TAKEN AGAIN NEXT TIME
+
+                    trial, trial_mapped, trial_output = mapped, *self.day(mapped)
+                    trial_residual = trial_mapped - trial
+                    step = trial - state
+                    kind = 'fixed point'
+                    jacobian = None
+
+                # BROYDEN UPDATE, THE JACOBIAN NOW MAPS THE STEP JUST TAKEN ONTO THE CHANGE OF F IT CAUSED
+
+                if jacobian is not None and step @ step > 0:
+                    jacobian = jacobian + np.outer(trial_residual - residual - jacobian @ step, step) / (step @ step)
+
+                state, mapped, residual, output = trial, trial_mapped, trial_residual, trial_output
+                history.append((kind, float(np.abs(residual).max())))
+
+                # stalled ITERATIONS THAT DID NOT HALVE THE RESIDUAL: NEWTON IS GOING ROUND A CYCLE, NOT TO A ROOT
+
+                residuals = [row[1] for row in history]
+                if len(residuals) > stalled and min(residuals[-stalled:]) > min(residuals[:-stalled]) / 2:
+                    reason = 'stalled'
+                    break
+
+            if np.abs(residual).max() <= tolerance:
+                reason = 'converged'
+
+            # NO FIXED POINT: LOOK FOR THE CYCLE THE DAYS GO ROUND FROM THE LAST STATE OF THE MODEL
+
+            if reason in ('discontinuous', 'stalled', 'max iterations'):
+                orbit, cycle_residual, output = self.cycle(mapped, resolution)
+                state, residual, reason = np.array(orbit[0]), np.array([cycle_residual]), 'cycle'
+
+        except Out_of_days:
+            reason = 'max days'
+
+        self.heater.temp_of_water_in_heater, self.tank.temp_of_water_in_tank = float(state[0]), float(state[1])
+        self.pump.turn_off()
+
+        if orbit is not None:
+            orbit = [(float(x[0]), float(x[1])) for x in orbit]
+
+        return Periodic_result((float(state[0]), float(state[1])), float(np.abs(residual).max()), reason, iterations, self.days, history, self.output(output), orbit)
+
+def solve(config=None, state=None, model='adaptive'):
+
+    # PERIODIC STATE OF A config.Config (THE DEFAULT SETUP WITHOUT ONE)
+
+    if config is None:
+        return Periodic_solver(model=model).solve(state)
+
+    heater, pump, tank = config.apply_parameters()
+    config.apply_schedule(tank)
+
+    return Periodic_solver(heater, pump, tank, model).solve(state)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Min/max level-of-detail pyramid for plotting long temperature traces, on screen or to PNG / SVG files
+"""
+
+import numpy as np
+
+# LEVEL 0 OF A Pyramid IS THE TRACE ITSELF. LEVEL k SPLITS IT INTO BUCKETS OF 2^k SECONDS AND KEEPS, FOR EVERY
+# BUCKET, WHERE ITS MINIMUM AND ITS MAXIMUM ARE (AND THEIR VALUES), EACH LEVEL BUILT FROM THE ONE BELOW IN ONE
+# VECTORIZED PASS. THE WHOLE PYRAMID TAKES ABOUT FOUR TIMES THE MEMORY OF THE TRACE AND IS BUILT ONCE.
+#
+# A VIEW OF [start, stop) IS DRAWN FROM THE FINEST LEVEL WITH NO MORE BUCKETS THAN THE AXES HAVE PIXELS, AS THE
+# MIN AND MAX OF EACH BUCKET IN TIME ORDER: AT MOST TWO POINTS PER PIXEL, PEAKS AND DIPS NEVER DROPPED, AND
+# ZOOMING INTO A WINDOW ONLY READS THE BUCKETS OF THAT WINDOW. (THE FIRST AND LAST BUCKET MAY REACH A LITTLE
+# OUTSIDE THE WINDOW, POINTS OUTSIDE IT ARE LEFT OUT.)
+
+pixels = 1000 #DEFAULT POINTS ACROSS A VIEW WHEN THERE ARE NO AXES TO MEASURE
+figure_size = (10, 6) #INCHES, SAME AS THE ORIGINAL PLOT
+
+
+class Pyramid:
+
+    def __init__(self, values):
+
+        values = np.asarray(values, dtype=float).reshape(-1)
+        self.values = values
+
+        # levels[k] = (INDEX OF MIN, VALUE OF MIN, INDEX OF MAX, VALUE OF MAX) PER BUCKET OF 2^(k+1) SECONDS
+
+        self.levels = []
+        index = np.arange(len(values))
+        low_index, low, high_index, high = index, values, index, values
+
+        while len(low) > 1:
+
+            # AN ODD BUCKET OUT IS PAIRED WITH ITSELF
+
+            if len(low) % 2:
+                low_index, low = np.append(low_index, low_index[-1]), np.append(low, low[-1])
+                high_index, high = np.append(high_index, high_index[-1]), np.append(high, high[-1])
+
+            lower = low[1::2] < low[0::2]
+            higher = high[1::2] > high[0::2]
+
+            low_index = np.where(lower, low_index[1::2], low_index[0::2])
+            low = np.where(lower, low[1::2], low[0::2])
+            high_index = np.where(higher, high_index[1::2], high_index[0::2])
+            high = np.where(higher, high[1::2], high[0::2])
+
+            self.levels.append((low_index, low, high_index, high))
+
+    def __len__(self):
+        return len(self.values)
+
+    def limits(self):
+
+        # (MIN, MAX) OF THE WHOLE TRACE, FROM THE TOP OF THE PYRAMID
+
+        if not self.levels:
+            return (float(self.values.min()), float(self.values.max())) if len(self.values) else (0.0, 1.0)
+
+        low_index, low, high_index, high = self.levels[-1]
+
+        return float(low[0]), float(high[0])
+
+    def view(self, start=0, stop=None, points=pixels):
+
+        # (SECONDS, TEMPERATURES) TO DRAW [start, stop) WITH AT MOST ABOUT points POINTS
+
+        n = len(self.values)
+        stop = n if stop is None else stop
+        start, stop = max(0, int(np.floor(start))), min(n, int(np.ceil(stop)))
+
+        if stop <= start:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        if stop - start <= 2 * points:
+            return np.arange(start, stop), self.values[start: stop]
+
+        level = min(int(np.ceil(np.log2((stop - start) / points))), len(self.levels)) - 1
+        first, last = start >> (level + 1), ((stop - 1) >> (level + 1)) + 1
+        low_index, low, high_index, high = (array[first: last] for array in self.levels[level])
+
+        early = low_index <= high_index
+        x = np.stack((np.where(early, low_index, high_index), np.where(early, high_index, low_index)), axis=1).ravel()
+        y = np.stack((np.where(early, low, high), np.where(early, high, low)), axis=1).ravel()
+
+        inside = (x >= start) & (x < stop)
+
+        return x[inside], y[inside]
+
+class Trace_plot:
+
+    def __init__(self, heater, tank, figure=None, every=1):
+
+        # HEATER AND TANK TRACES ON ONE AXES, REDRAWN FROM THEIR PYRAMIDS WHENEVER THE TIME AXIS CHANGES
+        # (ZOOM, PAN). every IS THE NUMBER OF SECONDS BETWEEN TWO READINGS OF THE TRACES
+
+        if figure is None:
+            import matplotlib.pyplot as plt
+            figure = plt.figure(figsize=figure_size)
+
+        self.figure = figure
+        self.ax = figure.add_subplot()
+        self.every = every
+        self.pyramids = (Pyramid(heater), Pyramid(tank))
+
+        self.lines = (self.ax.plot([], [], linewidth=1, color='red', label='Heater')[0],
+                      self.ax.plot([], [], linewidth=1, color='green', label='Storage Tank')[0])
+
+        lows, highs = zip(*(pyramid.limits() for pyramid in self.pyramids))
+        low, high = min(lows), max(highs)
+        margin = (high - low) * 0.05 or 1
+
+        self.ax.set_ylim(low - margin, high + margin)
+        self.ax.set_xlabel("Time(s)")
+        self.ax.set_ylabel("Temperature in C°")
+        self.ax.set_title("Temperature Changes in Heater and Storage Tank")
+        self.ax.legend(handles=list(self.lines))
+
+        self.ax.callbacks.connect('xlim_changed', lambda ax: self.redraw())
+        self.ax.set_xlim(0, max(len(pyramid) for pyramid in self.pyramids) * every)
+
+    def points(self):
+
+        # ONE POINT PER PIXEL OF THE AXES WIDTH
+
+        width = self.ax.get_window_extent().width
+
+        return int(width) if width >= 1 else pixels
+
+    def redraw(self):
+
+        start, stop = self.ax.get_xlim()
+        points = self.points()
+
+        for pyramid, line in zip(self.pyramids, self.lines):
+            x, y = pyramid.view(start / self.every, stop / self.every + 1, points)
+            line.set_data(x * self.every, y)
+
+        self.figure.canvas.draw_idle()
+
+    def zoom(self, start, stop):
+
+        # SHOWS THE SECONDS [start, stop), ONLY THEIR BUCKETS ARE READ
+
+        self.ax.set_xlim(start, stop)
+
+    def save(self, path, dpi=100):
+
+        # FORMAT FROM THE EXTENSION, e.g. .png OR .svg. AN SVG GETS THE SAME NUMBER OF POINTS AS A PNG OF THAT dpi
+
+        self.redraw()
+        self.figure.savefig(path, dpi=dpi)
+
+def plot(heater, tank, every=1):
+
+    # INTERACTIVE WINDOW, ZOOMING IN RENDERS MORE DETAIL
+
+    import matplotlib.pyplot as plt
+
+    trace_plot = Trace_plot(heater, tank, every=every)
+    plt.show()
+
+    return trace_plot
+
+def export(heater, tank, path, start=None, stop=None, every=1, dpi=100):
+
+    # WRITES THE PLOT OF [start, stop) SECONDS (THE WHOLE RUN BY DEFAULT) TO path WITHOUT A DISPLAY OR pyplot
+
+    from matplotlib.figure import Figure
+
+    trace_plot = Trace_plot(heater, tank, Figure(figsize=figure_size), every)
+    if start is not None or stop is not None:
+        lower, upper = trace_plot.ax.get_xlim()
+        trace_plot.zoom(lower if start is None else start, upper if stop is None else stop)
+    trace_plot.save(path, dpi)
+
+    return trace_plot
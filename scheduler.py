@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Event-driven (next-event time advance) scheduler for the systems of main.py
+"""
+import heapq
+
+import numpy as np
+
+import main
+import solar
+from main import (PumpTriggerEvent, TankTempThreshold, OutsideFlowEvent, Water, WaterPacketEvent,
+                  Heater, StorageTank, OutletSystem, Simulation, getInput, plot, setParameters)
+
+# main.Simulation.run TICKS EVERY SECOND: EVENTS EMITTED DURING A TICK ARE DELIVERED AT THE START OF THE NEXT ONE.
+# HERE EVERY EVENT CARRIES THE TICK IT IS DELIVERED AT AND WAITS IN A PRIORITY QUEUE. BETWEEN TWO DELIVERIES
+# EACH SYSTEM INTEGRATES ITS OWN STATE OVER ALL THE TICKS AT ONCE AND REPORTS THE FIRST TICK AT WHICH IT WOULD
+# EMIT AN EVENT THAT CHANGES ANOTHER SYSTEM'S STATE. THE SIMULATION ADVANCES UP TO THAT TICK AND SCHEDULES IT.
+#
+# EVENTS THAT ONLY REPEAT THE RECEIVER'S CURRENT STATE (PumpTriggerEvent(turnOn=False) WHILE THE PUMP IS OFF,
+# TankTempThreshold(isCrossed=True) AFTER THE FIRST ONE) ARE NOT SCHEDULED. THE PER-TICK WaterPacketEvent STREAM
+# FROM HEATER TO TANK IS MIXED INTO THE TANK ANALYTICALLY, ONLY THE PACKET STILL IN FLIGHT AT THE END OF AN
+# ADVANCE IS SCHEDULED AS AN EVENT.
+#
+# THE TRACES MATCH main.Simulation.run TO WITHIN ROUNDING OF THE REORDERED MIXING ARITHMETIC.
+
+maxTicksPerAdvance = 4096
+packetVolume = 0.00114 * 1 * 1000  # L, VOLUME PUMPED FROM HEATER TO TANK PER TICK
+outsideWaterTemp = 22  # °C
+
+
+def affineScan(a, b, x0):
+    # SOLVES x[k+1] = a[k] * x[k] + b[k] AND RETURNS x[1:]
+    p = np.cumprod(a)
+    return p * (x0 + np.cumsum(b / p))
+
+
+class EventScheduler:
+    def __init__(self):
+        self.queue = []
+        self.count = 0
+
+    def schedule(self, time: int, event):
+        heapq.heappush(self.queue, (time, self.count, event))
+        self.count += 1
+
+    def nextTime(self):
+        return self.queue[0][0] if self.queue else float('inf')
+
+    def pop(self, time: int):
+        events = []
+        while self.queue and self.queue[0][0] <= time:
+            events.append(heapq.heappop(self.queue)[2])
+        return events
+
+
+class EventDrivenHeater(Heater):
+    def __init__(self):
+        super().__init__()
+        self.heatingPerTick = None
+
+    def advance(self, start: int, stop: int):
+        # TEMPERATURES AT THE END OF TICKS [start, stop), TEMPERATURE OF THE PACKET PUMPED TO THE TANK IN EACH
+        # OF THEM (OR None), AND THE FIRST TICK WITH THE EVENT IT EMITS (OR None)
+        self.updateTemperature()
+        temp = self.getHeaterTemperature()
+        n = stop - start
+
+        if self.heatingPerTick is None:
+            power = self.solarPanel.solarCurrentInADay ** 2 * self.resistanceOfCoil
+            self.heatingPerTick = power * 1 / (main.specificHeatOfWater * 1 * self.capacity)
+
+        if self.pumpStatus:
+            packets = np.full(n, temp)
+            if temp < self.thresholdTemp or self.tankThresholdTempCrossed:
+                temps = np.full(n, temp + self.heatingPerTick[start % main.secs_in_a_day] if temp < self.thresholdTemp else temp)
+                return temps, packets, start, PumpTriggerEvent(turnOn=False)
+            return np.full(n, temp), packets, None, None
+
+        if temp >= self.thresholdTemp:
+            if self.tankThresholdTempCrossed:
+                return np.full(n, temp), None, None, None
+            return np.full(n, temp), None, start, PumpTriggerEvent(turnOn=True)
+
+        # HEATING: THE COIL ADDS HEAT EVERY TICK THAT STARTS BELOW THE THRESHOLD
+
+        temps = np.cumsum(np.concatenate(([temp], solar.window(self.heatingPerTick, start, stop))))
+        hot = temps >= self.thresholdTemp
+        if not hot.any():
+            return temps[1:], None, None, None
+
+        first = int(np.argmax(hot))
+        temps[first:] = temps[first]
+        if self.tankThresholdTempCrossed or start + first >= stop:
+            return temps[1:], None, None, None
+        return temps[1:], None, start + first, PumpTriggerEvent(turnOn=True)
+
+    def commit(self, temps, packets, n: int):
+        volume = self.waterPackets.volumes[0] - (packetVolume * n if packets is not None else 0)
+        self.waterPackets.reset(float(temps[n - 1]), volume)
+
+
+class EventDrivenTank(StorageTank):
+    def __init__(self):
+        super().__init__()
+        self.thresholdReported = False
+
+    def advance(self, start: int, stop: int, packets):
+        # TEMPERATURES AND VOLUMES AT THE END OF TICKS [start, stop) GIVEN THE HEATER'S PACKET STREAM FOR THE SAME
+        # TICKS, AND THE FIRST TICK WITH THE EVENT IT EMITS (OR None)
+        n = stop - start
+        inTemp, inVol = np.zeros(n), np.zeros(n)
+
+        # PACKETS ALREADY DELIVERED ARE MIXED IN THE FIRST TICK, THE STREAM EMITTED DURING THE ADVANCE ONE TICK LATER
+
+        store = self.waterPackets
+        if store.count > 1:
+            inVol[0] = sum(store.volumes[1: store.count])
+            inTemp[0] = sum(t * v for t, v in zip(store.temperatures[1: store.count], store.volumes[1: store.count])) / inVol[0]
+        if packets is not None:
+            inTemp[1:], inVol[1:] = packets[:-1], packetVolume
+
+        outflow = self.outsideFlowRate * 1 * 1000
+        volumes = store.volumes[0] + np.cumsum(inVol)
+        a = (volumes - inVol - outflow) / volumes
+        b = (inTemp * inVol + outsideWaterTemp * outflow) / volumes
+        temps = affineScan(a, b, store.temperatures[0])
+
+        if self.thresholdReported:
+            return temps, volumes, None, None
+        crossed = temps > self.thresholdTemperature
+        if not crossed.any():
+            return temps, volumes, None, None
+        return temps, volumes, start + int(np.argmax(crossed)), TankTempThreshold(isCrossed=True)
+
+    def commit(self, temps, volumes, n: int):
+        self.waterPackets.reset(float(temps[n - 1]), float(volumes[n - 1]))
+
+
+class EventDrivenOutlet(OutletSystem):
+    def events(self, end: int):
+        # (TICK, EVENT) PAIRS EMITTED BY OutletSystem.update OVER [0, end), ONE AT EACH CHANGE OF THE TOTAL FLOW RATE
+        schedule = self.getSchedule()
+        return [(int(tick), OutsideFlowEvent(turnOn=schedule.rate(tick) > 0, flowRate=schedule.rate(tick)))
+                for tick in schedule.changes(end)]
+
+
+class EventDrivenSimulation(Simulation):
+    def __init__(self, config=None, traces=None):
+        self.heater, self.tank, self.outlet = EventDrivenHeater(), EventDrivenTank(), EventDrivenOutlet()
+        self.systems = [self.heater, self.tank, self.outlet]
+        self.outletEvents = []
+        self.scheduler = EventScheduler()
+        self.config = config
+        self.connect(traces)
+        if config is not None:
+            setParameters(self.heater, self.tank, self.outlet, config.parameters)
+        getInput(self.outlet, config)
+
+    def run(self, days: int = None):
+        if days is None:
+            days = self.config.days if self.config is not None else 1
+        self.simulate(days)
+        plot(self.periodicTempInHeater, self.periodicTempInTank)
+
+    def simulate(self, days: int):
+        day = main.secs_in_a_day
+        end = days * day
+        heaterTrace, tankTrace = np.empty(end), np.empty(end)
+
+        # THE OUTFLOW SCHEDULE REPEATS EVERY DAY, EACH DAY'S EVENTS ARE QUEUED WHEN THE DAY STARTS
+        outletEvents = self.outlet.events(day)
+
+        time = 0
+        while time < end:
+            if time % day == 0:
+                for tick, event in outletEvents:
+                    self.scheduler.schedule(time + tick + 1, event)
+
+            events = self.scheduler.pop(time)
+            for system in self.systems:
+                system.handleEvents(events)
+
+            stop = int(min(self.scheduler.nextTime(), (time // day + 1) * day, time + maxTicksPerAdvance))
+
+            heaterTemps, packets, heaterTick, heaterEvent = self.heater.advance(time, stop)
+            if heaterTick is not None:
+                stop = heaterTick + 1
+            if packets is not None:
+                packets = packets[:stop - time]
+
+            tankTemps, tankVolumes, tankTick, tankEvent = self.tank.advance(time, stop, packets)
+            if tankTick is not None:
+                stop = tankTick + 1
+
+            n = stop - time
+            self.heater.commit(heaterTemps, packets, n)
+            self.tank.commit(tankTemps, tankVolumes, n)
+            heaterTrace[time: stop] = heaterTemps[:n]
+            tankTrace[time: stop] = tankTemps[:n]
+
+            if heaterTick == stop - 1:
+                self.scheduler.schedule(stop, heaterEvent)
+            if packets is not None:
+                self.scheduler.schedule(stop, WaterPacketEvent(water=Water(temp=packets[n - 1], vol=packetVolume), flowType='heater_to_tank'))
+            if tankTick == stop - 1:
+                self.scheduler.schedule(stop, tankEvent)
+                self.tank.thresholdReported = True
+
+            time = stop
+
+        self.periodicTempInHeater.extend(heaterTrace.tolist())
+        self.periodicTempInTank.extend(tankTrace.tolist())
+
+
+if __name__ == '__main__':
+    EventDrivenSimulation().run()
@@ -5,9 +5,13 @@ Created on Sat Mar  4 12:53:30 2023
 @author: Soumyajit Saha
 """
 
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+
+import contextlib
+
+import live
+import pyramid
+import solar
+from outflow import Outflow_schedule
 
 # ASSUMPTIONS USED:
 #   * THE COMPONENTS ARE FILLED WITH WATER INITIALLY AT ROOM TEMPERATURE  
@@ -37,21 +41,20 @@ class Solar_panel:
         
         self.solar_panel_area = 1 #m^2
         self.voltage_of_solar_panel = 20 #V
-        self.solar_power_in_a_day = np.array([0] * secs_in_a_day)
         
-        self.solar_power_in_a_day[: int(1/8*secs_in_a_day)] = 0 #W/m^2
-        self.solar_power_in_a_day[int(1/8*secs_in_a_day): int(2/8*secs_in_a_day)] = 100 #W/m^2
-        self.solar_power_in_a_day[int(2/8*secs_in_a_day): int(3/8*secs_in_a_day)] = 500 #W/m^2
-        self.solar_power_in_a_day[int(3/8*secs_in_a_day): int(4/8*secs_in_a_day)] = 700 #W/m^2
-        self.solar_power_in_a_day[int(4/8*secs_in_a_day): int(5/8*secs_in_a_day)] = 1000 #W/m^2
-        self.solar_power_in_a_day[int(5/8*secs_in_a_day): int(6/8*secs_in_a_day)] = 300 #W/m^2
-        self.solar_power_in_a_day[int(6/8*secs_in_a_day): int(7/8*secs_in_a_day)] = 100 #W/m^2
-        self.solar_power_in_a_day[int(7/8*secs_in_a_day): ] = 0 #W/m^2
+        # DAILY PROFILES ARE CACHED AND SHARED READ-ONLY BETWEEN PANELS WITH THE SAME PARAMETERS (SEE solar.py)
         
-        self.solar_current_in_a_day = self.solar_power_in_a_day * self.solar_panel_area / self.voltage_of_solar_panel #A
+        self.solar_power_in_a_day = solar.daily_power(solar.irradiance_steps, secs_in_a_day) #W/m^2
+        self.solar_current_in_a_day = solar.daily_current(self.solar_panel_area, self.voltage_of_solar_panel, solar.irradiance_steps, secs_in_a_day) #A
         
     def get_solar_current(self, i):
-        return self.solar_current_in_a_day[i]
+        return self.solar_current_in_a_day[i % secs_in_a_day]
+    
+    def get_solar_currents(self, start, stop):
+        
+        # CURRENTS FOR SECONDS [start, stop) AS AN ARRAY, THE DAILY PROFILE REPEATED (SEE weather.Weather_panel)
+        
+        return solar.window(self.solar_current_in_a_day, start, stop)
         
         
 
@@ -69,6 +72,8 @@ class Heater(Component):
         self.capacity_of_heater = 100 #L
         self.temp_of_water_in_heater = 22 #°C
         self.water_from_heater_to_tank = 0
+        self.heated_at = -1 #s, LAST SECOND WITH THE COIL ON
+        self.pumped_at = -1 #s, LAST SECOND WITH THE PUMP RUNNING
         
     def update_temperature(self, temp_of_water_in_tank):
         
@@ -104,8 +109,9 @@ class Heater(Component):
                 print('Pump started at ' + str(sec) + '.')
                 
             self.water_from_heater_to_tank = pump.get_flow_rate() * 1 * 1000 #L
+            self.pumped_at = sec
             
-            self.update_temperature(tank.get_temperature())
+            self.update_temperature(tank.get_return_temperature())
             tank.update_temperature(self.water_from_heater_to_tank, self.get_temperature())
             
             if tank.temp_of_water_in_tank >= 50:
@@ -116,6 +122,7 @@ class Heater(Component):
                 pump.turn_off()
                 print('Pump stopped at ' + str(sec) + '.')
             power = self.heat_transfer(sec, water)
+            self.heated_at = sec
             print('Heat of ' + str(power) + ' W/m^2 transfered from coil to water in heater at ' + str(sec) + '.')
             
             
@@ -151,11 +158,12 @@ class Storage_tank(Component):
         self.capacity_of_storage_tank = 1000 #L
         self.start_time_of_outflow_from_tank = []
         self.duration_of_outflow_from_tank = []
+        self.flow_rates_of_outflow_from_tank = [] #m^3/s, None FOR flow_rate
         self.flow_rate = 0.0005 #m^3/s
         self.temp_of_water_in_tank = 22 #°C
         self.flag_flow = 0
-        self.start = -1
-        self.end = -1
+        self.outflow_schedule = None
+        self.outflow_schedule_key = None
         self.temp_of_outside = 22 #°C
         self.threshold_temperature_of_water_in_tank = 50 #°C
         self.water_flow = 0
@@ -165,6 +173,12 @@ class Storage_tank(Component):
     
     def get_threshold_temperature(self):
         return self.threshold_temperature_of_water_in_tank
+    
+    def get_return_temperature(self):
+        
+        # TEMPERATURE OF THE WATER PUMPED BACK TO THE HEATER, THE BOTTOM LAYER OF A stratified.Stratified_tank
+        
+        return self.temp_of_water_in_tank
       
     def update_temperature(self, water_flow_to_heater, temp_of_water_in_heater):
         
@@ -178,8 +192,9 @@ class Storage_tank(Component):
     def set_start_times(self, hours, mins, secs):
         self.start_time_of_outflow_from_tank.append(int(hours)*3600 + int(mins)*60 + int(secs))
         
-    def set_durations(self, duration):
+    def set_durations(self, duration, flow_rate=None):
         self.duration_of_outflow_from_tank.append(int(duration))
+        self.flow_rates_of_outflow_from_tank.append(flow_rate)
         
     def get_inflow(self):
         return self.flag_flow
@@ -193,16 +208,22 @@ class Storage_tank(Component):
     def get_flow_rate(self):
         return self.flow_rate
     
-    def set_start_end(self, start):
-        self.start = start
-        self.end = start + self.duration_of_outflow_from_tank[self.start_time_of_outflow_from_tank.index(start)]
+    def get_outflow_schedule(self):
         
-    def reset_start_end(self):
-        self.start = -1
-        self.end = -1
+        # INDEX OF THE OUTFLOW SCHEDULE, REBUILT WHEN AN OUTFLOW IS ADDED OR flow_rate CHANGES. AN OUTFLOW RUNS FROM ITS
+        # START TIME TO start + duration INCLUSIVE, OVERLAPPING OUTFLOWS ADD UP THEIR FLOW RATES
         
-    def get_end_time(self):
-        return self.end
+        starts, durations = self.start_time_of_outflow_from_tank, self.duration_of_outflow_from_tank
+        key = (len(starts), len(durations), self.flow_rate)
+        
+        if self.outflow_schedule_key != key:
+            n = min(len(starts), len(durations))
+            rates = (self.flow_rates_of_outflow_from_tank + [None] * n)[:n]
+            flow_rates = [self.flow_rate if rate is None else rate for rate in rates]
+            self.outflow_schedule = Outflow_schedule(starts[:n], [duration + 1 for duration in durations[:n]], flow_rates, secs_in_a_day)
+            self.outflow_schedule_key = key
+            
+        return self.outflow_schedule
         
     def update_temperature_after_inflow_from_outside(self):
         
@@ -212,78 +233,115 @@ class Storage_tank(Component):
     
     def update(self, sec):
         
-        if sec in self.get_start_times():
+        schedule = self.get_outflow_schedule()
+        
+        if not schedule.is_running(sec):
+            return
+        
+        if schedule.starts_at(sec):
             
             self.set_inflow()
-            self.set_start_end(sec)
-            
             
             print('Water outflow from Storage Tank started at ' + str(sec) + ' seconds.')
             
-            # print(tank.start, tank.end)
-            
-            
-        if self.get_inflow():
             
-            self.water_flow = self.get_flow_rate() * 1 * 1000 #L
-            self.update_temperature_after_inflow_from_outside()
-            
-            if sec == self.get_end_time():
-                # print('end')
-                print('Water outflow from Storage Tank stopped at ' + str(sec) + ' seconds.')
-                self.reset_inflow()
-                self.reset_start_end()
+        self.water_flow = schedule.rate(sec) * 1 * 1000 #L
+        self.update_temperature_after_inflow_from_outside()
+        
+        if schedule.stops_after(sec):
+            print('Water outflow from Storage Tank stopped at ' + str(sec) + ' seconds.')
+            self.reset_inflow()
     
 class Output:
     
-    def __init__(self):
-        self.temperatures_of_water_in_heater = []
-        self.temperatures_of_water_in_tank = []
+    def __init__(self, temperatures_of_water_in_heater=None, temperatures_of_water_in_tank=None):
+        
+        # ANYTHING WITH append WORKS AS A TRACE, e.g. A streaming.Stream TO KEEP MEMORY BOUNDED ON LONG RUNS
+        
+        self.temperatures_of_water_in_heater = [] if temperatures_of_water_in_heater is None else temperatures_of_water_in_heater
+        self.temperatures_of_water_in_tank = [] if temperatures_of_water_in_tank is None else temperatures_of_water_in_tank
+        self.feed = None
         
     def register_results(self, heater, tank):
         self.temperatures_of_water_in_heater.append(heater)
         self.temperatures_of_water_in_tank.append(tank)
         
+        # LIVE VIEW, SEE live.watch
+        
+        if self.feed is not None:
+            self.feed.append(heater, tank)
+        
     def get_heater_temperatures(self):
         return self.temperatures_of_water_in_heater
     
     def get_tank_temperatures(self):
         return self.temperatures_of_water_in_tank
     
-    def animate(self, i):
-        
-        self.ax.clear()
-        self.ax.plot([k for k in range(i)], self.get_heater_temperatures()[:i], linewidth=1, color='red', label='Heater')
-        self.ax.plot([k for k in range(i)], self.get_tank_temperatures()[:i], linewidth=1, color='green', label='Storage Tank')
-        self.ax.legend()
-        self.ax.set_xlabel("Time(s)")
-        self.ax.set_ylabel("Temperature in C°")
-        self.ax.set_title("Temperature Changes in Heater and Storage Tank")
-    
     def plot(self, is_animation):
         
         if is_animation == 'Y':
             
-            self.fig, self.ax = plt.subplots()
-            ani = FuncAnimation(self.fig, self.animate, frames=secs_in_a_day, interval=1, repeat=False)
-    
-            plt.show()
+            # REPLAY OF THE FINISHED TRACES, BLITTED AND DECIMATED (SEE live.py)
+            
+            self.ani = live.play(self.get_heater_temperatures(), self.get_tank_temperatures())
             
         else:
+            
+            # ONLY ABOUT TWO POINTS PER PIXEL ARE DRAWN, FROM MIN / MAX PYRAMIDS (SEE pyramid.py)
+            
+            self.trace_plot = pyramid.plot(self.get_heater_temperatures(), self.get_tank_temperatures())
+            
+    def export(self, path, start=None, stop=None):
         
-            plt.figure(figsize=(10,6))
-            plt.plot([i for i in range(secs_in_a_day)], self.get_heater_temperatures(), linewidth=1, color='red', label='Heater')
-            plt.plot([i for i in range(secs_in_a_day)], self.get_tank_temperatures(), linewidth=1, color='green', label='Storage Tank')
-            plt.xlabel("Time(s)")
-            plt.ylabel("Temperature in C°")
-            plt.title("Temperature Changes in Heater and Storage Tank")
-            plt.legend()
-            plt.show()
+        # PNG / SVG OF THE TRACES WITHOUT A DISPLAY, e.g. FOR BATCH REPORTS
+        
+        return pyramid.export(self.get_heater_temperatures(), self.get_tank_temperatures(), path, start, stop)
             
     
 class Simulation:
     
+    def __init__(self, config=None, profiler=None, layers=None, losses=None, weather=None):
+        
+        # WITH A config.Config THE ANSWERS TO THE PROMPTS COME FROM IT AND NOTHING IS ASKED.
+        # WITH AN instrument.Profiler THE LOOP IS TIMED COMPONENT BY COMPONENT (SEE instrument.py).
+        # WITH layers THE TANK IS A stratified.Stratified_tank OF THAT MANY LAYERS INSTEAD OF PERFECTLY MIXED.
+        # WITH A losses.Losses THE HEATER, TANK AND PIPES LOSE HEAT TO THE AIR.
+        # WITH A weather.Weather THE PANEL FOLLOWS ITS MEASURED IRRADIANCE INSTEAD OF THE DAILY PROFILE
+        
+        self.config = config
+        self.profiler = profiler
+        self.layers = layers
+        self.losses = losses
+        self.weather = weather
+    
+    def make_tank(self):
+        
+        if self.layers is None:
+            return Storage_tank()
+        
+        from stratified import Stratified_tank
+        
+        return Stratified_tank(self.layers)
+    
+    def make_heater(self):
+        
+        heater = Heater()
+        
+        if self.weather is not None:
+            
+            from weather import Weather_panel
+            
+            heater.solar_panel = Weather_panel(self.weather)
+            
+        return heater
+    
     def getInput(self, tank):
+        
+        if self.config is not None:
+            self.is_animation = self.config.animation
+            self.config.apply_schedule(tank)
+            return
+        
         self.is_animation = input("Do you want real time animation graph? (Y/N): ")
         no_of_inputs = input("Enter the number times you want water from storage tank: ")
         
@@ -294,7 +352,7 @@ class Simulation:
             duration = input("Enter duration in seconds: ")
             hours, mins, secs = time_of_day.split(':')
             
-            if int(hours)*3600 + int(mins)*60 + int(secs) + int(duration) >= secs_in_a_day:
+            if int(duration) < 0 or int(hours)*3600 + int(mins)*60 + int(secs) + int(duration) >= secs_in_a_day:
                 continue
             
             tank.set_start_times(hours, mins, secs)
@@ -302,32 +360,115 @@ class Simulation:
             
             i += 1
     
-    def run(self):
+    def horizon(self, days):
+        
+        # DAYS TO RUN: AS GIVEN, ELSE FROM THE config, ELSE ONE
+        
+        if days is not None:
+            return days
+        
+        return self.config.days if self.config is not None else 1
+    
+    def run(self, days=None):
         water = Water()
-        heater = Heater()
+        heater = self.make_heater()
         
         pump = Pump()
-        tank = Storage_tank()
+        tank = self.make_tank()
         
         output = Output()
         
+        if self.config is not None:
+            self.config.apply_parameters(heater, pump, tank)
+        
         self.getInput(tank)
         
-        for sec in range(secs_in_a_day):
+        days = self.horizon(days)
+        
+        def simulate():
+            self.simulate(water, heater, pump, tank, output, days * secs_in_a_day)
+        
+        # PLOTS, WITH ANIMATION LIVE WHILE THE SIMULATION RUNS IN A WORKER THREAD
+        
+        if self.is_animation == 'Y':
+            
+            output.feed = live.Feed()
+            temperatures = (heater.get_temperature(), tank.get_temperature(), tank.temp_of_outside, heater.get_threshold_temperature(), tank.get_threshold_temperature())
+            self.ani = live.watch(simulate, output.feed, days * secs_in_a_day, live.limits(*temperatures))
+            
+        else:
+            
+            simulate()
+            output.plot(self.is_animation)
+        
+    def simulate(self, water, heater, pump, tank, output, n_secs, start=0):
+        
+        # SECONDS [start, n_secs), FROM THE STATE THE COMPONENTS ARE IN (e.g. A checkpoint.py SNAPSHOT)
+        
+        with self.attached(water, heater, pump, tank, output):
+            self.loop(water, heater, pump, tank, output, n_secs, start)
+        
+    @contextlib.contextmanager
+    def attached(self, water, heater, pump, tank, output):
+        
+        # LOSSES AND PROFILER HOOKED TO THESE COMPONENTS FOR EVERY loop RUN INSIDE (checkpoint.py RUNS ONE PER SEGMENT)
+        
+        if self.losses is not None:
+            self.losses.attach(heater, pump, tank, water)
+        
+        if self.profiler is None:
+            yield
+            return
+        
+        self.profiler.attach_simulation(heater, pump, tank, output)
+        try:
+            yield
+        finally:
+            self.profiler.stop()
+        
+    def loop(self, water, heater, pump, tank, output, n_secs, start=0):
+        
+        losses = self.losses
+        
+        for sec in range(start, n_secs):
             
             # CHANGES IN HEATER
             
             heater.update(pump, tank, sec, water)
         
             
-            # CHANGES IN TANK
+            # CHANGES IN TANK, THE OUTFLOW SCHEDULE REPEATS EVERY DAY
+            
+            tank.update(sec % secs_in_a_day)
+            
+            
+            # HEAT LOST TO THE AIR
             
-            tank.update(sec)
+            if losses is not None:
+                losses.update(sec)
              
                 
             output.register_results(heater.get_temperature(), tank.get_temperature())
         
-        # PLOTS
+    def run_fast(self, days=None):
+        
+        # SAME MODEL AS run, ADVANCED SEGMENT BY SEGMENT OVER NUMPY ARRAYS (SEE engine.py)
+        
+        from engine import Engine
+        
+        if self.layers is not None or self.losses is not None:
+            raise ValueError('The engine only models the mixed tank without losses, run the others with run.')
+        
+        heater = self.make_heater()
+        pump = Pump()
+        tank = Storage_tank()
+        
+        if self.config is not None:
+            self.config.apply_parameters(heater, pump, tank)
+        
+        self.getInput(tank)
+        
+        output = Engine(heater, pump, tank).run(self.horizon(days) * secs_in_a_day)
         
         output.plot(self.is_animation)
         
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Cached daily solar irradiance profiles shared by every solar panel
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+# THE DAY IS SPLIT INTO EIGHT EQUAL STEPS OF CONSTANT IRRADIANCE. A PROFILE IS BUILT ONCE PER
+# (STEPS, SECONDS IN A DAY[, PANEL AREA, PANEL VOLTAGE]) AND HANDED OUT READ-ONLY, SO EVERY HEATER
+# AND SCENARIO WITH THE SAME PARAMETERS SHARES ONE ARRAY. LONGER HORIZONS INDEX IT MODULO ONE DAY.
+
+irradiance_steps = (0, 100, 500, 700, 1000, 300, 100, 0) #W/m^2
+
+
+@lru_cache(maxsize=None)
+def daily_power(steps=irradiance_steps, secs_in_a_day=86400):
+
+    power = np.zeros(secs_in_a_day, dtype=np.int64)
+
+    for k, value in enumerate(steps):
+        power[int(k / len(steps) * secs_in_a_day): int((k + 1) / len(steps) * secs_in_a_day)] = value #W/m^2
+
+    power.flags.writeable = False
+    return power
+
+@lru_cache(maxsize=None)
+def daily_current(area, voltage, steps=irradiance_steps, secs_in_a_day=86400):
+
+    current = daily_power(steps, secs_in_a_day) * area / voltage #A
+    current.flags.writeable = False
+    return current
+
+def window(profile, start, stop):
+
+    # VALUES FOR SECONDS [start, stop) OF A HORIZON THAT REPEATS profile EVERY DAY, A VIEW WHEN THEY FALL IN ONE DAY
+
+    day = len(profile)
+    offset = start % day
+
+    if offset + (stop - start) <= day:
+        return profile[offset: offset + (stop - start)]
+
+    return np.take(profile, np.arange(start, stop), mode='wrap')
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Stratified storage tank: N stacked layers of water in place of one perfectly mixed volume
+"""
+
+import numpy as np
+
+from simulation import Storage_tank
+
+# A DROP-IN FOR simulation.Storage_tank (Simulation(layers=N)). THE TANK IS SPLIT INTO layers EQUAL HORIZONTAL SLICES,
+# TOP TO BOTTOM, AND EVERY SECOND
+#   * THE PUMPED WATER FROM THE HEATER ENTERS THE TOP LAYER AND THE SAME VOLUME LEAVES THE BOTTOM ONE FOR THE HEATER
+#     (Heater.update READS IT WITH get_return_temperature)
+#   * AN OUTFLOW DRAWS FROM THE TOP LAYER (get_delivered_temperature) AND COLD MAKE-UP WATER AT temp_of_outside ENTERS
+#     THE BOTTOM ONE
+#   * NEIGHBOURING LAYERS EXCHANGE HEAT BY CONDUCTION AND MIXING, AN EFFECTIVE DIFFUSIVITY mixing OVER height
+#   * WARMER WATER BELOW COLDER WATER RISES: AN INVERTED PROFILE IS RE-ORDERED (THE MEAN IS KEPT)
+#
+# ADVECTION (UPWIND) AND EXCHANGE ARE TAKEN IMPLICITLY, SO A STEP IS THE TRIDIAGONAL SYSTEM A T' = T + s, STABLE FOR
+# ANY NUMBER OF LAYERS AND FLOW. A ONLY DEPENDS ON THE FLOWS OF THE SECOND, WHICH TAKE A HANDFUL OF VALUES, SO ITS
+# INVERSE IS COMPUTED ONCE PER FLOW AND A STEP IS ONE MATRIX-VECTOR PRODUCT PLUS THE INFLOW COLUMNS:
+#   T' = A^-1 T + A^-1[:, 0] * q_p / v * T_heater + A^-1[:, -1] * q_o / v * T_outside
+#
+# MOST SECONDS HAVE NEITHER PUMPING NOR OUTFLOW. THEN A IS SYMMETRIC (A = Q diag(lam) Q^T), THE MEAN DOES NOT CHANGE
+# AND NO INVERSION CAN ARISE, SO SUCH SECONDS ARE ONLY COUNTED AND APPLIED TOGETHER, Q diag(lam^-m) Q^T T FOR m OF
+# THEM, WHEN THE PROFILE IS NEXT NEEDED. AN IDLE SECOND THEN COSTS THE SAME AS IN Storage_tank.
+#
+# get_temperature IS THE MEAN OF THE LAYERS (THE THERMOSTAT, AND WHAT Output RECORDS), SO THE ENERGY IN THE TANK
+# COMPARES WITH Storage_tank'S. UNLIKE Storage_tank.update_temperature THE PUMPED WATER IS MIXED IN BY ITS VOLUME.
+# engine.Engine, batch AND adaptive ONLY MODEL THE MIXED TANK.
+
+class Stratified_tank(Storage_tank):
+
+    def __init__(self, layers=100, height=1.5, mixing=1.4e-7):
+
+        super().__init__()
+
+        self.layers = int(layers)
+        self.height = height #m
+        self.mixing = mixing #m^2/s, THERMAL DIFFUSIVITY OF WATER, MORE FOR INLET JETS AND CONVECTION
+        self.temperatures = None #°C, TOP TO BOTTOM, FILLED AT temp_of_water_in_tank ON THE FIRST STEP
+        self.operators = {}
+        self.stepped = False
+        self.idle = 0
+
+        if self.layers < 1:
+            raise ValueError('A stratified tank has at least one layer, not ' + str(self.layers) + '.')
+
+    def get_profile(self):
+
+        if self.temperatures is None:
+            self.temperatures = np.full(self.layers, float(self.temp_of_water_in_tank))
+
+        if self.idle:
+            vectors, values = self.operator(0, 0, True, idle=True)
+            self.temperatures = vectors @ (values**-self.idle * (self.temperatures @ vectors))
+            self.idle = 0
+
+        return self.temperatures
+
+    def get_delivered_temperature(self):
+        return float(self.get_profile()[0])
+
+    def get_return_temperature(self):
+        return float(self.get_profile()[-1])
+
+    def operator(self, pumped, drawn, exchange, idle=False):
+
+        # INVERSE OF A AND ITS COLUMNS FOR THE INFLOWS AT THE TOP AND AT THE BOTTOM, FLOWS IN L/s. idle: THE
+        # EIGENVECTORS AND EIGENVALUES OF A WITHOUT FLOWS. KEPT UNTIL A PARAMETER OF THE TANK CHANGES
+
+        key = (pumped, drawn, exchange, idle, self.layers, self.capacity_of_storage_tank, self.height, self.mixing)
+        operator = self.operators.get(key)
+
+        if operator is None:
+            operator = self.operators[key] = self.factor(pumped, drawn, exchange, idle)
+
+        return operator
+
+    def factor(self, pumped, drawn, exchange, idle):
+
+        n = self.layers
+        volume = self.capacity_of_storage_tank / n #L PER LAYER
+        k = self.mixing * self.capacity_of_storage_tank * n / self.height**2 if exchange else 0 #L/s
+
+        diagonal = np.full(n, 1 + (pumped + drawn + 2 * k) / volume)
+        diagonal[0] -= k / volume
+        diagonal[-1] -= k / volume
+
+        matrix = np.diag(diagonal) + np.diag(np.full(n - 1, -(pumped + k) / volume), -1) + np.diag(np.full(n - 1, -(drawn + k) / volume), 1)
+
+        if idle:
+            values, vectors = np.linalg.eigh(matrix)
+            return vectors, values
+
+        inverse = np.linalg.inv(matrix)
+
+        return inverse, inverse[:, 0] * (pumped / volume), inverse[:, -1] * (drawn / volume)
+
+    def step(self, pumped, temp_of_water_in_heater, drawn):
+
+        # ONE SECOND WITH pumped L FROM THE HEATER AND drawn L TO THE OUTFLOW. THE EXCHANGE BETWEEN LAYERS IS TAKEN
+        # ONCE PER SECOND, IN ITS FIRST STEP
+
+        profile = self.get_profile()
+        inverse, top, bottom = self.operator(pumped, drawn, not self.stepped)
+        temperatures = inverse @ profile
+
+        if pumped:
+            temperatures += top * temp_of_water_in_heater
+        if drawn:
+            temperatures += bottom * self.temp_of_outside
+
+        if (temperatures[:-1] < temperatures[1:]).any():
+            temperatures = np.sort(temperatures)[::-1]
+
+        self.temperatures = temperatures
+        self.temp_of_water_in_tank = float(temperatures.mean())
+        self.stepped = True
+
+    def update_temperature(self, water_flow_to_heater, temp_of_water_in_heater):
+
+        # WATER FROM THE HEATER ENTERS AT THE TOP, THE SAME VOLUME RETURNS TO THE HEATER FROM THE BOTTOM
+
+        self.step(water_flow_to_heater, temp_of_water_in_heater, 0)
+
+    def update_temperature_after_inflow_from_outside(self):
+
+        # WATER IS DRAWN FROM THE TOP, THE SAME VOLUME FROM OUTSIDE ENTERS AT THE BOTTOM
+
+        self.step(0, None, self.water_flow)
+
+    def update(self, sec):
+
+        super().update(sec)
+
+        # A SECOND WITHOUT PUMPING OR OUTFLOW STILL EXCHANGES HEAT BETWEEN LAYERS, LATER (get_profile)
+
+        if not self.stepped:
+            self.idle += 1
+
+        self.stepped = False
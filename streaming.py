@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming, bounded-memory trace output with pluggable sinks
+"""
+
+import os
+import zipfile
+from io import BytesIO
+
+import numpy as np
+
+# A Stream STANDS IN FOR ONE OF THE TRACE LISTS (simulation.Output.temperatures_of_water_in_heater / _tank,
+# main.Simulation(traces=...)): IT HAS append / extend / len / SLICING LIKE A LIST, BUT KEEPS
+# ONLY ONE FIXED-SIZE CHUNK IN MEMORY AND HANDS EVERY FULL CHUNK TO ITS SINKS. len AND INDEXING COVER THE ROWS THE
+# FIRST SINK GIVES BACK, WHICH FOR A BOUNDED SINK ARE ONLY THE MOST RECENT ONES. WITH window > 1 EACH CHUNK IS FIRST
+# REDUCED TO min / max / mean PER WINDOW, SO MEMORY STAYS CONSTANT WHATEVER THE HORIZON.
+#
+# A SINK IS ANY OBJECT WITH write(rows) AND close(), AND read() IF THE TRACE IS TO BE READ BACK. rows IS A
+# STRUCTURED ARRAY WITH THE FIELD 'value', OR 'min', 'max' AND 'mean' WHEN DOWNSAMPLING.
+
+value_dtype = np.dtype([('value', np.float64)])
+window_dtype = np.dtype([('min', np.float64), ('max', np.float64), ('mean', np.float64)])
+
+
+class Array_sink:
+
+    # PREALLOCATED BUFFER OF capacity ROWS, ONCE FULL IT KEEPS THE MOST RECENT ONES
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.rows = None
+        self.written = 0
+
+    def write(self, rows):
+
+        if self.rows is None:
+            self.rows = np.empty(self.capacity, dtype=rows.dtype)
+
+        self.written += len(rows) - min(len(rows), self.capacity)
+        rows = rows[-self.capacity:]
+        start = self.written % self.capacity
+        head = min(len(rows), self.capacity - start)
+
+        self.rows[start: start + head] = rows[:head]
+        self.rows[: len(rows) - head] = rows[head:]
+        self.written += len(rows)
+
+    def read(self):
+
+        if self.rows is None:
+            return np.empty(0, dtype=value_dtype)
+        if self.written <= self.capacity:
+            return self.rows[: self.written]
+
+        start = self.written % self.capacity
+        return np.concatenate((self.rows[start:], self.rows[:start]))
+
+    def close(self):
+        pass
+
+class Memmap_sink:
+
+    # APPEND-ONLY RAW BINARY FILE, READ BACK THROUGH np.memmap WITHOUT LOADING IT
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.dtype = None
+
+    def write(self, rows):
+        self.dtype = rows.dtype
+        self.file.write(rows.tobytes())
+
+    def read(self):
+
+        if not self.file.closed:
+            self.file.flush()
+
+        if self.dtype is None or os.path.getsize(self.path) == 0:
+            return np.empty(0, dtype=self.dtype or value_dtype)
+
+        return np.memmap(self.path, dtype=self.dtype, mode='r')
+
+    def close(self):
+        self.file.close()
+
+class Compressed_sink:
+
+    # ZIP ARCHIVE WITH ONE DEFLATED .npy MEMBER PER FIELD PER CHUNK, e.g. mean/000003.npy
+
+    def __init__(self, path):
+        self.path = path
+        self.archive = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+        self.chunks = 0
+        self.dtype = None
+
+    def write(self, rows):
+
+        self.dtype = rows.dtype
+
+        for field in rows.dtype.names:
+            member = BytesIO()
+            np.save(member, np.ascontiguousarray(rows[field]))
+            self.archive.writestr(field + '/' + str(self.chunks).zfill(6) + '.npy', member.getvalue())
+
+        self.chunks += 1
+
+    def read(self):
+
+        if self.dtype is None:
+            return np.empty(0, dtype=value_dtype)
+
+        if self.archive is None:
+            return read_compressed(self.path)
+
+        self.archive.close()
+        rows = read_compressed(self.path)
+        self.archive = zipfile.ZipFile(self.path, 'a', compression=zipfile.ZIP_DEFLATED)
+
+        return rows
+
+    def close(self):
+        self.archive.close()
+        self.archive = None
+
+def read_compressed(path):
+
+    # WHOLE TRACE FROM A Compressed_sink ARCHIVE
+
+    with zipfile.ZipFile(path) as archive:
+        names = sorted(archive.namelist())
+        fields = list(dict.fromkeys(name.split('/')[0] for name in names))
+        columns = {field: np.concatenate([np.load(BytesIO(archive.read(name))) for name in names if name.startswith(field + '/')]) for field in fields}
+
+    dtype = window_dtype if 'mean' in columns else value_dtype
+    rows = np.empty(len(columns[dtype.names[0]]), dtype=dtype)
+    for field in dtype.names:
+        rows[field] = columns[field]
+
+    return rows
+
+def downsample(values, window):
+
+    # min / max / mean OF EVERY WINDOW OF window CONSECUTIVE VALUES, THE LAST ONE MAY BE SHORTER
+
+    if window == 1:
+        rows = np.empty(len(values), dtype=value_dtype)
+        rows['value'] = values
+        return rows
+
+    starts = np.arange(0, len(values), window)
+    rows = np.empty(len(starts), dtype=window_dtype)
+    rows['min'] = np.minimum.reduceat(values, starts)
+    rows['max'] = np.maximum.reduceat(values, starts)
+    rows['mean'] = np.add.reduceat(values, starts) / np.diff(np.append(starts, len(values)))
+
+    return rows
+
+class Stream:
+
+    def __init__(self, sinks, chunk_size=65536, window=1):
+
+        if chunk_size % window:
+            raise ValueError('chunk_size must be a multiple of window.')
+
+        self.sinks = list(sinks)
+        self.window = window
+        self.chunk = np.empty(chunk_size)
+        self.count = 0
+        self.total = 0
+
+    def append(self, value):
+
+        self.chunk[self.count] = value
+        self.count += 1
+
+        if self.count == len(self.chunk):
+            self.flush()
+
+    def extend(self, values):
+
+        values = np.asarray(values, dtype=float)
+
+        while len(values):
+            n = min(len(values), len(self.chunk) - self.count)
+            self.chunk[self.count: self.count + n] = values[:n]
+            self.count += n
+            values = values[n:]
+
+            if self.count == len(self.chunk):
+                self.flush()
+
+    def flush(self):
+
+        # HANDS EVERY COMPLETE WINDOW TO THE SINKS, A PARTIAL ONE STAYS IN THE CHUNK
+
+        full = self.count - self.count % self.window
+        if not full:
+            return
+
+        rows = downsample(self.chunk[:full], self.window)
+        for sink in self.sinks:
+            sink.write(rows)
+
+        self.total += len(rows)
+        self.chunk[: self.count - full] = self.chunk[full: self.count]
+        self.count -= full
+
+    def close(self):
+
+        if self.count:
+            rows = downsample(self.chunk[: self.count], self.window)
+            for sink in self.sinks:
+                sink.write(rows)
+            self.total += len(rows)
+            self.count = 0
+
+        for sink in self.sinks:
+            sink.close()
+
+    def read(self):
+
+        # ROWS WRITTEN SO FAR, READ BACK FROM THE FIRST SINK
+
+        self.flush()
+        return self.sinks[0].read()
+
+    def values(self):
+        rows = self.read()
+        return rows['value'] if self.window == 1 else rows['mean']
+
+    def __len__(self):
+
+        # ROWS THAT CAN BE READ BACK, e.g. ONLY THE MOST RECENT ONES OF A BOUNDED Array_sink, SO len AND INDEXING AGREE
+
+        return len(self.read())
+
+    def __getitem__(self, index):
+        return self.values()[index]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.values(), dtype=dtype)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Measured weather series (irradiance, ambient temperature) read from memory-mapped columnar files
+"""
+
+import csv
+import json
+import os
+
+import numpy as np
+
+from simulation import Solar_panel
+
+# A WEATHER DIRECTORY HOLDS ONE RAW BINARY FILE PER COLUMN (<column>.bin, ONE VALUE PER ROW) AND weather.json WITH
+# THE dtype, THE NUMBER OF rows, THE step BETWEEN ROWS (s) AND THE SIMULATION SECOND start OF THE FIRST ROW.
+# convert WRITES ONE FROM A CSV FILE, CHUNK BY CHUNK, SO A YEAR AT ONE SECOND NEVER SITS IN MEMORY:
+#
+#   irradiance,ambient       # W/m^2, °C, ONE ROW EVERY step SECONDS. OTHER COLUMNS ARE IGNORED
+#   0,8.5
+#   12.4,8.6
+#
+# Weather MAPS THE FILES WITH np.memmap AND ONLY THE ROWS A CALL ASKS FOR ARE READ FROM DISK. series GIVES A
+# COLUMN FOR SIMULATION SECONDS [start, stop): A SLICE OF THE MAP ITSELF (NO COPY) AT ONE ROW PER SECOND, ELSE THE
+# ROWS AROUND THE WINDOW INTERPOLATED ('linear') OR HELD ('hold') TO EVERY SECOND.
+#
+# Weather_panel IS A simulation.Solar_panel DRIVEN BY THE IRRADIANCE COLUMN (Simulation(weather=...)): get_solar_current
+# READS A DAY AT A TIME FROM series, get_solar_currents (engine.Engine) A WHOLE WINDOW. losses.Losses TAKES A Weather
+# AS ITS ambient. UNLIKE THE DAILY PROFILES OF solar.py THE SERIES DOES NOT REPEAT: A RUN CANNOT GO BEYOND ITS END.
+
+metadata_file = 'weather.json'
+columns = ('irradiance', 'ambient')
+
+
+def convert(csv_path, directory, step=1, start=0, names=columns, dtype='float32', chunk_rows=1 << 16):
+
+    # WEATHER DIRECTORY FROM A CSV FILE WITH A HEADER ROW. EMPTY CELLS BECOME nan
+
+    os.makedirs(directory, exist_ok=True)
+    rows = 0
+
+    with open(csv_path, newline='') as f:
+        reader = csv.reader(f)
+        header = [name.strip() for name in next(reader)]
+
+        missing = [name for name in names if name not in header]
+        if missing:
+            raise ValueError(csv_path + ' has no column ' + ', '.join(missing) + '.')
+
+        indices = [header.index(name) for name in names]
+        outputs = [open(os.path.join(directory, name + '.bin'), 'wb') for name in names]
+
+        try:
+            chunk = np.empty((chunk_rows, len(names)), dtype=dtype)
+            filled = 0
+
+            for row in reader:
+                if not row:
+                    continue
+                chunk[filled] = [float(row[k]) if row[k].strip() else np.nan for k in indices]
+                filled += 1
+
+                if filled == chunk_rows:
+                    for k, output in enumerate(outputs):
+                        chunk[:, k].tofile(output)
+                    rows += filled
+                    filled = 0
+
+            for k, output in enumerate(outputs):
+                chunk[:filled, k].tofile(output)
+            rows += filled
+        finally:
+            for output in outputs:
+                output.close()
+
+    with open(os.path.join(directory, metadata_file), 'w') as f:
+        json.dump({'columns': list(names), 'dtype': np.dtype(dtype).str, 'rows': rows, 'step': step, 'start': start}, f)
+
+    return Weather(directory)
+
+class Weather:
+
+    def __init__(self, directory, interpolation='linear'):
+
+        with open(os.path.join(directory, metadata_file)) as f:
+            metadata = json.load(f)
+
+        if interpolation not in ('linear', 'hold'):
+            raise ValueError('Unknown interpolation ' + repr(interpolation) + ', expected linear or hold.')
+
+        self.directory = directory
+        self.interpolation = interpolation
+        self.rows = metadata['rows']
+        self.step = metadata['step'] #s
+        self.start = metadata['start'] #s
+        self.stop = self.start + self.rows * self.step #s
+        self.columns = {name: np.memmap(os.path.join(directory, name + '.bin'), dtype=metadata['dtype'], mode='r', shape=(self.rows,))
+                        for name in metadata['columns']} if self.rows else {}
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def series(self, name, start, stop):
+
+        # VALUES OF COLUMN name FOR SECONDS [start, stop)
+
+        if start < self.start or stop > self.stop:
+            raise ValueError('Weather in ' + self.directory + ' covers seconds ' + str(self.start) + ' to ' + str(self.stop) + ', not ' + str(start) + ' to ' + str(stop) + '.')
+
+        column = self.columns[name]
+
+        if self.step == 1:
+            return column[start - self.start: stop - self.start]
+
+        # ONLY THE ROWS FROM THE LAST ONE AT OR BEFORE start TO THE FIRST ONE AT OR AFTER stop - 1
+
+        first = (start - self.start) // self.step
+        last = min(-(-(stop - 1 - self.start) // self.step), self.rows - 1)
+        seconds = np.arange(start, stop)
+
+        if self.interpolation == 'hold':
+            return column[first: last + 1][(seconds - self.start) // self.step - first]
+
+        return np.interp(seconds, self.start + self.step * np.arange(first, last + 1), column[first: last + 1])
+
+    def irradiance(self, start, stop):
+        return self.series('irradiance', start, stop) #W/m^2
+
+    def ambient(self, start, stop):
+        return self.series('ambient', start, stop) #°C
+
+class Weather_panel(Solar_panel):
+
+    def __init__(self, weather, chunk=86400):
+
+        super().__init__()
+
+        self.weather = weather
+        self.chunk = chunk #s READ AT A TIME BY get_solar_current
+        self.since = self.until = 0
+        self.currents = None
+
+    def get_solar_currents(self, start, stop):
+        return self.weather.irradiance(start, stop).astype(float) * self.solar_panel_area / self.voltage_of_solar_panel #A
+
+    def get_solar_current(self, i):
+
+        if not self.since <= i < self.until:
+            self.since, self.until = i, max(min(i + self.chunk, self.weather.stop), i + 1)
+            self.currents = self.get_solar_currents(self.since, self.until).tolist()
+
+        return self.currents[i - self.since]